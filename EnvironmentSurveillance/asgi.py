@@ -3,6 +3,11 @@ ASGI config for EnvironmentSurveillance project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serves the async views (TELEMETRY_VIEWS = "async") and the SSE push stream
+(/api/v1/telemetry/stream/), e.g.:
+    uvicorn EnvironmentSurveillance.asgi:application --workers 4
+With several workers, set TELEMETRY_PUSH["BROKER"] to PostgresNotifyBroker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
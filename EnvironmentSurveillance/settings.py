@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'environmentsurveillance.metrics.MetricsMiddleware',  # en tête: mesure toute la requête
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -175,4 +176,94 @@ MQTT_TOPIC = "drone/telemetry"
 MQTT_USERNAME = None
 MQTT_PASSWORD = None
 MQTT_CLIENT_ID = "django-telemetry-consumer"
+# QoS 0 uniquement: la file du consommateur peut écarter un message déjà acquitté
 MQTT_QOS = 0
+
+
+# Ingest TTN (/api/v1/uplink)
+#   "sync"     : écriture en base pendant la requête
+#   "buffered" : la vue valide puis met le message en file; un thread écrit par lots (bulk_create)
+TTN_INGEST_MODE = env("TTN_INGEST_MODE", default="sync")
+INGEST_QUEUE_MAXSIZE = env.int("INGEST_QUEUE_MAXSIZE", default=10000)  # au-delà: HTTP 503
+INGEST_BATCH_SIZE = env.int("INGEST_BATCH_SIZE", default=500)
+INGEST_FLUSH_INTERVAL = env.float("INGEST_FLUSH_INTERVAL", default=0.5)  # secondes
+INGEST_BATCH_MAX_POINTS = 200000  # points max par requête en mode lot (tableau / NDJSON) de telemetry_ingest
+INGEST_BODY_MAX_SIZE = 256 * 1024 * 1024  # octets max du corps de telemetry_ingest, avant et après décompression (413)
+
+# Vues d'ingest / lecture (uplink, telemetry ingest/latest/history)
+#   "sync"  : vues classiques (WSGI, ou ASGI avec un thread par requête)
+#   "async" : vues natives async + ORM async (async_views.py), à servir via EnvironmentSurveillance.asgi
+TELEMETRY_VIEWS = env("TELEMETRY_VIEWS", default="sync")
+
+# Stockage du webhook TTN brut (TTNUplink), voir uplink_storage.py
+#   "json": jsonb (défaut, lisible par l'admin et en SQL)
+#   "zlib" / "lz4": compressé dans raw_payload_compressed, raw_payload = NULL (sur option)
+# Lignes existantes: manage.py backfill_uplinks
+TTN_RAW_PAYLOAD_STORAGE = env("TTN_RAW_PAYLOAD_STORAGE", default="json")
+
+# Décodage du frm_payload TTN côté serveur, voir decoders.py
+#   "fallback": seulement si TTN n'a pas fourni decoded_payload
+#   "prefer"  : le décodeur local remplace decoded_payload (formatters TTN désactivables)
+TTN_PAYLOAD_DECODE = env("TTN_PAYLOAD_DECODE", default="fallback")
+TTN_PAYLOAD_DECODERS = {}  # {"layouts": {...}, "devices": {eui: décodeur}, "f_ports": {port: décodeur}, "default": ...}
+
+# Déduplication de l'ingest (retries TTN, rejeux des passerelles)
+DEDUP_WINDOW = 3600             # secondes: durée de validité d'une clé (device, f_cnt) d'uplink
+DEDUP_RECENT_MAXSIZE = 100000   # clés récentes gardées en mémoire par process (uplinks, et autant pour les points)
+
+# Registre des devices en mémoire (EUI -> id, name, is_active), par process
+DEVICE_REGISTRY_MAXSIZE = 10000
+DEVICE_REGISTRY_TTL = 300  # secondes, rattrape les modifs faites par un autre worker
+
+# Push temps réel des points (SSE /api/v1/telemetry/stream/), voir push.py
+#   LocalBroker          : un seul worker
+#   PostgresNotifyBroker : plusieurs workers, via NOTIFY/LISTEN; OPTIONS: channel, alias, maxsize
+TELEMETRY_PUSH = {
+    "BROKER": "environmentsurveillance.push.LocalBroker",
+    "OPTIONS": {},
+    "HEARTBEAT": 15,          # secondes entre deux commentaires ": ping" (proxies, détection de coupure)
+    "MAX_SUBSCRIBERS": 1000,  # flux SSE par process
+    "MAX_DEVICES": 500,       # devices par abonnement
+}
+
+# Géorepères évalués à l'ingest (voir geofences.py)
+GEOFENCE_GRID_CELL = 0.05        # degrés, taille des cellules de la grille en mémoire
+GEOFENCE_RELOAD_INTERVAL = 60    # secondes, rattrape les modifs faites par un autre worker
+
+# Alertes de seuil évaluées à l'ingest (voir alerts.py)
+ALERT_RELOAD_INTERVAL = 60         # secondes, rattrape les modifs de règles faites par un autre worker
+ALERT_SWEEP_INTERVAL = 30          # secondes entre deux vérifications des règles de silence
+ALERT_EVENT_QUEUE_MAXSIZE = 10000  # AlertEvent en attente d'écriture
+
+# Devices muets (voir lastseen.py)
+DEVICE_STALE_AFTER = 900  # secondes sans point avant qu'un device soit signalé
+
+# Latence / requêtes SQL par vue, exportées sur /metrics (voir metrics.py)
+METRICS_ENABLED = True
+
+# Cache du dernier point par device (telemetry_latest)
+#   LocMemLatestBackend       : mémoire du process, OPTIONS: ttl (s). Ne voit pas les
+#                               points écrits par les autres process: périmé au plus
+#                               `ttl` secondes. Pour un seul worker (dev).
+#   DjangoCacheLatestBackend  : cache Django partagé (ex. Redis), OPTIONS: alias, timeout.
+#                               À utiliser dès qu'il y a plusieurs workers ou un
+#                               consommateur MQTT / backfill à côté:
+#     TELEMETRY_LATEST_CACHE = {
+#         "BACKEND": "environmentsurveillance.latest_cache.DjangoCacheLatestBackend",
+#         "OPTIONS": {"alias": "default"},
+#     }
+TELEMETRY_LATEST_CACHE = {
+    "BACKEND": "environmentsurveillance.latest_cache.LocMemLatestBackend",
+    "OPTIONS": {"ttl": 5},
+}
+
+# Rétention par table partitionnée (jours), appliquée par `manage_partitions --retention`
+PARTITION_RETENTION_DAYS = {
+    "ttnuplink": 30,        # webhooks bruts
+    "telemetrypoint": 365,
+}
+
+# Agrégats TelemetryRollup (`update_rollups`)
+ROLLUP_LAG = 60               # secondes: on laisse finir les transactions d'ingest en cours
+ROLLUP_MAX_WINDOW = 3600      # secondes de created_at traitées par transaction
+ROLLUP_RETENTION_DAYS = {"1m": 7, "1h": 365, "1d": None}
@@ -0,0 +1,340 @@
+"""
+Moteur d'alertes de seuil, évalué à l'ingest (listener de points).
+
+- AlertRule actives compilées une fois (statistique + comparaison choisies à
+  la compilation), indexées par device ("tous les devices" à part).
+- état glissant par (règle, device): EWMA, fenêtre min / max (deque
+  monotone, O(1) amorti), compteur d'anti-rebond, alerte active ou non.
+- hystérésis: une alerte active retombe au franchissement de clear_threshold.
+- silence: secondes depuis le dernier point, vérifié par sweep() (au plus
+  toutes les ALERT_SWEEP_INTERVAL s depuis l'ingest, ou `manage.py alert_sweep`).
+- les AlertEvent (déclenchée / résolue) sont écrits par lots (BatchWriter).
+
+L'état est propre au process: avec plusieurs workers, chacun ne voit que ses
+points (à router par device, ou ingest MQTT dans un seul process). Au
+chargement, les alertes encore actives en base sont reprises.
+"""
+import atexit
+import logging
+import operator
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from .ingest import BatchWriter
+from .models import AlertEvent, AlertRule, DeviceLastSeen
+
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {"gt": operator.gt, "lt": operator.lt}
+
+
+# --------------------------
+# Règles compilées
+# --------------------------
+class RuleState:
+    __slots__ = ("ewma", "window", "count", "firing")
+
+    def __init__(self):
+        self.ewma = None
+        self.window = deque()  # (ts, valeur), monotone
+        self.count = 0         # évaluations consécutives dans l'autre état
+        self.firing = False
+
+
+def _stat_function(rule):
+    """
+    -> stat(state, ts, value): met à jour l'état glissant et renvoie la statistique
+    """
+    if rule.stat == "ewma":
+        alpha = rule.ewma_alpha
+
+        def stat(state, ts, value):
+            state.ewma = value if state.ewma is None else state.ewma + alpha * (value - state.ewma)
+            return state.ewma
+        return stat
+
+    if rule.stat in ("min", "max"):
+        window = rule.window
+        # deque monotone: la tête est toujours le min (resp. max) de la fenêtre
+        dominated = operator.ge if rule.stat == "min" else operator.le
+
+        def stat(state, ts, value):
+            values = state.window
+            while values and dominated(values[-1][1], value):
+                values.pop()
+            values.append((ts, value))
+            while values[0][0] < ts - window:
+                values.popleft()
+            return values[0][1]
+        return stat
+
+    def stat(state, ts, value):
+        return value
+    return stat
+
+
+class CompiledRule:
+
+    def __init__(self, rule):
+        self.id = rule.pk
+        self.name = rule.name
+        # l'état glissant n'est gardé au rechargement que si la règle n'a pas changé
+        self.signature = (
+            rule.device_id, rule.metric, rule.stat, rule.operator, rule.threshold,
+            rule.clear_threshold, rule.debounce, rule.window, rule.ewma_alpha,
+        )
+        self.metric = rule.metric
+        self.threshold = rule.threshold
+        self.clear_threshold = rule.threshold if rule.clear_threshold is None else rule.clear_threshold
+        self.debounce = max(1, rule.debounce)
+        self.compare = OPERATORS[rule.operator]
+        self.stat = _stat_function(rule)
+        self.states = {}  # EUI -> RuleState
+
+    def evaluate(self, eui, ts, value):
+        """
+        -> (changement, statistique); changement = "firing" / "resolved", ou None
+        """
+        state = self.states.get(eui)
+        if state is None:
+            state = self.states[eui] = RuleState()
+
+        stat = self.stat(state, ts, value)
+        if state.firing:
+            changing = not self.compare(stat, self.clear_threshold)
+        else:
+            changing = self.compare(stat, self.threshold)
+
+        if not changing:
+            state.count = 0
+            return None, stat
+        state.count += 1
+        if state.count < self.debounce:
+            return None, stat
+        state.count = 0
+        state.firing = not state.firing
+        return ("firing" if state.firing else "resolved"), stat
+
+
+# --------------------------
+# Moteur
+# --------------------------
+def _empty_rules():
+    return {"all": [], "devices": {}, "silence": [], "by_id": {}}
+
+
+class AlertEngine:
+
+    def __init__(self):
+        self._rules = None
+        self._stale = True
+        self._loaded_at = 0.0
+        self._last_seen = {}  # EUI -> (device_id, ts epoch)
+        self._last_sweep = time.monotonic()
+        self._lock = threading.Lock()
+        self._writer = None
+
+        self.evaluated = 0
+        self.fired = 0
+        self.resolved = 0
+
+    # ---- règles ----
+    def invalidate(self):
+        self._stale = True
+
+    def rules(self):
+        rules = self._rules
+        reload_interval = getattr(settings, "ALERT_RELOAD_INTERVAL", 60)
+        if self._stale or time.monotonic() - self._loaded_at > reload_interval:
+            # remis à False avant le chargement: une invalidation pendant _load n'est pas perdue
+            self._stale = False
+            try:
+                rules = self._load(rules)
+            except Exception:
+                # base indisponible: règles précédentes (ou aucune), nouvel essai au prochain appel
+                self._stale = True
+                logger.exception("Alert rules could not be loaded")
+                return rules if rules is not None else _empty_rules()
+            self._rules, self._loaded_at = rules, time.monotonic()
+        return rules
+
+    def reset(self):
+        """
+        Oublie règles et état glissant (tests).
+        """
+        with self._lock:
+            self._rules = None
+            self._stale = True
+            self._last_seen.clear()
+
+    def _load(self, previous):
+        """
+        -> {"all": [...], "devices": {EUI: [...]}, "silence": [...]}
+        L'état glissant des règles inchangées est conservé d'un chargement à l'autre.
+        """
+        kept = previous["by_id"] if previous is not None else {}
+
+        compiled = _empty_rules()
+        for rule in AlertRule.objects.filter(is_active=True).select_related("device"):
+            c = CompiledRule(rule)
+            old = kept.get(rule.pk)
+            if old is not None and old.signature == c.signature:
+                c.states = old.states
+            compiled["by_id"][c.id] = c
+            if rule.metric == "silence":
+                compiled["silence"].append((rule.device.device_eui if rule.device else None, c))
+            elif rule.device is not None:
+                compiled["devices"].setdefault(rule.device.device_eui, []).append(c)
+            else:
+                compiled["all"].append(c)
+
+        if previous is None:
+            self._restore_firing(compiled["by_id"])
+        return compiled
+
+    def _restore_firing(self, rules):
+        # dernier événement par (règle, device): actif s'il est "firing"
+        for rule_id, eui in active_alert_keys(rules):
+            rule = rules.get(rule_id)
+            if rule is not None:
+                rule.states.setdefault(eui, RuleState()).firing = True
+
+    # ---- évaluation ----
+    def __call__(self, points):
+        rules = self.rules()
+        if not rules["by_id"]:
+            return
+
+        events = []
+        with self._lock:
+            for eui, p in points:
+                ts = p.ts.timestamp()
+                self._last_seen[eui] = (p.device_id, ts)
+                for rule in (*rules["all"], *rules["devices"].get(eui, ())):
+                    value = getattr(p, rule.metric)
+                    if value is None:
+                        continue
+                    change, stat = rule.evaluate(eui, ts, value)
+                    if change:
+                        events.append(self._event(rule, p.device_id, change, stat, p.ts))
+                # un point remet le silence à 0
+                for device_eui, rule in rules["silence"]:
+                    if device_eui in (None, eui):
+                        change, stat = rule.evaluate(eui, ts, 0.0)
+                        if change:
+                            events.append(self._event(rule, p.device_id, change, stat, p.ts))
+            self.evaluated += len(points)
+
+        if rules["silence"]:
+            interval = getattr(settings, "ALERT_SWEEP_INTERVAL", 30)
+            if time.monotonic() - self._last_sweep > interval:
+                events += self.sweep(rules)
+        self.persist(events)
+
+    def sweep(self, rules=None, now=None):
+        """
+        Règles de silence: secondes depuis le dernier point de chaque device vu par ce process.
+        """
+        rules = rules or self.rules()
+        now = now or time.time()
+        self._last_sweep = time.monotonic()
+        events = []
+        with self._lock:
+            for eui, (device_id, last_ts) in self._last_seen.items():
+                for device_eui, rule in rules["silence"]:
+                    if device_eui in (None, eui):
+                        change, stat = rule.evaluate(eui, now, now - last_ts)
+                        if change:
+                            ts = datetime.fromtimestamp(now, tz=dt_timezone.utc)
+                            events.append(self._event(rule, device_id, change, stat, ts))
+        return events
+
+    def load_last_seen(self):
+        """
+        Dernier passage de chaque device actif, lu dans DeviceLastSeen (process qui n'ingère pas: alert_sweep).
+        """
+        rows = DeviceLastSeen.objects.filter(device__is_active=True).values_list(
+            "device__device_eui", "device_id", "last_seen"
+        )
+        with self._lock:
+            for eui, device_id, ts in rows:
+                seen = self._last_seen.get(eui)
+                if seen is None or seen[1] < ts.timestamp():
+                    self._last_seen[eui] = (device_id, ts.timestamp())
+
+    def _event(self, rule, device_id, state, value, ts):
+        if state == "firing":
+            self.fired += 1
+            logger.warning("Alert %r firing for device %s (value %s)", rule.name, device_id, value)
+        else:
+            self.resolved += 1
+        threshold = rule.threshold if state == "firing" else rule.clear_threshold
+        return AlertEvent(rule_id=rule.id, device_id=device_id, state=state, value=value, threshold=threshold, ts=ts)
+
+    # ---- persistance ----
+    def persist(self, events):
+        if not events:
+            return
+        writer = self._get_writer()
+        for event in events:
+            if not writer.offer(event):
+                logger.error("Alert event queue full, dropping %s", event)
+
+    def _get_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    writer = BatchWriter(
+                        AlertEvent.objects.bulk_create,
+                        name="alert-event-writer",
+                        maxsize=getattr(settings, "ALERT_EVENT_QUEUE_MAXSIZE", 10000),
+                        batch_size=500,
+                        flush_interval=getattr(settings, "INGEST_FLUSH_INTERVAL", 0.5),
+                    )
+                    writer.start()
+                    atexit.register(writer.stop)
+                    self._writer = writer
+        return self._writer
+
+    def flush(self, timeout=10):
+        """
+        Vide la file des événements (tests, arrêt de commande).
+        """
+        if self._writer is not None:
+            self._writer.stop(timeout)
+            self._writer = None
+
+    def stats(self):
+        rules = self._rules
+        return {
+            "rules": len(rules["by_id"]) if rules is not None else None,
+            "evaluated": self.evaluated,
+            "fired": self.fired,
+            "resolved": self.resolved,
+            "event_writer": self._writer.stats() if self._writer is not None else None,
+        }
+
+
+def active_alert_keys(rule_ids=None):
+    """
+    (règle, EUI) des alertes actives en base: dernier événement "firing".
+    Sous-requête corrélée sur alert_event_rule_device_idx (tout backend).
+    """
+    latest = (
+        AlertEvent.objects.filter(rule_id=OuterRef("rule_id"), device_id=OuterRef("device_id"))
+        .order_by("-ts", "-id")
+        .values("id")[:1]
+    )
+    qs = AlertEvent.objects.filter(state="firing")
+    if rule_ids is not None:
+        qs = qs.filter(rule_id__in=list(rule_ids))
+    return list(qs.filter(id=Subquery(latest)).values_list("rule_id", "device__device_eui"))
+
+
+alert_engine = AlertEngine()
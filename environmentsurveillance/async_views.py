@@ -0,0 +1,269 @@
+"""
+Versions async des vues d'ingest et de lecture, pour un déploiement ASGI
+(uvicorn / daphne sur EnvironmentSurveillance.asgi).
+
+Même contrat HTTP que views.py; sélection via le setting TELEMETRY_VIEWS
+("sync" par défaut, "async"), voir urls.py.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .device_registry import device_registry
+from .downsample import MAX_POINTS, downsample_history
+from .exports import (
+    EXPORT_CONTENT_TYPES,
+    astreaming_export,
+    decode_cursor,
+    encode_cursor,
+    keyset_before,
+)
+from .ingest import (
+    asave_points,
+    asave_uplinks,
+    get_uplink_buffer,
+    ingest_is_buffered,
+    parse_telemetry,
+    parse_ttn_uplink,
+)
+from .history_formats import history_columns, history_response, negotiate_history_format
+from .ingest_batch import IngestBodyError, ingest_telemetry_batch, read_telemetry_body
+from .latest_cache import latest_points
+from .push import get_push_broker, push_config, push_hub
+from .queries import HISTORY_COLUMNS, history_queryset, latest_point_queryset
+from .views import _batch_ingest_response, _parse_epoch, _parse_positive
+
+
+def _downsample_history(*args, **kwargs):
+    # thread d'exécuteur: Django ne ferme jamais la connexion qu'il ouvre
+    try:
+        return downsample_history(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+# --------------------------
+# TTN uplink
+# --------------------------
+@csrf_exempt
+@require_POST
+async def ttn_uplink_async(request):
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    record, error = parse_ttn_uplink(payload)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    # offer() ne bloque pas (put_nowait): utilisable depuis la boucle d'événements
+    if ingest_is_buffered():
+        if not get_uplink_buffer().offer(record):
+            response = JsonResponse({"error": "Ingest queue full"}, status=503)
+            response["Retry-After"] = "1"
+            return response
+        return JsonResponse({"status": "queued"}, status=202)
+
+    await asave_uplinks([record])
+
+    return JsonResponse({"status": "ok"})
+
+
+# --------------------------
+# Telemetry
+# --------------------------
+@require_GET
+async def telemetry_latest_async(request, device_eui):
+    entry = await latest_points.aget(device_eui)
+
+    if entry is None:
+        device = await device_registry.aget(device_eui)
+        if device is None:
+            return JsonResponse({"error": "No data"}, status=404)
+        p = await latest_point_queryset(device.id).afirst()
+        if p is None:
+            return JsonResponse({"error": "No data"}, status=404)
+        entry = await latest_points.astore(device_eui, p)
+
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if entry["etag"] in etags or "*" in etags:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(entry["data"])
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+@csrf_exempt
+@require_GET
+async def telemetry_history_async(request, device_eui):
+    limit = request.GET.get("limit", "300")
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 300
+    limit = max(1, min(limit, 5000))
+
+    device = await device_registry.aget(device_eui)
+    if device is None:
+        return JsonResponse({"error": "Device not found"}, status=404)
+
+    from_dt = _parse_epoch(request.GET.get("fromTs"))
+    to_dt = _parse_epoch(request.GET.get("toTs"))
+
+    max_points = _parse_positive(request.GET.get("maxPoints"), int)
+    resolution = _parse_positive(request.GET.get("resolution"), float)
+    if max_points or resolution:
+        if max_points:
+            max_points = max(2, min(max_points, MAX_POINTS))
+        # calcul NumPy: dans un thread, pas dans la boucle d'événements
+        history, meta = await sync_to_async(_downsample_history, thread_sensitive=False)(
+            device.id, from_dt, to_dt, max_points=max_points, resolution=resolution,
+        )
+        return JsonResponse({
+            "device_eui": device_eui,
+            "count": len(history),
+            "downsampled": True,
+            **meta,
+            "history": history,
+        })
+
+    fmt = request.GET.get("format")
+    if fmt in EXPORT_CONTENT_TYPES:
+        qs = history_queryset(device.id, from_dt, to_dt).order_by("ts", "id").values_list(*HISTORY_COLUMNS)
+        return astreaming_export(
+            qs, HISTORY_COLUMNS, fmt, f"history_{device_eui}",
+            transform=lambda row: (int(row[0].timestamp()),) + row[1:],
+        )
+
+    qs = history_queryset(device.id, from_dt, to_dt).values_list("id", *HISTORY_COLUMNS)
+
+    cursor = decode_cursor(request.GET.get("cursor"))
+    if cursor:
+        qs = keyset_before(qs, "ts", cursor)
+
+    rows = [row async for row in qs[:limit]]
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    rows.reverse()  # ancien -> récent (polyline)
+
+    history_format = negotiate_history_format(request)
+    if history_format:
+        columns = history_columns(rows, ("id",) + HISTORY_COLUMNS)
+        del columns["id"]
+        return history_response(history_format, columns, {
+            "device_eui": device_eui, "count": len(rows), "nextCursor": next_cursor,
+        }, precision=request.GET.get("precision"))
+
+    response = JsonResponse({
+        "device_eui": device_eui,
+        "count": len(rows),
+        "nextCursor": next_cursor,
+        "history": [
+            {
+                "ts": int(ts.timestamp()),
+                "lat": lat,
+                "lng": lng,
+                "temp": temp,
+                "battery": battery,
+                "rssi": rssi,
+                "snr": snr,
+            }
+            for pk, ts, lat, lng, temp, battery, rssi, snr in rows
+        ]
+    })
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def telemetry_ingest_async(request):
+    # sous ASGI le corps est déjà bufferisé (fichier temporaire): lecture non bloquante
+    try:
+        is_batch, items = read_telemetry_body(request, request.content_type, request.headers.get("Content-Encoding"))
+    except IngestBodyError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+
+    if is_batch:
+        # décodage + bulk_create par paquets: dans un thread
+        return _batch_ingest_response(*await sync_to_async(ingest_telemetry_batch)(items))
+
+    _, data, error = next(items)
+    if error is None:
+        record, error = parse_telemetry(data)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    await asave_points([record])
+
+    return JsonResponse({"status": "ok"})
+
+
+# --------------------------
+# Push temps réel (SSE)
+# --------------------------
+async def _event_stream(devices, heartbeat):
+    """
+    Abonnement ouvert à la première itération et fermé dans le finally: une
+    réponse jamais itérée (client parti avant le premier octet) n'abonne rien.
+    """
+    # abonné avant la lecture du cache: aucun point perdu entre les deux
+    sub = push_hub.subscribe(devices)
+    try:
+        snapshot = []
+        for eui in devices:
+            entry = await latest_points.aget(eui)
+            if entry is not None:
+                snapshot.append(entry["data"])
+        async for chunk in push_hub.stream(sub, snapshot, heartbeat=heartbeat):
+            yield chunk
+    finally:
+        push_hub.unsubscribe(sub)
+
+
+@require_GET
+async def telemetry_stream(request):
+    """
+    GET /api/v1/telemetry/stream/?devices=EUI1,EUI2   (sans devices: tous)
+    text/event-stream: un événement "point" par nouveau point, coalescé par
+    device pour les clients lents; d'abord le dernier point connu (cache) de
+    chaque device demandé.
+
+    ASGI uniquement (EnvironmentSurveillance.asgi): sous WSGI, Django consomme
+    le flux async en entier avant d'envoyer quoi que ce soit (flux infini:
+    rien n'est jamais envoyé, le worker reste bloqué) et la boucle de
+    l'abonné n'existe que le temps de la vue -> 501.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Event stream requires an ASGI server"}, status=501)
+
+    config = push_config()
+    devices = [eui.strip() for eui in request.GET.get("devices", "").split(",") if eui.strip()]
+    if len(devices) > config.get("MAX_DEVICES", 500):
+        return JsonResponse({"error": "Too many devices"}, status=400)
+    if len(push_hub) >= config.get("MAX_SUBSCRIBERS", 1000):
+        response = JsonResponse({"error": "Too many subscribers"}, status=503)
+        response["Retry-After"] = "5"
+        return response
+
+    get_push_broker().start()
+    response = StreamingHttpResponse(
+        _event_stream(devices, heartbeat=config.get("HEARTBEAT", 15)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: pas de mise en tampon du flux
+    return response
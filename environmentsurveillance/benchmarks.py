@@ -0,0 +1,179 @@
+"""
+Benchmarks des vues d'ingest et de lecture, dans le process (django.test.Client,
+pile de middlewares complète, sans réseau): `manage.py bench_views`.
+
+Chaque benchmark est une fabrique de requêtes (méthode, chemin, corps)
+déterministe (seed): deux runs sur la même flotte (fleet.py) envoient les
+mêmes requêtes. Mesures par requête: latence, nombre de requêtes SQL
+(execute_wrapper, sans le coût de CursorDebugWrapper), taille de la réponse.
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.test import Client
+
+from .fleet import ttn_uplink_payload
+from .loadtest import percentile
+
+
+HISTORY_LIMITS = (100, 1000, 5000)
+
+# benchmarks qui écrivent dans la base (ignorés sur --current-db sans --include-writes)
+WRITE_BENCHMARKS = frozenset({"ttn_uplink", "telemetry_ingest"})
+
+
+class BenchContext:
+    """
+    Flotte visée + compteur de requêtes: les écritures reçoivent des ts / f_cnt
+    jamais vus (pas de doublons écartés par la déduplication).
+    """
+
+    def __init__(self, euis, seed=0):
+        self.euis = euis
+        self.rng = random.Random(seed)
+        self.now = datetime.now(dt_timezone.utc)
+        self.sequence = 0
+
+    def next(self):
+        self.sequence += 1
+        return self.rng.choice(self.euis), self.sequence
+
+
+def _ttn_uplink(ctx):
+    eui, n = ctx.next()
+    ts = ctx.now + timedelta(seconds=n)
+    payload = ttn_uplink_payload(
+        eui, 1_000_000 + n, ts, 14.7 + ctx.rng.random() / 10, -17.4 + ctx.rng.random() / 10,
+        round(20 + ctx.rng.random() * 10, 2), ctx.rng.randint(3000, 4200), -ctx.rng.randint(40, 120), 5.0,
+    )
+    return "POST", "/api/v1/uplink", json.dumps(payload)
+
+
+def _telemetry_ingest(ctx):
+    eui, n = ctx.next()
+    return "POST", "/api/v1/telemetry/ingest/", json.dumps({
+        "device_eui": eui,
+        "ts": int(ctx.now.timestamp()) + n,
+        "lat": 14.7 + ctx.rng.random() / 10,
+        "lng": -17.4 + ctx.rng.random() / 10,
+        "temp": round(20 + ctx.rng.random() * 10, 2),
+        "battery": ctx.rng.randint(3000, 4200),
+    })
+
+
+def _telemetry_latest(ctx):
+    eui, _ = ctx.next()
+    return "GET", f"/api/v1/telemetry/latest/{eui}/", None
+
+
+def _telemetry_history(limit, fmt=None):
+    query = f"limit={limit}" + (f"&format={fmt}" if fmt else "")
+
+    def build(ctx):
+        eui, _ = ctx.next()
+        return "GET", f"/api/v1/telemetry/history/{eui}/?{query}", None
+    return build
+
+
+def _list_ttn_uplinks(ctx):
+    return "GET", "/api/list_ttn_uplinks?limit=500", None
+
+
+def benchmarks(history_limits=HISTORY_LIMITS):
+    """
+    -> {nom: fabrique de requêtes}
+    """
+    suite = {
+        "ttn_uplink": _ttn_uplink,
+        "telemetry_ingest": _telemetry_ingest,
+        "telemetry_latest": _telemetry_latest,
+    }
+    for limit in history_limits:
+        suite[f"telemetry_history[limit={limit}]"] = _telemetry_history(limit)
+    if history_limits:
+        # formats compacts (history_formats.py) sur la plus grande page
+        limit = max(history_limits)
+        for fmt in ("columns", "binary", "polyline"):
+            suite[f"telemetry_history[limit={limit},format={fmt}]"] = _telemetry_history(limit, fmt)
+    suite["list_ttn_uplinks"] = _list_ttn_uplinks
+    return suite
+
+
+def run_benchmark(build_request, ctx, iterations=200, warmup=20, client=None):
+    """
+    -> {requests, errors, duration, rps, mean_ms, p50_ms, p90_ms, p99_ms, max_ms,
+        queries_mean, queries_max, response_bytes_mean}
+    """
+    client = client or Client(raise_request_exception=False)
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    def send():
+        method, path, body = build_request(ctx)
+        if method == "POST":
+            return client.post(path, body, content_type="application/json")
+        return client.get(path)
+
+    for _ in range(warmup):
+        send()
+
+    latencies = []
+    query_counts = []
+    sizes = []
+    errors = 0
+    started = time.perf_counter()
+    with connection.execute_wrapper(count_queries):
+        for _ in range(iterations):
+            queries[0] = 0
+            t0 = time.perf_counter()
+            response = send()
+            latencies.append(time.perf_counter() - t0)
+            query_counts.append(queries[0])
+            if response.status_code >= 400:
+                errors += 1
+            sizes.append(0 if response.streaming else len(response.content))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "requests": iterations,
+        "errors": errors,
+        "duration": round(duration, 3),
+        "rps": round(iterations / duration, 1) if duration else 0.0,
+        "mean_ms": to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": to_ms(percentile(latencies, 50)),
+        "p90_ms": to_ms(percentile(latencies, 90)),
+        "p99_ms": to_ms(percentile(latencies, 99)),
+        "max_ms": to_ms(latencies[-1] if latencies else None),
+        "queries_mean": round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+        "queries_max": max(query_counts) if query_counts else None,
+        "response_bytes_mean": round(sum(sizes) / len(sizes)) if sizes else None,
+    }
+
+
+def compare(results, baseline):
+    """
+    -> {nom: {"rps": variation %, "p50_ms": variation %, "p99_ms": ..., "queries_mean": écart}}
+    pour les benchmarks présents dans les deux runs
+    """
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    deltas = {}
+    for r in results:
+        old = before.get(r["name"])
+        if old is None:
+            continue
+        delta = {}
+        for key in ("rps", "p50_ms", "p99_ms"):
+            if r.get(key) is not None and old.get(key):
+                delta[key] = round((r[key] - old[key]) / old[key] * 100, 1)
+        if r.get("queries_mean") is not None and old.get("queries_mean") is not None:
+            delta["queries_mean"] = round(r["queries_mean"] - old["queries_mean"], 2)
+        deltas[r["name"]] = delta
+    return deltas
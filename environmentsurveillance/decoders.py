@@ -0,0 +1,199 @@
+"""
+Décodage du frm_payload TTN côté serveur (devices sans formatter TTN).
+
+TTN_PAYLOAD_DECODERS:
+    {
+        "layouts": {
+            # champs: (nom, code struct[, échelle]); "x"/"3x" = octets ignorés
+            "lora32u4_v1": {
+                "byteorder": "<",
+                "fields": [("lat", "i", 1e-6), ("lng", "i", 1e-6), ("temp", "h", 0.01), ("battery", "B")],
+            },
+        },
+        "devices": {"70B3D57ED0000001": "lora32u4_v1"},   # prioritaire
+        "f_ports": {2: "lora32u4_v1", 10: "myapp.decoders.decode_v2"},
+        "default": None,
+    }
+
+Un décodeur est le nom d'un layout, un layout en ligne (dict) ou le chemin
+d'une fonction decode(data: bytes, f_port) -> dict. Chaque layout est
+compilé une fois: un struct.Struct et une fonction générée qui construit le
+dict, sans recherche par champ au décodage.
+
+Le résultat remplace decoded_payload (TTN_PAYLOAD_DECODE = "prefer") ou ne
+sert que si TTN n'a rien décodé ("fallback", défaut).
+"""
+import base64
+import logging
+import math
+import struct
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+# codes struct numériques acceptés (valeurs JSON-sérialisables)
+NUMERIC_CODES = set("bBhHiIlLqQefd?")
+
+
+def decode_mode():
+    return getattr(settings, "TTN_PAYLOAD_DECODE", "fallback")
+
+
+# --------------------------
+# Layouts binaires
+# --------------------------
+def _ndigits(scale):
+    # 1e-6 -> 6, 0.01 -> 2, 0.5 -> 1: arrondi qui efface le bruit de la multiplication
+    return max(0, math.ceil(-math.log10(abs(scale)) - 1e-9))
+
+
+def _finite(value):
+    # NaN / inf (codes e, f, d) ne passent pas en jsonb
+    return value if math.isfinite(value) else None
+
+
+def compile_layout(fields, byteorder="<", name="layout"):
+    """
+    [(nom, code[, échelle]), ...] -> fonction decode(data, f_port=None) -> dict
+
+    Génère par ex.:
+        def decode(data, f_port=None):
+            if len(data) < 9: raise ValueError(...)
+            v0, v1, v2 = _unpack(data)
+            return {'lat': round(v0 * 1e-06, 6), 'lng': ..., 'battery': v2}
+    Les flottants (e, f, d) non finis (NaN, inf) deviennent None.
+    """
+    if byteorder not in ("<", ">", "!", "="):
+        raise ValueError(f"{name}: invalid byteorder {byteorder!r}")
+
+    fmt = byteorder
+    items = []
+    for spec in fields:
+        field, code, *rest = spec
+        count = code.rstrip("xbBhHiIlLqQefd?")
+        kind = code[len(count):]
+        if kind == "x":
+            fmt += code
+            continue
+        if kind not in NUMERIC_CODES or count:
+            raise ValueError(f"{name}: unsupported struct code {code!r} for field {field!r}")
+        fmt += kind
+        var = f"v{len(items)}"
+        scale = rest[0] if rest else None
+        if scale is None or scale == 1:
+            expr = var
+        elif kind in "ef" or scale < 1:
+            expr = f"round({var} * {scale!r}, {_ndigits(scale)})"
+        else:
+            expr = f"{var} * {scale!r}"
+        if kind in "efd":
+            expr = f"_finite({expr})"
+        items.append((field, var, expr))
+
+    if not items:
+        raise ValueError(f"{name}: no fields")
+
+    unpacker = struct.Struct(fmt)
+    lines = [
+        "def decode(data, f_port=None):",
+        f"    if len(data) < {unpacker.size}:",
+        f"        raise ValueError('{name}: expected {unpacker.size} bytes, got %d' % len(data))",
+        f"    {', '.join(var for _, var, _ in items)}, = _unpack(data)",
+        "    return {" + ", ".join(f"{field!r}: {expr}" for field, _, expr in items) + "}",
+    ]
+    namespace = {"_unpack": unpacker.unpack_from, "_finite": _finite}
+    exec("\n".join(lines), namespace)
+    decode = namespace["decode"]
+    decode.size = unpacker.size
+    decode.layout = name
+    return decode
+
+
+# --------------------------
+# Registre
+# --------------------------
+class DecoderRegistry:
+    """
+    device EUI -> décodeur, sinon f_port -> décodeur, sinon décodeur par défaut.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.layouts = {
+            name: compile_layout(spec["fields"], spec.get("byteorder", "<"), name)
+            for name, spec in (config.get("layouts") or {}).items()
+        }
+        self.by_device = {eui.upper(): self._resolve(d) for eui, d in (config.get("devices") or {}).items()}
+        self.by_port = {int(port): self._resolve(d) for port, d in (config.get("f_ports") or {}).items()}
+        self.default = self._resolve(config.get("default"))
+
+        self.decoded = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def __bool__(self):
+        return bool(self.by_device or self.by_port or self.default)
+
+    def _resolve(self, decoder):
+        if decoder is None or callable(decoder):
+            return decoder
+        if isinstance(decoder, dict):
+            return compile_layout(decoder["fields"], decoder.get("byteorder", "<"))
+        if decoder in self.layouts:
+            return self.layouts[decoder]
+        return import_string(decoder)
+
+    def lookup(self, device_eui, f_port):
+        decoder = self.by_device.get((device_eui or "").upper())
+        if decoder is None:
+            decoder = self.by_port.get(f_port, self.default)
+        return decoder
+
+    def decode(self, device_eui, f_port, frm_payload):
+        """
+        frm_payload base64 -> dict, ou None (pas de décodeur, trame invalide)
+        """
+        decoder = self.lookup(device_eui, f_port)
+        if decoder is None or not isinstance(frm_payload, str):
+            return None
+        try:
+            result = decoder(base64.b64decode(frm_payload, validate=True), f_port)
+        except Exception as exc:  # trame invalide, ou erreur d'un décodeur importé (settings)
+            with self._lock:
+                self.failed += 1
+            logger.warning("Payload decoding failed for %s (f_port %s): %s", device_eui, f_port, exc)
+            return None
+        with self._lock:
+            self.decoded += 1
+        return result
+
+    def stats(self):
+        return {
+            "devices": len(self.by_device),
+            "f_ports": len(self.by_port),
+            "decoded": self.decoded,
+            "failed": self.failed,
+        }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_decoder_registry():
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DecoderRegistry(getattr(settings, "TTN_PAYLOAD_DECODERS", None))
+    return _registry
+
+
+def reset_decoder_registry():
+    global _registry
+    with _registry_lock:
+        _registry = None
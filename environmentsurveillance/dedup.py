@@ -0,0 +1,201 @@
+"""
+Déduplication de l'ingest (retries des webhooks TTN, rejeux des passerelles).
+
+- uplinks TTN: clé (device, f_cnt), valable DEDUP_WINDOW secondes: le compteur
+  de trames repart de 0 après un rejoin, une clé ne peut donc pas être
+  éternelle. Les clés sont réservées dans UplinkDedupKey par un upsert, dans
+  la transaction qui écrit l'uplink (un échec d'écriture libère la clé).
+- points: clé (device, ts), contrainte unique permanente sur TelemetryPoint
+  + INSERT ... ON CONFLICT DO NOTHING RETURNING (ingest.insert_points).
+- devant les deux, RecentKeys: les clés écrites récemment par ce process,
+  pour écarter un doublon sans aller-retour en base.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import UplinkDedupKey
+
+
+def dedup_window():
+    return getattr(settings, "DEDUP_WINDOW", 3600)
+
+
+class RecentKeys:
+    """
+    Ensemble borné (éviction des plus anciennes) dont les clés expirent après ttl secondes.
+    """
+
+    def __init__(self, maxsize=100000, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._keys = OrderedDict()  # clé -> expires_at (ordre d'insertion = ordre d'expiration)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            expires_at = self._keys.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.monotonic():
+                del self._keys[key]
+                return False
+            return True
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add_many(self, keys):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                self._keys[key] = expires_at
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+
+class DedupCounter:
+
+    def __init__(self):
+        self.checked = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self._lock = threading.Lock()
+
+    def add(self, checked=0, memory_hits=0, db_hits=0):
+        with self._lock:
+            self.checked += checked
+            self.memory_hits += memory_hits
+            self.db_hits += db_hits
+
+    def stats(self):
+        hits = self.memory_hits + self.db_hits
+        return {
+            "checked": self.checked,
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "hit_rate": round(hits / self.checked, 4) if self.checked else 0.0,
+        }
+
+
+_maxsize = getattr(settings, "DEDUP_RECENT_MAXSIZE", 100000)
+
+recent_uplinks = RecentKeys(maxsize=_maxsize, ttl=dedup_window())
+recent_points = RecentKeys(maxsize=_maxsize, ttl=dedup_window())
+
+uplink_counter = DedupCounter()
+# db_hits des points: lignes écartées par la contrainte unique (ingest.save_point_columns)
+point_counter = DedupCounter()
+
+
+def uplink_key(record):
+    if record.get("f_cnt") is None:
+        return None
+    return record["device_eui"], record["f_cnt"]
+
+
+def point_key(record):
+    return record["device_eui"], record["point"]["ts"]
+
+
+def filter_recent(records, recent, counter, key_func):
+    """
+    Retire les doublons déjà vus par ce process et ceux internes au lot.
+    Les records sans clé (key_func -> None) sont toujours gardés.
+    """
+    kept = filter_recent_keys([key_func(record) for record in records], recent, counter)
+    return [records[i] for i in kept]
+
+
+def filter_recent_keys(keys, recent, counter):
+    """
+    Comme filter_recent, sur une liste de clés (lots en colonnes).
+    Retour: les indices des clés gardées.
+    """
+    kept = []
+    batch_keys = set()
+    hits = 0
+    for i, key in enumerate(keys):
+        if key is not None:
+            if key in batch_keys or key in recent:
+                hits += 1
+                continue
+            batch_keys.add(key)
+        kept.append(i)
+    counter.add(checked=len(keys), memory_hits=hits)
+    return kept
+
+
+def remember(records, recent, key_func):
+    recent.add_many(key for key in map(key_func, records) if key is not None)
+
+
+# --------------------------
+# Clés (device, f_cnt) en base
+# --------------------------
+_last_prune = 0.0
+
+
+def _claim_sql(n):
+    table = UplinkDedupKey._meta.db_table
+    # PostgreSQL et SQLite >= 3.35 (RETURNING)
+    return (
+        f"INSERT INTO {table} (device_id, f_cnt, seen_at) "
+        f"VALUES {', '.join(['(%s, %s, %s)'] * n)} "
+        f"ON CONFLICT (device_id, f_cnt) DO UPDATE SET seen_at = EXCLUDED.seen_at "
+        f"WHERE {table}.seen_at < %s "
+        f"RETURNING device_id, f_cnt"
+    )
+
+
+def claim_uplink_keys(keys, now=None):
+    """
+    keys: {(device_id, f_cnt), ...} sans doublon. Insère les clés nouvelles et
+    reprend celles plus vieilles que DEDUP_WINDOW.
+    Retour: les clés obtenues; les autres sont des doublons.
+    À appeler dans la transaction qui écrit les uplinks.
+    """
+    global _last_prune
+
+    keys = list(keys)
+    if not keys:
+        return set()
+
+    now = now or timezone.now()
+    expired_before = now - timedelta(seconds=dedup_window())
+
+    claimed = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            params = []
+            for device_id, f_cnt in chunk:
+                params += [device_id, f_cnt, now]
+            cursor.execute(_claim_sql(len(chunk)), params + [expired_before])
+            claimed.update(tuple(row) for row in cursor.fetchall())
+
+        # purge des clés expirées, au plus une fois par dixième de fenêtre et par process
+        if time.monotonic() - _last_prune > dedup_window() / 10:
+            _last_prune = time.monotonic()
+            UplinkDedupKey.objects.filter(seen_at__lt=expired_before).delete()
+
+    uplink_counter.add(db_hits=len(keys) - len(claimed))
+    return claimed
+
+
+def dedup_stats():
+    return {
+        "uplink": {**uplink_counter.stats(), "recent_keys": len(recent_uplinks)},
+        "point": {**point_counter.stats(), "recent_keys": len(recent_points)},
+        "window": dedup_window(),
+    }
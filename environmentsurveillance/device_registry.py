@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .models import Device
+
+
+DeviceEntry = namedtuple("DeviceEntry", ["id", "name", "is_active"])
+
+# SQLSTATE foreign_key_violation
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_missing_device_error(exc):
+    """
+    IntegrityError de la FK vers Device: le device a été supprimé (autre
+    worker, admin) alors que son id était encore dans le cache.
+    """
+    cause = exc.__cause__
+    # psycopg 3: sqlstate, psycopg2: pgcode
+    return (getattr(cause, "sqlstate", None) or getattr(cause, "pgcode", None)) == FOREIGN_KEY_VIOLATION
+
+
+class DeviceRegistry:
+    """
+    Cache process-local EUI -> (id, name, is_active).
+
+    - taille bornée, éviction LRU
+    - TTL pour rattraper les modifications faites par un autre worker
+    - invalidé par les signaux post_save / post_delete de Device (vues + admin);
+      une suppression dans un autre worker n'est vue qu'au TTL, ou quand l'INSERT
+      échoue sur la FK (ingest: invalidation et nouvel essai, une fois)
+    - les EUI inconnus sont créés en un seul INSERT par lot, sous verrou,
+      pour qu'une rafale de nouveaux devices ne provoque pas d'INSERT concurrents
+    """
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # eui -> (entry, expires_at)
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    # ---- cache ----
+    def _get_cached(self, eui):
+        with self._lock:
+            item = self._entries.get(eui)
+            if item is None:
+                self.misses += 1
+                return None
+            entry, expires_at = item
+            if expires_at < time.monotonic():
+                del self._entries[eui]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(eui)
+            self.hits += 1
+            return entry
+
+    def _put(self, eui, entry):
+        with self._lock:
+            self._entries[eui] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(eui)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _fetch(self, euis):
+        found = {}
+        rows = Device.objects.filter(device_eui__in=euis).values_list("device_eui", "id", "name", "is_active")
+        for eui, pk, name, is_active in rows:
+            entry = DeviceEntry(pk, name, is_active)
+            self._put(eui, entry)
+            found[eui] = entry
+        return found
+
+    async def _afetch(self, euis):
+        found = {}
+        rows = Device.objects.filter(device_eui__in=euis).values_list("device_eui", "id", "name", "is_active")
+        async for eui, pk, name, is_active in rows:
+            entry = DeviceEntry(pk, name, is_active)
+            self._put(eui, entry)
+            found[eui] = entry
+        return found
+
+    def invalidate(self, eui=None, pk=None):
+        with self._lock:
+            if eui is not None:
+                self._entries.pop(eui, None)
+            if pk is not None:
+                # l'EUI a pu changer (admin): on retire aussi l'ancienne clé
+                for key in [k for k, (e, _) in self._entries.items() if e.id == pk]:
+                    del self._entries[key]
+
+    def set_name(self, eui, name):
+        entry = self._get_cached(eui)
+        if entry is not None:
+            self._put(eui, entry._replace(name=name))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def warm(self):
+        rows = (
+            Device.objects.order_by("-id")
+            .values_list("device_eui", "id", "name", "is_active")[:self.maxsize]
+        )
+        for eui, pk, name, is_active in rows:
+            self._put(eui, DeviceEntry(pk, name, is_active))
+
+    def stats(self):
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    # ---- lookups ----
+    def get(self, eui):
+        """
+        Retourne le DeviceEntry ou None si l'EUI n'existe pas en base.
+        """
+        entry = self._get_cached(eui)
+        if entry is None:
+            entry = self._fetch([eui]).get(eui)
+        return entry
+
+    def resolve(self, eui, name):
+        return self.resolve_many({eui: name})[eui]
+
+    def resolve_many(self, names_by_eui):
+        """
+        {eui: nom par défaut} -> {eui: DeviceEntry}, en créant les devices manquants.
+        """
+        resolved = {}
+        missing = []
+        for eui in names_by_eui:
+            entry = self._get_cached(eui)
+            if entry is None:
+                missing.append(eui)
+            else:
+                resolved[eui] = entry
+
+        if missing:
+            resolved.update(self._fetch(missing))
+            missing = [eui for eui in missing if eui not in resolved]
+
+        if missing:
+            with self._create_lock:
+                # un autre thread a pu les créer pendant qu'on attendait le verrou
+                resolved.update(self._fetch(missing))
+                to_create = [
+                    Device(device_eui=eui, name=names_by_eui[eui])
+                    for eui in missing
+                    if eui not in resolved
+                ]
+                if to_create:
+                    # ignore_conflicts: un autre worker peut insérer le même EUI
+                    Device.objects.bulk_create(to_create, ignore_conflicts=True)
+                    resolved.update(self._fetch([d.device_eui for d in to_create]))
+
+        return resolved
+
+    # ---- lookups async (vues ASGI) ----
+    async def aget(self, eui):
+        entry = self._get_cached(eui)
+        if entry is None:
+            entry = (await self._afetch([eui])).get(eui)
+        return entry
+
+    async def aresolve_many(self, names_by_eui):
+        """
+        Comme resolve_many. Pas de verrou process ici (il bloquerait la boucle
+        d'événements): ignore_conflicts + relecture suffisent à la correction.
+        """
+        resolved = {}
+        missing = []
+        for eui in names_by_eui:
+            entry = self._get_cached(eui)
+            if entry is None:
+                missing.append(eui)
+            else:
+                resolved[eui] = entry
+
+        if missing:
+            resolved.update(await self._afetch(missing))
+            to_create = [
+                Device(device_eui=eui, name=names_by_eui[eui])
+                for eui in missing
+                if eui not in resolved
+            ]
+            if to_create:
+                await Device.objects.abulk_create(to_create, ignore_conflicts=True)
+                resolved.update(await self._afetch([d.device_eui for d in to_create]))
+
+        return resolved
+
+
+device_registry = DeviceRegistry(
+    maxsize=getattr(settings, "DEVICE_REGISTRY_MAXSIZE", 10000),
+    ttl=getattr(settings, "DEVICE_REGISTRY_TTL", 300),
+)
@@ -0,0 +1,208 @@
+"""
+Sous-échantillonnage de l'historique (telemetry_history?maxPoints=...&resolution=...).
+
+1. SQL: agrégation en buckets de temps (moyennes) -> quelques milliers de lignes max
+2. NumPy: sélection de maxPoints lignes
+   - Douglas–Peucker (classé) sur la trace lat/lng
+   - LTTB sur les séries capteurs (temp, battery, rssi, snr)
+"""
+import math
+
+import numpy as np
+from django.db.models import Avg, Count, Max, Min, Value
+from django.db.models.functions import Extract, Floor
+
+from .queries import history_queryset
+
+
+SENSOR_FIELDS = ("temp", "battery", "rssi", "snr")
+
+# nb de buckets SQL par point final
+PREAGGREGATE_FACTOR = 10
+
+# plafond de maxPoints, et valeur par défaut quand seul ?resolution= est donné
+MAX_POINTS = 5000
+
+
+# --------------------------
+# Algorithmes (NumPy)
+# --------------------------
+def douglas_peucker_rank(x, y):
+    """
+    Importance de chaque point selon Douglas–Peucker: la distance à laquelle
+    il serait conservé. Les extrémités valent +inf. Garder les k plus grands
+    donne la simplification DP à k points.
+    """
+    n = len(x)
+    rank = np.zeros(n)
+    if n == 0:
+        return rank
+    rank[0] = rank[-1] = np.inf
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        a, b, cap = stack.pop()
+        if b - a < 2:
+            continue
+        xs = x[a + 1:b]
+        ys = y[a + 1:b]
+        dx = x[b] - x[a]
+        dy = y[b] - y[a]
+        norm = math.hypot(dx, dy)
+        if norm == 0:
+            d = np.hypot(xs - x[a], ys - y[a])
+        else:
+            d = np.abs(dy * (xs - x[a]) - dx * (ys - y[a])) / norm
+
+        i = int(np.argmax(d))
+        k = a + 1 + i
+        # un enfant ne peut pas être plus important que son parent
+        dist = min(float(d[i]), cap)
+        rank[k] = dist
+        stack.append((a, k, dist))
+        stack.append((k, b, dist))
+    return rank
+
+
+def simplify_track(lat, lng, k):
+    """
+    Indices (triés) des k points de la trace à conserver.
+    lng est pondéré par cos(lat) pour que les distances soient ~isotropes.
+    """
+    n = len(lat)
+    if k >= n:
+        return np.arange(n)
+    scale = math.cos(math.radians(float(np.nanmean(lat)))) if n else 1.0
+    rank = douglas_peucker_rank(lng * scale, lat)
+    keep = np.argpartition(-rank, k - 1)[:k]
+    return np.sort(keep)
+
+
+def lttb(t, v, k):
+    """
+    Largest-Triangle-Three-Buckets: indices (triés) de k points de la série v(t).
+    """
+    n = len(t)
+    if k >= n:
+        return np.arange(n)
+    if k < 3:
+        return np.array([0, n - 1][:k])
+
+    every = (n - 2) / (k - 2)
+    out = np.empty(k, dtype=np.int64)
+    out[0] = 0
+    a = 0
+    for i in range(k - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        next_start = end
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        if next_start >= next_end:
+            avg_t, avg_v = t[n - 1], v[n - 1]
+        else:
+            avg_t = t[next_start:next_end].mean()
+            avg_v = v[next_start:next_end].mean()
+
+        area = np.abs(
+            (t[a] - avg_t) * (v[start:end] - v[a])
+            - (t[a] - t[start:end]) * (avg_v - v[a])
+        )
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    out[k - 1] = n - 1
+    return out
+
+
+def select_indices(columns, max_points):
+    """
+    Combine DP (trace) et LTTB (capteurs) pour choisir au plus max_points lignes.
+    Moitié du budget pour la trace, le reste partagé entre les séries capteurs présentes.
+    """
+    n = len(columns["ts"])
+    if n <= max_points:
+        return np.arange(n)
+
+    series = [f for f in SENSOR_FIELDS if not np.isnan(columns[f]).all()]
+    track_budget = max_points if not series else max(2, max_points // 2)
+    keep = [simplify_track(columns["lat"], columns["lng"], track_budget)]
+
+    if series:
+        per_series = max(3, (max_points - track_budget) // len(series))
+        for field in series:
+            valid = np.flatnonzero(~np.isnan(columns[field]))
+            picked = lttb(columns["ts"][valid], columns[field][valid], per_series)
+            keep.append(valid[picked])
+
+    idx = np.unique(np.concatenate(keep))
+    if len(idx) > max_points:
+        # doublons entre séries en moins -> rarement nécessaire; on garde les extrémités
+        inner = idx[1:-1]
+        pick = np.linspace(0, len(inner) - 1, max_points - 2).round().astype(np.int64)
+        idx = np.concatenate(([idx[0]], inner[pick], [idx[-1]]))
+    return idx
+
+
+# --------------------------
+# Requête
+# --------------------------
+def _bucketed_rows(device_id, from_dt, to_dt, resolution):
+    """
+    Agrégation SQL par buckets de `resolution` secondes.
+    """
+    bucket = Floor(Extract("ts", "epoch") / Value(float(resolution)))
+    return (
+        history_queryset(device_id, from_dt, to_dt)
+        .order_by()
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(
+            t=Min("ts"),
+            n=Count("id"),
+            lat_avg=Avg("lat"),
+            lng_avg=Avg("lng"),
+            temp_avg=Avg("temp"),
+            battery_avg=Avg("battery"),
+            rssi_avg=Avg("rssi"),
+            snr_avg=Avg("snr"),
+        )
+        .order_by("bucket")
+        .values_list("t", "n", "lat_avg", "lng_avg", "temp_avg", "battery_avg", "rssi_avg", "snr_avg")
+    )
+
+
+def downsample_history(device_id, from_dt=None, to_dt=None, max_points=None, resolution=None):
+    """
+    Retour: (history, meta) avec history = [ {ts,lat,lng,temp,battery,rssi,snr}, ... ]
+    (ancien -> récent) et meta = {"sourceCount": ..., "resolution": ...}
+
+    Au plus max_points points (MAX_POINTS par défaut); une resolution trop
+    fine pour la période est élargie pour que le SQL renvoie au plus
+    max_points * PREAGGREGATE_FACTOR buckets.
+    """
+    max_points = min(max_points or MAX_POINTS, MAX_POINTS)
+    bounds = history_queryset(device_id, from_dt, to_dt).order_by().aggregate(first=Min("ts"), last=Max("ts"))
+    if bounds["first"] is None:
+        return [], {"sourceCount": 0, "resolution": resolution}
+    span = (bounds["last"] - bounds["first"]).total_seconds()
+    resolution = max(resolution or 1.0, span / (max_points * PREAGGREGATE_FACTOR))
+
+    rows = list(_bucketed_rows(device_id, from_dt, to_dt, resolution))
+    if not rows:
+        return [], {"sourceCount": 0, "resolution": resolution}
+
+    ts_col, n_col, *values = zip(*rows)
+    columns = {"ts": np.array([t.timestamp() for t in ts_col])}
+    for field, col in zip(("lat", "lng") + SENSOR_FIELDS, values):
+        columns[field] = np.array(col, dtype=float)  # None -> nan
+
+    idx = select_indices(columns, max_points)
+
+    history = []
+    for i in idx.tolist():
+        point = {"ts": int(columns["ts"][i])}
+        for field in ("lat", "lng") + SENSOR_FIELDS:
+            v = columns[field][i]
+            point[field] = None if np.isnan(v) else float(v)
+        history.append(point)
+
+    return history, {"sourceCount": int(sum(n_col)), "resolution": resolution}
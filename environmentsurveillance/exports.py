@@ -0,0 +1,159 @@
+"""
+Pagination par curseur (keyset) et export en streaming (NDJSON / CSV).
+"""
+import base64
+import csv
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+# --------------------------
+# Curseurs
+# --------------------------
+def encode_cursor(dt, pk):
+    """
+    (datetime, id) -> curseur opaque, ex. "MTc5MjMzMDczMDAwMDAwMDoxMg"
+    """
+    micros = int(dt.timestamp() * 1_000_000)
+    return base64.urlsafe_b64encode(f"{micros}:{pk}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    curseur -> (datetime, id), None si invalide
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        micros, pk = raw.split(":")
+        dt = datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc)
+        return dt, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_before(qs, field, cursor):
+    """
+    Lignes strictement avant le curseur dans l'ordre (field DESC, id DESC).
+    Le `field <= x` redondant laisse le planner borner le parcours d'index.
+    """
+    dt, pk = cursor
+    return qs.filter(**{f"{field}__lte": dt}).filter(
+        Q(**{f"{field}__lt": dt}) | Q(**{field: dt, "id__lt": pk})
+    )
+
+
+# --------------------------
+# Streaming
+# --------------------------
+class _Echo:
+    """
+    Pseudo-fichier pour csv.writer: write() renvoie la ligne au lieu de la stocker.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _iter_ndjson(rows, fields, transform):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, transform(row)))) + "\n"
+
+
+def _csv_values(row, transform):
+    return [
+        json.dumps(v, cls=DjangoJSONEncoder) if isinstance(v, (dict, list)) else ("" if v is None else v)
+        for v in transform(row)
+    ]
+
+
+def _iter_csv(rows, fields, transform):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(_csv_values(row, transform))
+
+
+async def _aiter_rows(qs):
+    """
+    Lignes de qs.iterator() par paquets de EXPORT_CHUNK_SIZE, lues dans le
+    thread de la connexion (thread_sensitive): le curseur serveur reste ouvert
+    entre deux paquets sans bloquer la boucle d'événements.
+    (qs.aiterator() exécute la requête dans la boucle pour un values_list.)
+    """
+    rows = qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    while True:
+        chunk = await next_chunk()
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+
+
+async def _aiter_ndjson(rows, fields, transform):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    async for row in rows:
+        yield encoder.encode(dict(zip(fields, transform(row)))) + "\n"
+
+
+async def _aiter_csv(rows, fields, transform):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    async for row in rows:
+        yield writer.writerow(_csv_values(row, transform))
+
+
+def streaming_export(qs, fields, fmt, filename, transform=None):
+    """
+    StreamingHttpResponse qui parcourt qs.values_list(...) par paquets de
+    EXPORT_CHUNK_SIZE (curseur serveur en PostgreSQL): la mémoire du worker
+    reste constante quel que soit le nombre de lignes.
+
+    qs: queryset déjà en values_list, fields: noms de colonnes en sortie,
+    transform: row -> tuple de valeurs (conversions éventuelles)
+    """
+    transform = transform or (lambda row: row)
+    rows = qs.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if fmt == "csv":
+        content = _iter_csv(rows, fields, transform)
+    else:
+        content = _iter_ndjson(rows, fields, transform)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def astreaming_export(qs, fields, fmt, filename, transform=None):
+    """
+    Comme streaming_export, pour les vues async: contenu en itérateur async
+    (sous ASGI, Django chargerait entièrement en mémoire un itérateur synchrone).
+    """
+    transform = transform or (lambda row: row)
+    rows = _aiter_rows(qs)
+    if fmt == "csv":
+        content = _aiter_csv(rows, fields, transform)
+    else:
+        content = _aiter_ndjson(rows, fields, transform)
+
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,192 @@
+"""
+Flotte synthétique: N devices x M points, traces GPS et webhooks TTN v3.
+
+Tout est dérivé de `seed`: deux générations avec les mêmes paramètres
+donnent exactement les mêmes devices, traces et uplinks (benchmarks
+comparables d'un run à l'autre).
+
+- ~70 % de devices mobiles (marche aléatoire avec cap et vitesse qui
+  dérivent), les autres fixes avec le bruit d'un GPS à l'arrêt.
+- température journalière (sinusoïde + bruit), batterie qui se décharge,
+  RSSI / SNR / SF par device, f_cnt croissant, received_at = ts du point.
+- vary_uplink: formes de decoded_payload et passerelles multiples (replay_ttn).
+"""
+import base64
+import math
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from .ingest import parse_ttn_uplink, save_uplinks
+
+
+# zone de départ des devices (région de Dakar)
+FLEET_BBOX = (-17.55, 14.65, -17.15, 14.85)
+GATEWAYS = ("gw-dakar-plateau", "gw-dakar-almadies", "gw-pikine", "gw-rufisque")
+
+
+def make_fleet_euis(n, prefix="FL"):
+    return [f"{prefix}{i:0{16 - len(prefix)}X}" for i in range(n)]
+
+
+def device_track(eui, points, start, interval, seed=0):
+    """
+    -> [(ts, lat, lng, temp, battery, rssi, snr), ...] d'un device, du plus ancien au plus récent
+    """
+    rng = random.Random(f"{seed}:{eui}")
+    min_lng, min_lat, max_lng, max_lat = FLEET_BBOX
+    lat = rng.uniform(min_lat, max_lat)
+    lng = rng.uniform(min_lng, max_lng)
+    mobile = rng.random() < 0.7
+    heading = rng.uniform(0, 2 * math.pi)
+    speed = rng.uniform(2, 15)  # m/s
+    battery = rng.uniform(3600, 4200)
+    base_rssi = rng.uniform(-115, -60)
+    base_temp = rng.uniform(24, 30)
+
+    track = []
+    for i in range(points):
+        ts = start + timedelta(seconds=i * interval + rng.uniform(0, interval / 10))
+        if mobile:
+            heading += rng.gauss(0, 0.3)
+            speed = min(max(speed + rng.gauss(0, 1), 0.0), 25.0)
+            distance = speed * interval
+            lat += distance * math.cos(heading) / 111_320
+            lng += distance * math.sin(heading) / (111_320 * math.cos(math.radians(lat)))
+            # demi-tour en sortie de zone
+            if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+                heading += math.pi
+                lat = min(max(lat, min_lat), max_lat)
+                lng = min(max(lng, min_lng), max_lng)
+            fix_lat, fix_lng = lat, lng
+        else:
+            fix_lat = lat + rng.gauss(0, 0.00003)
+            fix_lng = lng + rng.gauss(0, 0.00003)
+
+        hour = ts.hour + ts.minute / 60
+        temp = base_temp + 4 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 0.3)
+        battery -= rng.uniform(0, 0.05)
+        rssi = base_rssi + rng.gauss(0, 4)
+        snr = min(max((rssi + 120) / 5 + rng.gauss(0, 2), -20.0), 12.0)
+        track.append((
+            ts, round(fix_lat, 6), round(fix_lng, 6), round(temp, 2), int(battery), round(rssi), round(snr, 1),
+        ))
+    return track
+
+
+def ttn_uplink_payload(eui, f_cnt, ts, lat, lng, temp, battery, rssi, snr, spreading_factor=7, gateway=GATEWAYS[0]):
+    """
+    Webhook TTN v3 (uplink_message) tel que l'envoie The Things Stack.
+    """
+    frm_payload = base64.b64encode(f_cnt.to_bytes(4, "big") + battery.to_bytes(2, "big") * 3).decode()
+    received_at = ts.isoformat().replace("+00:00", "Z")
+    device_id = f"fleet-{eui[-6:].lower()}"
+    return {
+        "end_device_ids": {
+            "device_id": device_id,
+            "application_ids": {"application_id": "environment-surveillance"},
+            "dev_eui": eui,
+            "dev_addr": eui[-8:],
+        },
+        "received_at": received_at,
+        "uplink_message": {
+            "f_port": 1,
+            "f_cnt": f_cnt,
+            "frm_payload": frm_payload,
+            "decoded_payload": {"latitude": lat, "longitude": lng, "temp": temp, "battery": battery},
+            "rx_metadata": [{
+                "gateway_ids": {"gateway_id": gateway},
+                "rssi": rssi,
+                "channel_rssi": rssi,
+                "snr": snr,
+            }],
+            "settings": {
+                "data_rate": {"lora": {"bandwidth": 125000, "spreading_factor": spreading_factor}},
+                "frequency": "868100000",
+            },
+            "consumed_airtime": f"{0.05 * 2 ** (spreading_factor - 7):.6f}s",
+            "received_at": received_at,
+        },
+    }
+
+
+# formes de decoded_payload rencontrées selon le formatter TTN (voir normalize.DECODED_ALIASES)
+def _short_shape(d):
+    return {"lat": d["latitude"], "lng": d["longitude"], "temp": d["temp"], "battery_level": d["battery"]}
+
+
+def _gps_shape(d):
+    return {"gps": {"lat": d["latitude"], "lon": d["longitude"], "alt": 12}, "temp": d["temp"], "battery": d["battery"]}
+
+
+DECODED_SHAPES = (("flat", None), ("short", _short_shape), ("gps", _gps_shape), ("raw", None))
+
+
+def vary_uplink(payload, rng):
+    """
+    Variante "terrain" d'un webhook: forme du decoded_payload tirée au sort (dont
+    "raw": pas de formatter, frm_payload seul), 1 à 4 passerelles dans rx_metadata.
+    """
+    uplink = payload["uplink_message"]
+    shape, transform = rng.choices(DECODED_SHAPES, weights=(5, 2, 2, 1))[0]
+    if shape == "raw":
+        del uplink["decoded_payload"]
+    elif transform is not None:
+        uplink["decoded_payload"] = transform(uplink["decoded_payload"])
+
+    first = uplink["rx_metadata"][0]
+    others = [g for g in GATEWAYS if g != first["gateway_ids"]["gateway_id"]]
+    for gateway in rng.sample(others, rng.choice((0, 0, 1, 2, 3))):
+        rssi = first["rssi"] - rng.randint(1, 20)
+        uplink["rx_metadata"].append({
+            "gateway_ids": {"gateway_id": gateway},
+            "rssi": rssi,
+            "channel_rssi": rssi,
+            "snr": round(first["snr"] - rng.uniform(0, 5), 1),
+        })
+    return payload
+
+
+def fleet_uplinks(euis, points, start=None, interval=60, seed=0):
+    """
+    -> webhooks TTN de toute la flotte, dans l'ordre chronologique de réception
+    """
+    if start is None:
+        start = datetime.now(dt_timezone.utc) - timedelta(seconds=points * interval)
+    tracks = []
+    for eui in euis:
+        rng = random.Random(f"{seed}:{eui}:radio")
+        gateway = rng.choice(GATEWAYS)
+        spreading_factor = rng.choice((7, 7, 7, 8, 9, 10, 12))
+        tracks.append((eui, gateway, spreading_factor, device_track(eui, points, start, interval, seed)))
+
+    for i in range(points):
+        for eui, gateway, spreading_factor, track in tracks:
+            ts, lat, lng, temp, battery, rssi, snr = track[i]
+            yield ttn_uplink_payload(
+                eui, i + 1, ts, lat, lng, temp, battery, rssi, snr,
+                spreading_factor=spreading_factor, gateway=gateway,
+            )
+
+
+def generate_fleet(devices, points, start=None, interval=60, seed=0, prefix="FL", batch_size=1000):
+    """
+    Écrit la flotte via le chemin d'ingest TTN (parse_ttn_uplink + save_uplinks par lots):
+    TTNUplink, TelemetryPoint, DeviceLastSeen... comme en production.
+    Retour: nombre d'uplinks écrits
+    """
+    euis = make_fleet_euis(devices, prefix)
+    batch = []
+    written = 0
+    for payload in fleet_uplinks(euis, points, start, interval, seed):
+        record, error = parse_ttn_uplink(payload)
+        if error:
+            raise ValueError(error)
+        batch.append(record)
+        if len(batch) >= batch_size:
+            save_uplinks(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        save_uplinks(batch)
+        written += len(batch)
+    return written
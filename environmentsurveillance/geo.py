@@ -0,0 +1,235 @@
+"""
+Géométrie des requêtes spatiales: geohash, formes (bbox, cercle, polygone).
+
+TelemetryPoint.geohash (précision GEOHASH_PRECISION, renseigné à l'ingest)
+est indexé en varchar_pattern_ops: une zone est couverte par quelques
+cellules geohash, et chaque cellule devient un "geohash LIKE 'cellule%'"
+servi par l'index. Le filtre exact (bbox, distance, polygone) est appliqué
+ensuite sur les seules lignes candidates.
+
+Conventions: bbox = (min_lng, min_lat, max_lng, max_lat) comme le paramètre
+bbox de l'API, polygones en [[lng, lat], ...]. L'antiméridien n'est pas géré.
+"""
+import math
+
+
+GEOHASH_PRECISION = 8  # ~38 m x 19 m
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_M = 6_371_008.8
+MAX_RADIUS_M = math.pi * EARTH_RADIUS_M  # demi-circonférence: tout le globe
+
+
+# --------------------------
+# Geohash
+# --------------------------
+# octet -> ses bits écartés d'un rang (0b1011 -> 0b1000101), pour entrelacer lat / lng
+_SPREAD = [sum(((i >> k) & 1) << (2 * k) for k in range(8)) for i in range(256)]
+
+
+def _spread(x):
+    result = 0
+    shift = 0
+    while x:
+        result |= _SPREAD[x & 0xFF] << shift
+        x >>= 8
+        shift += 16
+    return result
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """
+    Entrelacement direct des deux coordonnées quantifiées (code de Morton),
+    sans la bissection bit à bit: appelé pour chaque point ingéré.
+    """
+    total = 5 * precision
+    lng_bits = (total + 1) // 2
+    lat_bits = total // 2
+    lat_i = min(max(int((lat + 90.0) * ((1 << lat_bits) / 180.0)), 0), (1 << lat_bits) - 1)
+    lng_i = min(max(int((lng + 180.0) * ((1 << lng_bits) / 360.0)), 0), (1 << lng_bits) - 1)
+    # le bit de poids fort est un bit de longitude
+    if total % 2:
+        code = _spread(lng_i) | (_spread(lat_i) << 1)
+    else:
+        code = (_spread(lng_i) << 1) | _spread(lat_i)
+    return "".join(_BASE32[(code >> shift) & 31] for shift in range(total - 5, -1, -5))
+
+
+def geohash_bbox(geohash):
+    """
+    cellule -> (min_lng, min_lat, max_lng, max_lat)
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for c in geohash:
+        value = _DECODE[c]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                lng_lo, lng_hi = (mid, lng_hi) if bit else (lng_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lng_lo, lat_lo, lng_hi, lat_hi
+
+
+def cell_size(precision):
+    """
+    -> (largeur en degrés de longitude, hauteur en degrés de latitude)
+    """
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 360.0 / 2 ** lng_bits, 180.0 / 2 ** lat_bits
+
+
+def _clamp_bbox(bbox):
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if not all(map(math.isfinite, bbox)):
+        raise ValueError("Invalid bbox")
+    return (
+        min(max(min_lng, -180.0), 180.0), min(max(min_lat, -90.0), 90.0),
+        min(max(max_lng, -180.0), 180.0), min(max(max_lat, -90.0), 90.0),
+    )
+
+
+def _cell_ranges(bbox, precision):
+    """
+    -> (colonnes, lignes) de la grille geohash `precision` touchées par la bbox (bornée au globe)
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    width, height = cell_size(precision)
+    last_col = 2 ** ((5 * precision + 1) // 2) - 1
+    last_row = 2 ** (5 * precision // 2) - 1
+    cols = range(int((min_lng + 180.0) // width), min(int((max_lng + 180.0) // width), last_col) + 1)
+    rows = range(int((min_lat + 90.0) // height), min(int((max_lat + 90.0) // height), last_row) + 1)
+    return cols, rows
+
+
+def covering_cells(bbox, max_cells=32, max_precision=GEOHASH_PRECISION):
+    """
+    Cellules geohash (la plus fine précision qui tient en max_cells) dont
+    l'union couvre la bbox, bornée à [-180, 180] x [-90, 90].
+    ValueError si aucune précision ne tient en max_cells.
+    """
+    bbox = _clamp_bbox(bbox)
+    for precision in range(max_precision, 0, -1):
+        cols, rows = _cell_ranges(bbox, precision)
+        if len(cols) * len(rows) <= max_cells:
+            break
+    else:
+        raise ValueError("Area too large")
+
+    width, height = cell_size(precision)
+    cells = set()
+    for i in rows:
+        lat = -90.0 + (i + 0.5) * height
+        for j in cols:
+            cells.add(geohash_encode(lat, -180.0 + (j + 0.5) * width, precision))
+    return sorted(cells)
+
+
+# --------------------------
+# Formes
+# --------------------------
+def haversine_m(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _check_finite(*values):
+    if not all(map(math.isfinite, values)):
+        raise ValueError("Coordinates must be finite numbers")
+
+
+class BBox:
+
+    def __init__(self, min_lng, min_lat, max_lng, max_lat):
+        _check_finite(min_lng, min_lat, max_lng, max_lat)
+        if min_lng > max_lng or min_lat > max_lat:
+            raise ValueError("Invalid bbox")
+        self.bbox = (min_lng, min_lat, max_lng, max_lat)
+
+    def contains(self, lat, lng):
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+class Circle:
+
+    def __init__(self, lat, lng, radius):
+        _check_finite(lat, lng, radius)
+        if not 0 < radius <= MAX_RADIUS_M:
+            raise ValueError("Invalid radius")
+        self.lat, self.lng, self.radius = lat, lng, radius
+        dlat = math.degrees(radius / EARTH_RADIUS_M)
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        self.bbox = (lng - dlng, lat - dlat, lng + dlng, lat + dlat)
+
+    def contains(self, lat, lng):
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            return False
+        return haversine_m(self.lat, self.lng, lat, lng) <= self.radius
+
+
+class Polygon:
+    """
+    Polygone simple [[lng, lat], ...] (fermé ou non), test pair-impair.
+    """
+
+    def __init__(self, coordinates):
+        points = [(float(lng), float(lat)) for lng, lat in coordinates]
+        _check_finite(*(v for point in points for v in point))
+        if len(points) > 1 and points[0] == points[-1]:
+            points.pop()
+        if len(points) < 3:
+            raise ValueError("A polygon needs at least 3 points")
+        self.points = points
+        # arêtes précalculées: (x1, y1, x2, y2, pente inverse)
+        self._edges = [
+            (x1, y1, x2, y2, (x2 - x1) / (y2 - y1) if y2 != y1 else 0.0)
+            for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1])
+        ]
+        lngs = [x for x, _ in points]
+        lats = [y for _, y in points]
+        self.bbox = (min(lngs), min(lats), max(lngs), max(lats))
+
+    def contains(self, lat, lng):
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lng <= lng <= max_lng):
+            return False
+        inside = False
+        for x1, y1, x2, y2, slope in self._edges:
+            if (y1 > lat) != (y2 > lat) and lng < x1 + (lat - y1) * slope:
+                inside = not inside
+        return inside
+
+
+def parse_shape(params):
+    """
+    Paramètres GET -> forme, None si aucune, ValueError si invalide:
+      bbox=minLng,minLat,maxLng,maxLat
+      lat=..&lng=..&radius=.. (mètres)
+      polygon=lng1,lat1,lng2,lat2,...
+    """
+    try:
+        if params.get("polygon"):
+            values = [float(x) for x in params["polygon"].split(",")]
+            if len(values) % 2:
+                raise ValueError("Invalid polygon")
+            return Polygon(zip(values[::2], values[1::2]))
+        if params.get("radius"):
+            return Circle(float(params["lat"]), float(params["lng"]), float(params["radius"]))
+        if params.get("bbox"):
+            return BBox(*(float(x) for x in params["bbox"].split(",")))
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"Invalid area: {exc}")
+    return None
@@ -0,0 +1,161 @@
+"""
+Évaluation des géorepères (Geofence) pour chaque point ingéré.
+
+Les zones actives sont rangées dans une grille en mémoire (cellules de
+GEOFENCE_GRID_CELL degrés): un point ne teste que les zones dont la bbox
+touche sa cellule, le coût ne dépend donc pas du nombre total de zones.
+
+Le listener de points garde, par device, les zones qui contiennent son
+dernier point et signale les entrées / sorties aux listeners enregistrés
+(register_geofence_listener). Il n'est branché sur l'ingest qu'au premier
+listener enregistré: sans consommateur, l'ingest ne paie rien. L'état est
+propre au process; la liste des devices dans une zone (API) se calcule en
+base, sur le dernier point.
+"""
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from .ingest import register_point_listener
+from .models import Geofence
+
+
+logger = logging.getLogger(__name__)
+
+# au-delà, une zone n'est pas découpée en cellules mais testée à chaque point (bbox d'abord)
+MAX_CELLS_PER_FENCE = 4096
+
+
+class GeofenceIndex:
+    """
+    Grille: (ligne, colonne) -> [zones dont la bbox touche la cellule].
+    """
+
+    def __init__(self, fences, cell=0.05):
+        self.cell = cell
+        self.fences = {}  # id -> (nom, forme)
+        self._grid = {}
+        self._large = []
+        for fence_id, name, shape in fences:
+            self.fences[fence_id] = (name, shape)
+            min_lng, min_lat, max_lng, max_lat = shape.bbox
+            rows = range(math.floor(min_lat / cell), math.floor(max_lat / cell) + 1)
+            cols = range(math.floor(min_lng / cell), math.floor(max_lng / cell) + 1)
+            entry = (fence_id, shape)
+            if len(rows) * len(cols) > MAX_CELLS_PER_FENCE:
+                self._large.append(entry)
+                continue
+            for row in rows:
+                for col in cols:
+                    self._grid.setdefault((row, col), []).append(entry)
+
+    def __len__(self):
+        return len(self.fences)
+
+    def lookup(self, lat, lng):
+        """
+        -> frozenset des id de zones qui contiennent le point
+        """
+        candidates = self._grid.get((math.floor(lat / self.cell), math.floor(lng / self.cell)), ())
+        inside = [fence_id for fence_id, shape in candidates if shape.contains(lat, lng)]
+        for fence_id, shape in self._large:
+            if shape.contains(lat, lng):
+                inside.append(fence_id)
+        return frozenset(inside)
+
+
+def load_index():
+    fences = []
+    for fence in Geofence.objects.filter(is_active=True):
+        try:
+            fences.append((fence.pk, fence.name, fence.shape()))
+        except (TypeError, ValueError):
+            logger.warning("Geofence %s ignored: invalid geometry", fence.pk)
+    return GeofenceIndex(fences, cell=getattr(settings, "GEOFENCE_GRID_CELL", 0.05))
+
+
+class GeofenceMonitor:
+    """
+    Listener de points: zones courantes par device, transitions entrée / sortie.
+    Index rechargé après une modification (invalidate) ou toutes les
+    GEOFENCE_RELOAD_INTERVAL secondes (modifs faites par un autre worker).
+    """
+
+    def __init__(self):
+        self._index = None
+        self._loaded_at = 0.0
+        self._state = {}  # EUI -> frozenset des zones du dernier point
+        self._listeners = []
+        self._lock = threading.Lock()
+
+        self.evaluated = 0
+        self.transitions = 0
+        self.eval_seconds = 0.0
+
+    def register_listener(self, listener):
+        """
+        listener(transitions), transitions = [(EUI, TelemetryPoint, entrées, sorties), ...]
+        (entrées / sorties: frozensets d'id de Geofence)
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+        register_point_listener(self)
+
+    def invalidate(self):
+        self._index = None
+
+    def index(self):
+        index = self._index
+        reload_interval = getattr(settings, "GEOFENCE_RELOAD_INTERVAL", 60)
+        if index is None or time.monotonic() - self._loaded_at > reload_interval:
+            index = load_index()
+            self._index, self._loaded_at = index, time.monotonic()
+        return index
+
+    def __call__(self, points):
+        if not self._listeners:
+            return
+        index = self.index()
+        if not index and not self._state:
+            return
+
+        started = time.perf_counter()
+        transitions = []
+        with self._lock:
+            for eui, p in points:
+                inside = index.lookup(p.lat, p.lng)
+                previous = self._state.get(eui, frozenset())
+                if inside != previous:
+                    transitions.append((eui, p, inside - previous, previous - inside))
+                    if inside:
+                        self._state[eui] = inside
+                    else:
+                        self._state.pop(eui, None)
+            self.evaluated += len(points)
+            self.transitions += len(transitions)
+            self.eval_seconds += time.perf_counter() - started
+
+        if transitions:
+            for listener in self._listeners:
+                try:
+                    listener(transitions)
+                except Exception:
+                    logger.exception("Geofence listener %r failed", listener)
+
+    def stats(self):
+        return {
+            "fences": len(self._index) if self._index is not None else None,
+            "evaluated": self.evaluated,
+            "transitions": self.transitions,
+            "avg_eval_us": round(self.eval_seconds / self.evaluated * 1e6, 2) if self.evaluated else 0.0,
+        }
+
+
+geofence_monitor = GeofenceMonitor()
+
+
+def register_geofence_listener(listener):
+    geofence_monitor.register_listener(listener)
@@ -0,0 +1,256 @@
+"""
+Formats compacts de telemetry_history, choisis par ?format= ou l'en-tête Accept:
+
+  columns  (application/vnd.es.columns+json)
+      {"device_eui", "count", "nextCursor", "columns": {"ts": [...], "lat": [...], ...}}
+      un tableau par champ: plus de noms de clés répétés à chaque point.
+
+  binary   (application/vnd.es.history)
+      uint32 LE  longueur de l'en-tête JSON (complété par des espaces à un multiple de 8)
+      en-tête    {"device_eui", "count", "nextCursor",
+                  "fields": [{"name": "ts", "type": "int64"}, {"name": "lat", "type": "float64"}, ...]}
+      colonnes   les unes après les autres, little-endian, `count` valeurs chacune,
+                 null = NaN. Chaque colonne commence à un offset aligné: côté client,
+                 new Float64Array(buffer, offset, count) sans copie.
+
+  polyline (application/vnd.es.polyline+json), ?precision=5 (décimales de lat/lng, 1 à 7)
+      {"device_eui", "count", "nextCursor", "encoding": "polyline",
+       "precision": {"latlng": 5, "ts": 0, "temp": 2, ...},
+       "track": "<polyline lat,lng>", "ts": "...", "temp": "...", ..., "nulls": {"temp": [1, 5]}}
+      track: polyline Google (deltas entre points consécutifs, zigzag, varint
+      base64 de 5 bits); les autres champs: même codage sur une dimension.
+      Un null est codé comme la valeur précédente (delta 0) et listé dans "nulls".
+      Tout décodeur de polyline standard lit "track"; decode_polyline() est
+      le décodeur de référence.
+
+Tous sont construits colonne par colonne à partir des tuples de
+values_list (zip(*rows) + array), sans dict par point.
+"""
+import array
+import json
+import math
+import struct
+import sys
+
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import patch_vary_headers
+
+
+COLUMNS_CONTENT_TYPE = "application/vnd.es.columns+json"
+BINARY_CONTENT_TYPE = "application/vnd.es.history"
+
+POLYLINE_CONTENT_TYPE = "application/vnd.es.polyline+json"
+
+HISTORY_FORMATS = {
+    "columns": COLUMNS_CONTENT_TYPE,
+    "binary": BINARY_CONTENT_TYPE,
+    "polyline": POLYLINE_CONTENT_TYPE,
+}
+
+# décimales gardées par champ en polyline (lat/lng: ?precision=, 5 par défaut ~1 m)
+POLYLINE_PRECISION = {"ts": 0, "temp": 2, "battery": 0, "rssi": 0, "snr": 1}
+DEFAULT_TRACK_PRECISION = 5
+
+# champ -> (type annoncé, code array); float32 suffit aux mesures capteur / radio
+BINARY_TYPES = {
+    "ts": ("int64", "q"),
+    "lat": ("float64", "d"),
+    "lng": ("float64", "d"),
+    "temp": ("float32", "f"),
+    "battery": ("float32", "f"),
+    "rssi": ("float32", "f"),
+    "snr": ("float32", "f"),
+}
+_ARRAY_CODES = {"int64": "q", "float64": "d", "float32": "f"}
+
+
+def negotiate_history_format(request):
+    """
+    -> "columns" / "binary", ou None (JSON par point, format historique)
+    """
+    fmt = request.GET.get("format")
+    if fmt in HISTORY_FORMATS:
+        return fmt
+    accept = request.headers.get("Accept", "")
+    for name, content_type in HISTORY_FORMATS.items():
+        if content_type in accept:
+            return name
+    return None
+
+
+def history_columns(rows, fields):
+    """
+    rows (tuples de values_list, ts en datetime) -> {champ: [valeurs]}, ts en epoch secondes
+    """
+    columns = dict(zip(fields, (list(col) for col in zip(*rows)))) if rows else {f: [] for f in fields}
+    if "ts" in columns:
+        columns["ts"] = [int(ts.timestamp()) for ts in columns["ts"]]
+    return columns
+
+
+def _typed(values, code):
+    if code != "q" and None in values:
+        values = [math.nan if v is None else v for v in values]
+    column = array.array(code, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def pack_history(columns, meta):
+    """
+    {champ: [valeurs]} + métadonnées -> réponse binaire (voir en-tête du module)
+    """
+    fields = list(columns)
+    # colonnes 64 bits d'abord: tous les offsets restent alignés sur leur taille
+    fields.sort(key=lambda f: BINARY_TYPES[f][1] == "f")
+    header = json.dumps({
+        **meta,
+        "fields": [{"name": f, "type": BINARY_TYPES[f][0]} for f in fields],
+    }, separators=(",", ":")).encode()
+    header += b" " * (-(4 + len(header)) % 8)
+
+    parts = [struct.pack("<I", len(header)), header]
+    parts += [_typed(columns[f], BINARY_TYPES[f][1]) for f in fields]
+    return b"".join(parts)
+
+
+def unpack_history(data):
+    """
+    Inverse de pack_history (tests, clients Python) -> (en-tête, {champ: [valeurs]}), null = NaN
+    """
+    (size,) = struct.unpack_from("<I", data)
+    header = json.loads(data[4:4 + size])
+    offset = 4 + size
+    columns = {}
+    for field in header["fields"]:
+        column = array.array(_ARRAY_CODES[field["type"]])
+        nbytes = column.itemsize * header["count"]
+        column.frombytes(data[offset:offset + nbytes])
+        if sys.byteorder == "big":
+            column.byteswap()
+        columns[field["name"]] = column.tolist()
+        offset += nbytes
+    return header, columns
+
+
+# --------------------------
+# Polyline (deltas + varint)
+# --------------------------
+def encode_polyline(columns, precision):
+    """
+    [colonne, ...] (même longueur) -> chaîne polyline, les colonnes entrelacées
+    point par point (lat, lng, lat, lng... pour une trace).
+    """
+    factor = 10 ** precision
+    out = []
+    append = out.append
+    previous = [0] * len(columns)
+    for values in zip(*columns):
+        for i, value in enumerate(values):
+            q = math.floor(value * factor + 0.5)
+            delta = q - previous[i]
+            previous[i] = q
+            delta = ~(delta << 1) if delta < 0 else delta << 1
+            while delta >= 0x20:
+                append(chr((0x20 | (delta & 0x1F)) + 63))
+                delta >>= 5
+            append(chr(delta + 63))
+    return "".join(out)
+
+
+def decode_polyline(text, precision, dimensions=1):
+    """
+    Décodeur de référence: chaîne polyline -> [colonne, ...] (`dimensions` colonnes).
+    """
+    factor = 10 ** precision
+    columns = [[] for _ in range(dimensions)]
+    previous = [0] * dimensions
+    index = 0
+    length = len(text)
+    while index < length:
+        for i in range(dimensions):
+            result = shift = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            previous[i] += ~(result >> 1) if result & 1 else result >> 1
+            columns[i].append(previous[i] / factor if precision else previous[i])
+    return columns
+
+
+def _fill_nulls(values):
+    """
+    -> (valeurs, index des null): un null reprend la valeur précédente (delta nul)
+    """
+    if None not in values:
+        return values, []
+    filled = []
+    nulls = []
+    last = 0
+    for i, value in enumerate(values):
+        if value is None:
+            nulls.append(i)
+            value = last
+        filled.append(value)
+        last = value
+    return filled, nulls
+
+
+def encode_track(columns, meta, precision=None):
+    """
+    {champ: [valeurs]} -> document polyline (voir en-tête du module)
+    """
+    try:
+        precision = min(max(int(precision), 1), 7)
+    except (TypeError, ValueError):
+        precision = DEFAULT_TRACK_PRECISION
+
+    data = {
+        **meta,
+        "encoding": "polyline",
+        "precision": {"latlng": precision},
+        "track": encode_polyline([columns["lat"], columns["lng"]], precision),
+    }
+    nulls = {}
+    for field, field_precision in POLYLINE_PRECISION.items():
+        if field not in columns:
+            continue
+        values, missing = _fill_nulls(columns[field])
+        data["precision"][field] = field_precision
+        data[field] = encode_polyline([values], field_precision)
+        if missing:
+            nulls[field] = missing
+    data["nulls"] = nulls
+    return data
+
+
+def decode_track(data):
+    """
+    Document polyline -> {champ: [valeurs]} (null restaurés)
+    """
+    precision = data["precision"]
+    lat, lng = decode_polyline(data["track"], precision["latlng"], 2)
+    columns = {"lat": lat, "lng": lng}
+    for field in POLYLINE_PRECISION:
+        if field in data:
+            values = decode_polyline(data[field], precision[field])[0]
+            for i in data["nulls"].get(field, ()):
+                values[i] = None
+            columns[field] = values
+    return columns
+
+
+def history_response(fmt, columns, meta, precision=None):
+    if fmt == "binary":
+        response = HttpResponse(pack_history(columns, meta), content_type=BINARY_CONTENT_TYPE)
+    elif fmt == "polyline":
+        response = JsonResponse(encode_track(columns, meta, precision), content_type=POLYLINE_CONTENT_TYPE)
+    else:
+        response = JsonResponse({**meta, "columns": columns}, content_type=COLUMNS_CONTENT_TYPE)
+    patch_vary_headers(response, ("Accept",))
+    return response
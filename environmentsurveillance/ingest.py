@@ -0,0 +1,573 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .dedup import (
+    claim_uplink_keys,
+    filter_recent,
+    filter_recent_keys,
+    point_counter,
+    recent_points,
+    recent_uplinks,
+    remember,
+    uplink_counter,
+    uplink_key,
+)
+from .decoders import decode_mode, get_decoder_registry
+from .device_registry import device_registry, is_missing_device_error
+from .geo import geohash_encode
+from .lastseen import update_last_seen
+from .models import Device, TTNUplink, TelemetryPoint
+from .normalize import PointColumns, extract_decoded, normalize_telemetry, to_float, to_int
+from .uplink_storage import extract_uplink_fields, storage_fields
+
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------
+# TTN uplink: parsing
+# --------------------------
+def parse_ttn_uplink(payload):
+    """
+    Valide un webhook TTN et le transforme en "record" prêt à écrire.
+    Retour: (record, None) ou (None, "message d'erreur")
+    """
+    if not isinstance(payload, dict):
+        return None, "Invalid payload"
+
+    end_device_ids = payload.get("end_device_ids", {}) or {}
+    device_eui = end_device_ids.get("dev_eui")
+    device_name = end_device_ids.get("device_id") or "unknown-device"
+    application_id = (end_device_ids.get("application_ids", {}) or {}).get("application_id")
+
+    if not device_eui:
+        return None, "Missing dev_eui in payload"
+
+    uplink = payload.get("uplink_message", {}) or {}
+
+    decoded_payload = uplink.get("decoded_payload")
+    f_port = uplink.get("f_port")
+
+    # décodage local du frm_payload (devices sans formatter TTN)
+    decoders = get_decoder_registry()
+    if decoders and (decoded_payload is None or decode_mode() == "prefer"):
+        decoded = decoders.decode(device_eui, f_port, uplink.get("frm_payload"))
+        if decoded is not None:
+            decoded_payload = decoded
+    f_cnt = to_int(uplink.get("f_cnt"))
+
+    # heure de réception réseau: identique d'un retry TTN à l'autre
+    received_at = uplink.get("received_at") or payload.get("received_at")
+    try:
+        ts = parse_datetime(received_at) if isinstance(received_at, str) else None
+    except ValueError:
+        ts = None
+    if ts is None or timezone.is_naive(ts):
+        ts = timezone.now()
+
+    # ---- Radio metadata (best gateway) ----
+    rssi = None
+    snr = None
+    rx_metadata = uplink.get("rx_metadata", []) or []
+    if rx_metadata:
+        rssi = to_float(rx_metadata[0].get("rssi"))
+        snr = to_float(rx_metadata[0].get("snr"))
+
+    # ---- Telemetry point if GPS exists ----
+    point = None
+    if isinstance(decoded_payload, dict):
+        lat, lng, temp, battery = extract_decoded(decoded_payload)
+        if lat is not None and lng is not None:
+            point = {
+                "lat": lat,
+                "lng": lng,
+                "temp": temp,
+                "battery": battery,
+                "rssi": rssi,
+                "snr": snr,
+                "ts": ts,
+            }
+
+    return {
+        "device_eui": device_eui,
+        "device_name": device_name,
+        "application_id": application_id or "",
+        "raw_payload": payload,
+        "decoded_payload": decoded_payload,
+        "rssi": rssi,
+        "snr": snr,
+        "f_port": f_port,
+        "f_cnt": f_cnt,
+        **extract_uplink_fields(payload),
+        "point": point,
+    }, None
+
+
+# --------------------------
+# Ingest direct (telemetry_ingest): parsing
+# --------------------------
+def parse_telemetry(data):
+    """
+    Valide un point envoyé à telemetry_ingest (ou via MQTT).
+    Mêmes règles que le traitement par lots (normalize.normalize_telemetry).
+    Retour: ({"device_eui": ..., "point": {...}}, None) ou (None, "message d'erreur")
+    """
+    columns, rejected = normalize_telemetry([data])
+    if rejected:
+        return None, rejected[0][1]
+    return columns.records()[0], None
+
+
+# --------------------------
+# Listeners (cache dernier point, ...)
+# --------------------------
+_point_listeners = []
+
+
+def register_point_listener(listener):
+    """
+    listener(points) est appelé après chaque écriture réussie,
+    avec points = [(device_eui, TelemetryPoint), ...].
+    Il doit rester rapide (mémoire / cache), il tourne sur le chemin d'ingest.
+    """
+    if listener not in _point_listeners:
+        _point_listeners.append(listener)
+
+
+def notify_points(points):
+    if not points:
+        return
+    for listener in _point_listeners:
+        try:
+            listener(points)
+        except Exception:
+            logger.exception("Point listener %r failed", listener)
+
+
+# --------------------------
+# TTN uplink: écriture en base
+# --------------------------
+def _uplink_rows(records, devices):
+    uplinks = []
+    points = []
+    written = []
+    for r in records:
+        device_id = devices[r["device_eui"]].id
+        uplinks.append(TTNUplink(
+            device_id=device_id,
+            application_id=r["application_id"],
+            **storage_fields(r["raw_payload"]),
+            decoded_payload=r["decoded_payload"],
+            rssi=r["rssi"],
+            snr=r["snr"],
+            f_port=r["f_port"],
+            f_cnt=r.get("f_cnt"),
+            gateway_id=r.get("gateway_id"),
+            spreading_factor=r.get("spreading_factor"),
+            airtime=r.get("airtime"),
+            frm_payload_size=r.get("frm_payload_size"),
+        ))
+        if r["point"]:
+            point = TelemetryPoint(
+                device_id=device_id, geohash=geohash_encode(r["point"]["lat"], r["point"]["lng"]), **r["point"],
+            )
+            points.append(point)
+            written.append((r["device_eui"], point))
+    return uplinks, points, written
+
+
+def _claimable_keys(records, devices):
+    # (device_id, f_cnt) -> record, pour les records qui ont un f_cnt
+    keyed = {}
+    for r in records:
+        if r.get("f_cnt") is not None:
+            keyed[(devices[r["device_eui"]].id, r["f_cnt"])] = r
+    return keyed
+
+
+def _retry_missing_devices(euis, write):
+    """
+    write() résout les devices via le registre puis écrit. Si un device du lot
+    a été supprimé entre-temps, la FK rejette l'écriture (au commit: contrainte
+    différée) et rien n'est écrit: ses entrées sont retirées du cache et
+    write() est rejoué une fois (le device est recréé).
+    """
+    try:
+        return write()
+    except IntegrityError as exc:
+        if not is_missing_device_error(exc):
+            raise
+    for eui in euis:
+        device_registry.invalidate(eui)
+    return write()
+
+
+def save_uplinks(records):
+    """
+    Écrit un lot de records (voir parse_ttn_uplink) avec bulk_create:
+    devices résolus via le registre, 1 INSERT uplinks + 1 INSERT points.
+    Les doublons (device, f_cnt) sont écartés (voir dedup.py).
+    """
+    records = filter_recent(records, recent_uplinks, uplink_counter, uplink_key)
+    if records:
+        _save_uplinks(records)
+
+
+def _save_uplinks(records):
+    # records déjà filtrés par la déduplication en mémoire
+    # le dernier nom vu par EUI gagne
+    names_by_eui = {}
+    for r in records:
+        names_by_eui[r["device_eui"]] = r["device_name"]
+
+    def write():
+        devices = device_registry.resolve_many(names_by_eui)
+
+        # si le device existe déjà avec un autre nom, on le met à jour
+        for eui, name in names_by_eui.items():
+            if devices[eui].name != name and name != "unknown-device":
+                Device.objects.filter(pk=devices[eui].id).update(name=name)
+                device_registry.set_name(eui, name)
+
+        with transaction.atomic():
+            # réservation des clés dans la même transaction: un échec d'écriture les libère
+            keyed = _claimable_keys(records, devices)
+            claimed = claim_uplink_keys(keyed)
+            duplicates = {id(r) for key, r in keyed.items() if key not in claimed}
+            kept = [r for r in records if id(r) not in duplicates]
+
+            uplinks, points, written = _uplink_rows(kept, devices)
+            if uplinks:
+                TTNUplink.objects.bulk_create(uplinks)
+            if points:
+                written = _insert_points(written)
+        return kept, written
+
+    records, written = _retry_missing_devices(names_by_eui, write)
+
+    remember(records, recent_uplinks, uplink_key)
+    notify_points(written)
+
+
+# --------------------------
+# Ingest direct: écriture en base
+# --------------------------
+def save_points(records):
+    """
+    Écrit un lot de records (voir parse_telemetry), via save_point_columns.
+    """
+    return save_point_columns(PointColumns.from_records(records))
+
+
+def _point_rows(columns, devices):
+    return [
+        (eui, TelemetryPoint(
+            device_id=devices[eui].id, ts=ts, lat=lat, lng=lng, geohash=geohash_encode(lat, lng),
+            temp=temp, battery=battery, rssi=rssi, snr=snr,
+        ))
+        for eui, ts, lat, lng, temp, battery, rssi, snr in columns.rows()
+    ]
+
+
+_POINT_COLUMNS = ("device_id", "ts", "lat", "lng", "temp", "battery", "rssi", "snr", "geohash", "created_at")
+
+
+def _insert_points_sql(n):
+    table = TelemetryPoint._meta.db_table
+    row = f"({', '.join(['%s'] * len(_POINT_COLUMNS))})"
+    # comme bulk_create(ignore_conflicts=True), mais RETURNING dit quelles lignes sont passées
+    return (
+        f"INSERT INTO {table} ({', '.join(_POINT_COLUMNS)}) "
+        f"VALUES {', '.join([row] * n)} "
+        f"ON CONFLICT (device_id, ts) DO NOTHING "
+        f"RETURNING id, device_id, ts"
+    )
+
+
+def insert_points(written):
+    """
+    [(EUI, TelemetryPoint), ...] -> les seuls points insérés (id renseigné).
+    Les doublons (device, ts), déjà en base ou répétés dans le lot, sont
+    écartés par la contrainte unique et absents du retour.
+    """
+    if not written:
+        return []
+    now = timezone.now()
+    fields = [TelemetryPoint._meta.get_field(name.removesuffix("_id")) for name in _POINT_COLUMNS]
+    inserted = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(written), 1000):
+            chunk = written[start:start + 1000]
+            params = []
+            for _, point in chunk:
+                point.created_at = now
+                params += [f.get_db_prep_save(getattr(point, f.attname), connection) for f in fields]
+            cursor.execute(_insert_points_sql(len(chunk)), params)
+            for pk, device_id, ts in cursor.fetchall():
+                inserted[(device_id, ts)] = pk
+
+    kept = []
+    for eui, point in written:
+        pk = inserted.pop((point.device_id, point.ts), None)
+        if pk is not None:
+            point.id = pk
+            kept.append((eui, point))
+    return kept
+
+
+def _insert_points(written):
+    # points et dernier passage des devices dans la même transaction; seuls les
+    # points réellement insérés vont plus loin (dernier passage, listeners)
+    with transaction.atomic():
+        written = insert_points(written)
+        update_last_seen(written)
+    return written
+
+
+def save_point_columns(columns):
+    """
+    Écrit un lot de points en colonnes (normalize.PointColumns): devices
+    résolus via le registre (créés si inconnus, nom = EUI), 1 INSERT pour
+    tous les points. Les doublons (device, ts) sont écartés: en mémoire si
+    possible, sinon par la contrainte unique (ON CONFLICT DO NOTHING).
+    Retour: [(EUI, TelemetryPoint), ...] des points insérés.
+    """
+    keys = columns.keys()
+    kept = filter_recent_keys(keys, recent_points, point_counter)
+    if not kept:
+        return []
+    if len(kept) < len(keys):
+        columns = columns.take(kept)
+        keys = [keys[i] for i in kept]
+
+    names = {eui: eui for eui in columns.device_eui}
+
+    def write():
+        rows = _point_rows(columns, device_registry.resolve_many(names))
+        return rows, _insert_points(rows)
+
+    rows, written = _retry_missing_devices(names, write)
+    point_counter.add(db_hits=len(rows) - len(written))
+
+    recent_points.add_many(keys)
+    notify_points(written)
+    return written
+
+
+# --------------------------
+# Versions async (vues ASGI, async_views.py)
+# --------------------------
+async def _aretry_missing_devices(euis, write):
+    # comme _retry_missing_devices, write() étant une coroutine
+    try:
+        return await write()
+    except IntegrityError as exc:
+        if not is_missing_device_error(exc):
+            raise
+    for eui in euis:
+        device_registry.invalidate(eui)
+    return await write()
+
+
+async def anotify_points(points):
+    # les listeners sont synchrones (verrous, cache Django, ORM pour zones et alertes):
+    # hors de la boucle d'événements, sur le thread de la connexion (un thread
+    # d'exécuteur ouvrirait une connexion que Django ne ferme jamais)
+    await sync_to_async(notify_points)(points)
+
+
+async def asave_points(records):
+    """
+    Comme save_points; l'écriture (points + dernier passage, une transaction)
+    passe par le thread de la connexion.
+    """
+    columns = PointColumns.from_records(records)
+    keys = columns.keys()
+    kept = filter_recent_keys(keys, recent_points, point_counter)
+    if not kept:
+        return []
+    if len(kept) < len(keys):
+        columns = columns.take(kept)
+        keys = [keys[i] for i in kept]
+
+    names = {eui: eui for eui in columns.device_eui}
+
+    async def write():
+        rows = _point_rows(columns, await device_registry.aresolve_many(names))
+        return rows, await sync_to_async(_insert_points)(rows)
+
+    rows, written = await _aretry_missing_devices(names, write)
+    point_counter.add(db_hits=len(rows) - len(written))
+
+    recent_points.add_many(keys)
+    await anotify_points(written)
+    return written
+
+
+async def asave_uplinks(records):
+    """
+    Comme save_uplinks. Réservation des clés, uplinks et points dans une seule
+    transaction, comme en sync: l'écriture passe par le thread de la connexion
+    (un uplink validé avec une clé libérée serait réécrit par le retry TTN).
+    """
+    records = filter_recent(records, recent_uplinks, uplink_counter, uplink_key)
+    if records:
+        await sync_to_async(_save_uplinks)(records)
+
+
+# --------------------------
+# Buffered writer
+# --------------------------
+class BatchWriter:
+    """
+    File d'attente bornée + thread d'écriture qui vide la file par lots.
+
+    - offer() ne bloque pas par défaut: retourne False si la file est pleine (backpressure);
+      offer(item, timeout=...) attend au plus `timeout` secondes une place
+    - le thread appelle handler(batch) dès que batch_size éléments sont
+      disponibles ou que flush_interval secondes se sont écoulées
+    - stop() vide la file avant de rendre la main
+    """
+
+    def __init__(self, handler, name, maxsize=10000, batch_size=500, flush_interval=0.5):
+        self.handler = handler
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.written = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def offer(self, item, timeout=None):
+        if self._stopping.is_set():
+            return False
+        try:
+            if timeout:
+                self._queue.put(item, timeout=timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def stop(self, timeout=10):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "written": self.written,
+            "rejected": self.rejected,
+            "failed": self.failed,
+        }
+
+    def _collect(self):
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if self._stopping.is_set():
+                timeout = 0
+            elif deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+
+            try:
+                if timeout:
+                    item = self._queue.get(timeout=timeout)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _flush(self, batch):
+        try:
+            self.handler(batch)
+            self.written += len(batch)
+        except Exception:
+            # Un seul élément invalide ne doit pas faire perdre tout le lot:
+            # on réessaie un par un pour isoler le(s) fautif(s).
+            logger.exception("%s: batch of %d failed, retrying one by one", self.name, len(batch))
+            for item in batch:
+                try:
+                    self.handler([item])
+                    self.written += 1
+                except Exception:
+                    self.failed += 1
+                    logger.exception("%s: dropping item", self.name)
+        finally:
+            close_old_connections()
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+                elif self._stopping.is_set():
+                    break
+        finally:
+            connections.close_all()
+
+
+_uplink_buffer = None
+_uplink_buffer_lock = threading.Lock()
+
+
+def get_uplink_buffer():
+    """
+    Writer des webhooks TTN en mode "buffered" (démarré au premier appel,
+    donc dans le process worker et pas dans le master gunicorn).
+    """
+    global _uplink_buffer
+    if _uplink_buffer is None:
+        with _uplink_buffer_lock:
+            if _uplink_buffer is None:
+                buffer = BatchWriter(
+                    save_uplinks,
+                    name="ttn-uplink-writer",
+                    maxsize=getattr(settings, "INGEST_QUEUE_MAXSIZE", 10000),
+                    batch_size=getattr(settings, "INGEST_BATCH_SIZE", 500),
+                    flush_interval=getattr(settings, "INGEST_FLUSH_INTERVAL", 0.5),
+                )
+                buffer.start()
+                atexit.register(buffer.stop)
+                _uplink_buffer = buffer
+    return _uplink_buffer
+
+
+def ingest_is_buffered():
+    return getattr(settings, "TTN_INGEST_MODE", "sync") == "buffered"
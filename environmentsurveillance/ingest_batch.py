@@ -0,0 +1,325 @@
+"""
+Ingest par lots pour telemetry_ingest: tableau JSON ou NDJSON, éventuellement
+compressé (Content-Encoding: gzip, deflate, br).
+
+Le corps est lu via request.read() (hors DATA_UPLOAD_MAX_MEMORY_SIZE): la
+taille est bornée ici, compressée comme décompressée, par
+INGEST_BODY_MAX_SIZE, et chaque élément (ligne NDJSON, élément de tableau,
+objet seul) par MAX_ITEM_SIZE -> 413 au-delà.
+
+Le corps est lu et décompressé par blocs, les points sont regroupés en
+paquets de INGEST_BATCH_SIZE, normalisés en colonnes (normalize_telemetry)
+et écrits (save_point_columns: devices résolus en une requête par paquet,
+puis bulk_create). Un rejeu de
+50k points tient donc en une requête HTTP et en mémoire constante.
+Chaque paquet est commité séparément: en cas d'erreur au milieu du corps,
+les points déjà acceptés restent en base (le rapport les compte).
+"""
+import codecs
+import itertools
+import json
+import zlib
+
+from django.conf import settings
+
+from .ingest import save_point_columns
+from .normalize import normalize_telemetry
+
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# un élément (ligne NDJSON, élément de tableau, objet seul) ne peut pas dépasser
+# cette taille (protection mémoire)
+MAX_ITEM_SIZE = 1024 * 1024
+
+# taille max du corps, avant et après décompression (bombe gzip)
+DEFAULT_BODY_MAX_SIZE = 256 * 1024 * 1024
+
+# nombre max d'erreurs détaillées dans la réponse (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 1000
+
+NDJSON_CONTENT_TYPES = (
+    "application/x-ndjson",
+    "application/ndjson",
+    "application/jsonl",
+    "application/x-jsonlines",
+)
+
+
+class IngestBodyError(ValueError):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# --------------------------
+# Lecture du corps
+# --------------------------
+def _decompressor(content_encoding):
+    encoding = (content_encoding or "").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "br":
+        try:
+            import brotli
+        except ImportError:
+            raise IngestBodyError("Content-Encoding br is not supported (brotli not installed)", status=415)
+        return brotli.Decompressor()
+    raise IngestBodyError(f"Unsupported Content-Encoding: {content_encoding}", status=415)
+
+
+def _decompress(decompressor, chunk, max_length):
+    while chunk:
+        try:
+            if hasattr(decompressor, "unconsumed_tail"):
+                # zlib: sortie bornée, le reste de l'entrée est repris au tour suivant
+                data = decompressor.decompress(chunk, max_length)
+                chunk = decompressor.unconsumed_tail
+            else:
+                data = decompressor.process(chunk)
+                chunk = b""
+        except Exception:  # zlib.error, brotli.error
+            raise IngestBodyError("Invalid compressed body")
+        if data:
+            yield data
+
+
+def body_max_size():
+    return getattr(settings, "INGEST_BODY_MAX_SIZE", DEFAULT_BODY_MAX_SIZE)
+
+
+def _too_large(max_size):
+    return IngestBodyError(f"Request body too large (max {max_size} bytes)", status=413)
+
+
+def iter_body_chunks(stream, content_encoding=None, chunk_size=READ_CHUNK_SIZE, max_size=None):
+    """
+    Blocs (bytes) du corps décompressé, lus au fil de l'eau depuis stream.read().
+    La sortie zlib est bornée par bloc pour qu'un corps très compressible ne
+    soit pas décompressé d'un coup en mémoire; au-delà de max_size octets
+    lus ou décompressés: IngestBodyError 413.
+    """
+    max_size = max_size or body_max_size()
+    decompressor = _decompressor(content_encoding)
+    read = 0
+    produced = 0
+
+    def counted(data):
+        nonlocal produced
+        produced += len(data)
+        if produced > max_size:
+            raise _too_large(max_size)
+        return data
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        read += len(chunk)
+        if read > max_size:
+            raise _too_large(max_size)
+        if decompressor is None:
+            yield counted(chunk)
+        else:
+            for data in _decompress(decompressor, chunk, chunk_size * 16):
+                yield counted(data)
+    if decompressor is not None and hasattr(decompressor, "flush"):
+        tail = decompressor.flush()
+        if tail:
+            yield counted(tail)
+
+
+def _iter_text(chunks):
+    # octets invalides remplacés: seule la ligne concernée sera rejetée
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson(chunks):
+    """
+    -> (numéro de ligne, objet, erreur) pour chaque ligne non vide.
+    Une ligne de plus de MAX_ITEM_SIZE caractères: IngestBodyError 413.
+    """
+    buffer = ""
+    line_no = 0
+    for text in itertools.chain(_iter_text(chunks), ["\n"]):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        if len(buffer) > MAX_ITEM_SIZE:
+            raise IngestBodyError(f"Line {line_no + len(lines) + 1} too large (max {MAX_ITEM_SIZE} bytes)", status=413)
+        for line in lines:
+            line_no += 1
+            if len(line) > MAX_ITEM_SIZE:
+                raise IngestBodyError(f"Line {line_no} too large (max {MAX_ITEM_SIZE} bytes)", status=413)
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line), None
+            except ValueError:
+                yield line_no, None, "Invalid JSON"
+
+
+def iter_json_array(chunks):
+    """
+    -> (rang dans le tableau, objet, None), décodé élément par élément
+    (JSONDecoder.raw_decode sur un tampon glissant).
+    Un tableau mal formé n'est pas resynchronisable: IngestBodyError.
+    """
+    decoder = json.JSONDecoder()
+    texts = _iter_text(chunks)
+    buffer = ""
+    pos = 0
+    exhausted = False
+
+    def fill():
+        nonlocal buffer, pos, exhausted
+        text = next(texts, None)
+        if text is None:
+            exhausted = True
+            return False
+        buffer = buffer[pos:] + text
+        pos = 0
+        return True
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return buffer[pos] if pos < len(buffer) else ""
+
+    if skip_ws() != "[":
+        raise IngestBodyError("Expected a JSON array")
+    pos += 1
+
+    index = 0
+    if skip_ws() == "]":
+        return
+    while True:
+        index += 1
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # un nombre en fin de tampon peut être tronqué: on attend la suite
+                if end < len(buffer) or exhausted:
+                    break
+            except ValueError:
+                if exhausted or len(buffer) - pos > MAX_ITEM_SIZE:
+                    raise IngestBodyError(f"Malformed JSON array at item {index}")
+            fill()
+        pos = end
+        yield index, item, None
+
+        separator = skip_ws()
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise IngestBodyError(f"Malformed JSON array after item {index}")
+        skip_ws()
+
+
+def read_telemetry_body(stream, content_type="", content_encoding=None):
+    """
+    -> (is_batch, items), items = itérable de (ligne, objet, erreur)
+
+    - Content-Type NDJSON           -> lot, une ligne par point
+    - corps commençant par "["      -> lot, tableau JSON
+    - sinon                         -> un seul objet (comportement historique)
+    """
+    chunks = iter_body_chunks(stream, content_encoding)
+
+    if (content_type or "").split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        return True, iter_ndjson(chunks)
+
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if head.lstrip():
+            break
+        if len(head) > MAX_ITEM_SIZE:
+            raise IngestBodyError("Request body too large", status=413)
+    chunks = itertools.chain([head], chunks)
+
+    if head.lstrip()[:1] == b"[":
+        return True, iter_json_array(chunks)
+
+    # un seul objet: lu en entier, donc borné comme un élément
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) > MAX_ITEM_SIZE:
+            raise IngestBodyError(f"Request body too large (max {MAX_ITEM_SIZE} bytes)", status=413)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False, iter([(1, None, "Invalid JSON")])
+    return False, iter([(1, data, None)])
+
+
+# --------------------------
+# Écriture
+# --------------------------
+def ingest_telemetry_batch(items, batch_size=None, max_points=None):
+    """
+    Valide et écrit les points par paquets.
+    Retour: (rapport, erreur)
+      rapport = {"accepted": n, "rejected": m, "errors": [{"line": i, "error": "..."}, ...]}
+      erreur  = IngestBodyError si le corps n'a pas pu être lu jusqu'au bout, sinon None
+    """
+    batch_size = batch_size or getattr(settings, "INGEST_BATCH_SIZE", 500)
+    max_points = max_points or getattr(settings, "INGEST_BATCH_MAX_POINTS", 200000)
+
+    report = {"accepted": 0, "rejected": 0, "errors": []}
+    body_error = None
+    payloads = []
+    lines = []
+    errors = []  # erreurs de décodage du paquet en cours
+
+    def reject(line, error):
+        report["rejected"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "error": error})
+
+    def flush():
+        # normalisation du paquet en une passe (colonnes), puis 1 bulk_create
+        columns, rejected = normalize_telemetry(payloads, lines)
+        for line, error in sorted(errors + rejected, key=lambda e: e[0]):
+            reject(line, error)
+        if len(columns):
+            save_point_columns(columns)
+            report["accepted"] += len(columns)
+        payloads.clear()
+        lines.clear()
+        errors.clear()
+
+    try:
+        for line, data, error in items:
+            if report["accepted"] + report["rejected"] + len(payloads) + len(errors) >= max_points:
+                raise IngestBodyError(f"Too many points in one request (max {max_points})", status=413)
+
+            if error:
+                errors.append((line, error))
+                continue
+
+            payloads.append(data)
+            lines.append(line)
+            if len(payloads) >= batch_size:
+                flush()
+    except IngestBodyError as exc:
+        body_error = exc
+    flush()
+
+    return report, body_error
@@ -0,0 +1,158 @@
+"""
+Dernier passage des devices et détection des devices muets.
+
+- à l'ingest, dans la transaction qui écrit les points (ingest.py): un
+  upsert multi-lignes par lot dans DeviceLastSeen (last_seen, last_rssi),
+  jamais en arrière dans le temps; updated_at = horloge du serveur.
+- lecture: "last_seen < maintenant - délai" sur l'index device_last_seen_idx,
+  au lieu d'un MAX(ts) par device sur TelemetryPoint.
+- StaleTracker: tas des échéances (last_seen + délai) pour une surveillance
+  continue (`manage.py stale_devices --watch`): chaque tick ne relit que les
+  lignes modifiées (updated_at) et ne dépile que les échéances passées,
+  O(log n) par device qui change d'état.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Device, DeviceLastSeen
+from .queries import latest_probe_queryset
+
+
+def stale_after():
+    return getattr(settings, "DEVICE_STALE_AFTER", 900)
+
+
+# --------------------------
+# Écriture (ingest)
+# --------------------------
+def _upsert_sql(n):
+    table = DeviceLastSeen._meta.db_table
+    return (
+        f"INSERT INTO {table} (device_id, last_seen, last_rssi, updated_at) "
+        f"VALUES {', '.join(['(%s, %s, %s, clock_timestamp())'] * n)} "
+        f"ON CONFLICT (device_id) DO UPDATE SET "
+        f"last_seen = EXCLUDED.last_seen, last_rssi = COALESCE(EXCLUDED.last_rssi, {table}.last_rssi), "
+        f"updated_at = EXCLUDED.updated_at "
+        f"WHERE {table}.last_seen < EXCLUDED.last_seen"
+    )
+
+
+def update_last_seen(points):
+    """
+    [(EUI, TelemetryPoint), ...] -> 1 upsert pour le lot. Appelé par l'ingest
+    dans la transaction des points (même connexion, pas de listener).
+    """
+    latest = {}
+    for _, p in points:
+        current = latest.get(p.device_id)
+        if current is None or current.ts < p.ts:
+            latest[p.device_id] = p
+    if not latest:
+        return
+
+    params = []
+    # ordre fixe des lignes: pas d'interblocage entre deux lots concurrents
+    for device_id in sorted(latest):
+        p = latest[device_id]
+        params += [device_id, p.ts, p.rssi]
+    with connection.cursor() as cursor:
+        cursor.execute(_upsert_sql(len(latest)), params)
+
+
+def rebuild_last_seen():
+    """
+    Remplit DeviceLastSeen depuis le dernier point de chaque device (données
+    antérieures à la table). Une sonde d'index par device et par partition.
+    """
+    # latest_all_queryset lit DeviceLastSeen: pas utilisable pour la remplir
+    rows = latest_probe_queryset(Device.objects.all())
+    points = [(None, p) for p in rows.only("device_id", "ts", "rssi")]
+    for start in range(0, len(points), 1000):
+        update_last_seen(points[start:start + 1000])
+    return len(points)
+
+
+# --------------------------
+# Lecture
+# --------------------------
+def stale_devices(after=None, now=None, include_never_seen=False):
+    """
+    -> [{device_eui, name, last_seen, last_rssi, silent_for}, ...] des devices actifs muets
+       depuis plus de `after` secondes (les plus anciens d'abord)
+    """
+    now = now or timezone.now()
+    after = stale_after() if after is None else after
+
+    rows = (
+        DeviceLastSeen.objects.filter(last_seen__lt=now - timedelta(seconds=after), device__is_active=True)
+        .order_by("last_seen")
+        .values_list("device__device_eui", "device__name", "last_seen", "last_rssi")
+    )
+    devices = [
+        {
+            "device_eui": eui,
+            "name": name,
+            "last_seen": int(last_seen.timestamp()),
+            "last_rssi": last_rssi,
+            "silent_for": int((now - last_seen).total_seconds()),
+        }
+        for eui, name, last_seen, last_rssi in rows
+    ]
+    if include_never_seen:
+        never = Device.objects.filter(is_active=True, last_seen__isnull=True).values_list("device_eui", "name")
+        devices += [
+            {"device_eui": eui, "name": name, "last_seen": None, "last_rssi": None, "silent_for": None}
+            for eui, name in never
+        ]
+    return devices
+
+
+# --------------------------
+# Surveillance continue
+# --------------------------
+class StaleTracker:
+    """
+    Tas des échéances (last_seen + after, EUI, last_seen). Les entrées
+    dépassées par un passage plus récent sont ignorées au dépilage.
+    """
+
+    def __init__(self, after):
+        self.after = after
+        self._last_seen = {}  # EUI -> last_seen (epoch)
+        self._heap = []
+        self.stale = set()
+
+    def __len__(self):
+        return len(self._last_seen)
+
+    def update(self, eui, last_seen):
+        """
+        -> True si le device était muet et reparaît
+        """
+        current = self._last_seen.get(eui)
+        if current is not None and current >= last_seen:
+            return False
+        self._last_seen[eui] = last_seen
+        heapq.heappush(self._heap, (last_seen + self.after, eui, last_seen))
+        if eui in self.stale:
+            self.stale.discard(eui)
+            return True
+        return False
+
+    def expired(self, now):
+        """
+        -> [(EUI, last_seen), ...] devenus muets depuis le dernier appel
+        """
+        newly = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, eui, last_seen = heapq.heappop(heap)
+            if self._last_seen.get(eui) != last_seen or eui in self.stale:
+                continue  # entrée périmée
+            self.stale.add(eui)
+            newly.append((eui, last_seen))
+        return newly
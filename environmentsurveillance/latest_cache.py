@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+def _point_data(device_eui, p):
+    return {
+        "device_eui": device_eui,
+        "ts": int(p.ts.timestamp()),
+        "lat": p.lat,
+        "lng": p.lng,
+        "temp": p.temp,
+        "battery": p.battery,
+        "rssi": p.rssi,
+        "snr": p.snr,
+    }
+
+
+def make_entry(device_eui, p):
+    """
+    Entrée de cache pour un TelemetryPoint: réponse JSON + ETag + ts exact
+    (le ts exact sert à ne jamais remplacer un point par un plus ancien).
+    """
+    data = _point_data(device_eui, p)
+    digest = hashlib.sha1(repr(sorted(data.items())).encode("utf-8")).hexdigest()[:20]
+    return {"ts": p.ts.timestamp(), "etag": f'"{digest}"', "data": data}
+
+
+class LocMemLatestBackend:
+    """
+    Dernier point par device, en mémoire du process. Les points écrits par un
+    autre process (autre worker, consommateur MQTT, replay_ttn, backfill) n'y
+    arrivent pas: chaque entrée expire après `ttl` secondes et la vue relit
+    alors la base. Plusieurs workers: DjangoCacheLatestBackend.
+    """
+
+    def __init__(self, ttl=5, **options):
+        self.ttl = ttl
+        self._entries = {}  # eui -> (entrée, expires_at)
+        self._lock = threading.Lock()
+
+    def _current(self, device_eui):
+        item = self._entries.get(device_eui)
+        if item is None or item[1] < time.monotonic():
+            return None
+        return item[0]
+
+    def get(self, device_eui):
+        entry = self._current(device_eui)
+        if entry is None:
+            # expirée: retirée, la vue relit la base
+            with self._lock:
+                item = self._entries.get(device_eui)
+                if item is not None and item[1] < time.monotonic():
+                    del self._entries[device_eui]
+        return entry
+
+    def set_if_newer(self, device_eui, entry):
+        with self._lock:
+            current = self._current(device_eui)
+            if current is None or current["ts"] <= entry["ts"]:
+                self._entries[device_eui] = (entry, time.monotonic() + self.ttl)
+
+    def delete(self, device_eui):
+        with self._lock:
+            self._entries.pop(device_eui, None)
+
+    async def aget(self, device_eui):
+        return self.get(device_eui)
+
+    async def aset_if_newer(self, device_eui, entry):
+        self.set_if_newer(device_eui, entry)
+
+
+class DjangoCacheLatestBackend:
+    """
+    Dernier point par device dans un cache Django (Redis, Memcached...),
+    partagé entre workers. Le "set si plus récent" n'est pas atomique entre
+    workers: au pire un point plus ancien de quelques ms gagne jusqu'au suivant.
+    """
+
+    def __init__(self, alias="default", timeout=86400, key_prefix="telemetry:latest:"):
+        self.alias = alias
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    @property
+    def _cache(self):
+        return caches[self.alias]
+
+    def get(self, device_eui):
+        return self._cache.get(self.key_prefix + device_eui)
+
+    def set_if_newer(self, device_eui, entry):
+        current = self.get(device_eui)
+        if current is None or current["ts"] <= entry["ts"]:
+            self._cache.set(self.key_prefix + device_eui, entry, self.timeout)
+
+    def delete(self, device_eui):
+        self._cache.delete(self.key_prefix + device_eui)
+
+    async def aget(self, device_eui):
+        return await self._cache.aget(self.key_prefix + device_eui)
+
+    async def aset_if_newer(self, device_eui, entry):
+        current = await self.aget(device_eui)
+        if current is None or current["ts"] <= entry["ts"]:
+            await self._cache.aset(self.key_prefix + device_eui, entry, self.timeout)
+
+
+class LatestPointCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, device_eui):
+        return self.backend.get(device_eui)
+
+    def store(self, device_eui, point):
+        entry = make_entry(device_eui, point)
+        self.backend.set_if_newer(device_eui, entry)
+        return entry
+
+    def delete(self, device_eui):
+        self.backend.delete(device_eui)
+
+    async def aget(self, device_eui):
+        return await self.backend.aget(device_eui)
+
+    async def astore(self, device_eui, point):
+        entry = make_entry(device_eui, point)
+        await self.backend.aset_if_newer(device_eui, entry)
+        return entry
+
+    def update_from_points(self, points):
+        """
+        Listener d'ingest: points = [(device_eui, TelemetryPoint), ...]
+        """
+        newest = {}
+        for device_eui, p in points:
+            if device_eui not in newest or newest[device_eui].ts <= p.ts:
+                newest[device_eui] = p
+        for device_eui, p in newest.items():
+            self.store(device_eui, p)
+
+
+def _load_backend():
+    config = getattr(settings, "TELEMETRY_LATEST_CACHE", {})
+    backend_cls = import_string(config.get("BACKEND", "environmentsurveillance.latest_cache.LocMemLatestBackend"))
+    return backend_cls(**config.get("OPTIONS", {}))
+
+
+latest_points = LatestPointCache(_load_backend())
@@ -0,0 +1,384 @@
+"""
+Client HTTP/1.1 asyncio minimal (stdlib, connexions keep-alive) pour les
+tests de charge: `loadtest_views` compare les vues sync et async,
+`replay_ttn` rejoue un flux de webhooks TTN (run_replay).
+
+Volontairement sans dépendance (pas d'aiohttp/httpx): seules les réponses
+Content-Length et chunked sont gérées, ce qui suffit pour l'API.
+"""
+import asyncio
+import json
+import random
+import time
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+
+class HttpError(Exception):
+    pass
+
+
+class KeepAliveConnection:
+    """
+    Une connexion TCP réutilisée pour des requêtes successives.
+    """
+
+    def __init__(self, host, port, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """
+        -> (status, headers dict en minuscules, body bytes)
+        Une reconnexion est tentée si le serveur a fermé la connexion au repos.
+        """
+        for attempt in (1, 2):
+            if self._writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(self._roundtrip(method, path, body, headers), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if attempt == 2:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def _roundtrip(self, method, path, body, headers):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        if body is not None:
+            lines.append(f"Content-Length: {len(body)}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b""))
+        await self._writer.drain()
+
+        status_line = await self._reader.readuntil(b"\r\n")
+        if not status_line:
+            raise ConnectionError("connection closed")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HttpError(f"bad status line: {status_line!r}")
+
+        response_headers = {}
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    await self._reader.readuntil(b"\r\n")
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            data = b"".join(chunks)
+        elif status == 304 or status == 204:
+            data = b""
+        else:
+            data = await self._reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, response_headers, data
+
+
+# --------------------------
+# Statistiques
+# --------------------------
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def add(self, status, latency):
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def histogram(self, bounds=LATENCY_BUCKETS_MS):
+        """
+        -> {"<=5": n, ..., ">5000": n} (ms, non cumulé)
+        """
+        counts = [0] * (len(bounds) + 1)
+        for latency in self.latencies:
+            counts[bisect_left(bounds, latency * 1000)] += 1
+        labels = [f"<={b}" for b in bounds] + [f">{bounds[-1]}"]
+        return dict(zip(labels, counts))
+
+    def summary(self, duration):
+        latencies = sorted(self.latencies)
+        ok = sum(n for status, n in self.statuses.items() if status < 400)
+        to_ms = lambda v: None if v is None else round(v * 1000, 2)
+        return {
+            "requests": len(latencies),
+            "ok": ok,
+            "errors": self.errors + len(latencies) - ok,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items())},
+            "duration": round(duration, 3),
+            "rps": round(len(latencies) / duration, 1) if duration else 0.0,
+            "p50_ms": to_ms(percentile(latencies, 50)),
+            "p90_ms": to_ms(percentile(latencies, 90)),
+            "p99_ms": to_ms(percentile(latencies, 99)),
+            "max_ms": to_ms(latencies[-1] if latencies else None),
+        }
+
+
+# --------------------------
+# Scénarios
+# --------------------------
+def make_euis(n, prefix="LT"):
+    return [f"{prefix}{i:0{16 - len(prefix)}X}" for i in range(n)]
+
+
+def ttn_payload(eui, rng):
+    return {
+        "end_device_ids": {"device_id": f"lt-{eui[-4:].lower()}", "dev_eui": eui},
+        "uplink_message": {
+            "f_port": 1,
+            "decoded_payload": {
+                "latitude": 14.7 + rng.random() / 10,
+                "longitude": -17.4 + rng.random() / 10,
+                "temperature": round(20 + rng.random() * 10, 2),
+                "battery": rng.randint(3000, 4200),
+            },
+            "rx_metadata": [{"rssi": -rng.randint(40, 120), "snr": round(rng.uniform(-10, 10), 1)}],
+        },
+        "end_device_name": f"lt-{eui[-4:].lower()}",
+    }
+
+
+def telemetry_payload(eui, rng):
+    return {
+        "device_eui": eui,
+        "ts": int(time.time()),
+        "lat": 14.7 + rng.random() / 10,
+        "lng": -17.4 + rng.random() / 10,
+        "temp": round(20 + rng.random() * 10, 2),
+        "battery": rng.randint(3000, 4200),
+    }
+
+
+def build_request(scenario, euis, rng, prefix="/api"):
+    """
+    scénario -> (method, path, body)
+    "mixed": 50 % ingest, 30 % latest, 20 % history (profil type tableau de bord + flotte)
+    """
+    if scenario == "mixed":
+        roll = rng.random()
+        scenario = "ingest" if roll < 0.5 else "latest" if roll < 0.8 else "history"
+
+    eui = rng.choice(euis)
+    if scenario == "uplink":
+        return "POST", f"{prefix}/v1/uplink", json.dumps(ttn_payload(eui, rng)).encode()
+    if scenario == "ingest":
+        return "POST", f"{prefix}/v1/telemetry/ingest/", json.dumps(telemetry_payload(eui, rng)).encode()
+    if scenario == "latest":
+        return "GET", f"{prefix}/v1/telemetry/latest/{eui}/", None
+    if scenario == "history":
+        return "GET", f"{prefix}/v1/telemetry/history/{eui}/?limit=300", None
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+SCENARIOS = ("ingest", "uplink", "latest", "history", "mixed")
+
+
+async def run_load(base_url, scenario, euis, concurrency=50, duration=10.0, rate=None, timeout=10.0, seed=None):
+    """
+    `concurrency` workers, chacun sur sa connexion keep-alive, pendant `duration` s.
+    rate: plafond global de requêtes/s (None = aussi vite que possible).
+    Retour: Stats.summary()
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    prefix = url.path.rstrip("/")
+
+    stats = Stats()
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + duration
+    interval = concurrency / rate if rate else 0.0
+
+    async def worker(index):
+        conn = KeepAliveConnection(host, port, timeout=timeout)
+        # départs décalés pour lisser le débit quand rate est fixé
+        next_at = started + (interval * index / concurrency if interval else 0.0)
+        try:
+            while True:
+                if interval:
+                    delay = next_at - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    next_at += interval
+                if loop.time() >= deadline:
+                    break
+                method, path, body = build_request(scenario, euis, rng, prefix)
+                headers = {"Content-Type": "application/json"} if body is not None else None
+                t0 = time.perf_counter()
+                try:
+                    status, _, _ = await conn.request(method, path, body, headers)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError):
+                    stats.errors += 1
+                    continue
+                stats.add(status, time.perf_counter() - t0)
+        finally:
+            await conn.close()
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return stats.summary(loop.time() - started)
+
+
+async def seed_devices(base_url, euis, timeout=10.0):
+    """
+    Un point par device via l'API (les scénarios latest/history ne renvoient pas que des 404).
+    """
+    url = urlsplit(base_url)
+    conn = KeepAliveConnection(url.hostname, url.port or 80, timeout=timeout)
+    rng = random.Random(0)
+    try:
+        for eui in euis:
+            body = json.dumps(telemetry_payload(eui, rng)).encode()
+            await conn.request(
+                "POST", f"{url.path.rstrip('/')}/v1/telemetry/ingest/", body,
+                {"Content-Type": "application/json"},
+            )
+    finally:
+        await conn.close()
+
+
+# --------------------------
+# Rejeu de webhooks TTN
+# --------------------------
+async def run_replay(base_url, bodies, concurrency=20, rate=None, burst=1, duration=None,
+                     duplicate_rate=0.0, retries=0, timeout=10.0, seed=None):
+    """
+    Envoie `bodies` (itérable de webhooks JSON encodés) sur POST <base_url>/v1/uplink
+    comme le fait TTN:
+      rate / burst    : `burst` webhooks lâchés ensemble, rate / s en moyenne (None = sans limite)
+      duplicate_rate  : part des webhooks renvoyés une seconde fois (retry TTN d'un uplink déjà reçu)
+      retries         : nouvelles tentatives sur erreur réseau ou 5xx (backoff 0.1 s, 0.2 s...)
+    S'arrête à la fin de `bodies` ou après `duration` s.
+    Retour: Stats.summary() + "sent", "duplicates", "retried", "histogram_ms",
+    "exhausted" (bodies épuisé avant `duration`) et "feed_duration"; "rps" ne
+    compte que les réponses reçues tant que le flux était alimenté, sur cette
+    durée (la vidange de la file une fois le flux tari ne dilue pas le débit).
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    path = f"{url.path.rstrip('/')}/v1/uplink"
+    headers = {"Content-Type": "application/json"}
+
+    stats = Stats()
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + duration if duration else None
+    queue = asyncio.Queue(maxsize=max(concurrency * 2, burst))
+    counters = {"sent": 0, "duplicates": 0, "retried": 0}
+    feeding = {"until": None, "completed": 0, "exhausted": False}
+
+    async def feed():
+        next_at = started
+        pending = []
+        for body in bodies:
+            pending.append(body)
+            if rng.random() < duplicate_rate:
+                pending.append(body)
+                counters["duplicates"] += 1
+            if len(pending) < burst:
+                continue
+            if rate:
+                delay = next_at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_at += len(pending) / rate
+            if deadline is not None and loop.time() >= deadline:
+                pending = []
+                break
+            for item in pending:
+                await queue.put(item)
+            pending = []
+        else:
+            feeding["exhausted"] = True
+        for item in pending:
+            await queue.put(item)
+        feeding["until"] = loop.time()
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        conn = KeepAliveConnection(host, port, timeout=timeout)
+        try:
+            while True:
+                body = await queue.get()
+                if body is None:
+                    break
+                counters["sent"] += 1
+                for attempt in range(retries + 1):
+                    if attempt:
+                        counters["retried"] += 1
+                        await asyncio.sleep(0.1 * 2 ** (attempt - 1))
+                    t0 = time.perf_counter()
+                    try:
+                        status, _, _ = await conn.request("POST", path, body, headers)
+                    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HttpError):
+                        status = None
+                    if status is not None and status < 500:
+                        break
+                if status is None:
+                    stats.errors += 1
+                else:
+                    stats.add(status, time.perf_counter() - t0)
+                    if feeding["until"] is None:
+                        feeding["completed"] += 1
+        finally:
+            await conn.close()
+
+    await asyncio.gather(feed(), *(worker() for _ in range(concurrency)))
+    summary = stats.summary(loop.time() - started)
+    feed_duration = feeding["until"] - started
+    if feed_duration > 0 and feeding["completed"]:
+        summary["rps"] = round(feeding["completed"] / feed_duration, 1)
+    return {
+        **summary,
+        **counters,
+        "exhausted": feeding["exhausted"],
+        "feed_duration": round(feed_duration, 3),
+        "histogram_ms": stats.histogram(),
+    }
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from environmentsurveillance.alerts import alert_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Vérifie les règles de silence (secondes depuis le dernier point de chaque device actif, "
+        "lu en base). Utile quand tout l'ingest peut s'arrêter: sinon l'ingest déclenche lui-même "
+        "la vérification toutes les ALERT_SWEEP_INTERVAL s."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=30, help="Secondes entre deux vérifications")
+        parser.add_argument("--once", action="store_true")
+
+    def handle(self, *args, **options):
+        while True:
+            alert_engine.load_last_seen()
+            events = alert_engine.sweep()
+            alert_engine.persist(events)
+            if events:
+                self.stdout.write(f"{len(events)} événement(s) d'alerte")
+            if options["once"]:
+                alert_engine.flush()
+                break
+            time.sleep(options["interval"])
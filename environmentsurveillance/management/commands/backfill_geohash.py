@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from environmentsurveillance.geo import geohash_encode
+from environmentsurveillance.models import TelemetryPoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Renseigne TelemetryPoint.geohash pour les points écrits avant son ajout. "
+        "Par lots courts (un UPDATE par lot), reprenable avec --start-id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--sleep", type=float, default=0.1, help="Pause entre deux lots (s), pour limiter la charge")
+        parser.add_argument("--start-id", type=int, default=0, help="Reprendre après cet id")
+        parser.add_argument("--limit", type=int, help="Nombre max de lignes traitées")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size doit être > 0")
+
+        pending = TelemetryPoint.objects.filter(geohash__isnull=True)
+
+        last_id = options["start_id"]
+        done = 0
+        while options["limit"] is None or done < options["limit"]:
+            size = batch_size if options["limit"] is None else min(batch_size, options["limit"] - done)
+            rows = list(pending.filter(id__gt=last_id).order_by("id").only("id", "ts", "lat", "lng")[:size])
+            if not rows:
+                break
+
+            for row in rows:
+                row.geohash = geohash_encode(row.lat, row.lng)
+
+            # borne sur ts: élagage des partitions pour l'UPDATE
+            ts = [row.ts for row in rows]
+            TelemetryPoint.objects.filter(ts__gte=min(ts), ts__lte=max(ts)).bulk_update(rows, ["geohash"])
+
+            last_id = rows[-1].id
+            done += len(rows)
+            self.stdout.write(f"{done} point(s) mis à jour (dernier id: {last_id})")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Terminé: {done} point(s)"))
@@ -0,0 +1,95 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from environmentsurveillance.models import TTNUplink
+from environmentsurveillance.uplink_storage import extract_uplink_fields, storage_fields, storage_mode
+
+
+class Command(BaseCommand):
+    help = (
+        "Convertit les TTNUplink existants: colonnes extraites (f_cnt, gateway_id, spreading_factor, "
+        "airtime, frm_payload_size) et webhook brut compressé selon TTN_RAW_PAYLOAD_STORAGE. "
+        "Par lots courts (un UPDATE par lot, pas de verrou de table), reprenable avec --start-id. "
+        "Lancer un VACUUM ensuite pour récupérer la place."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=("json", "zlib", "lz4"), help="Défaut: TTN_RAW_PAYLOAD_STORAGE")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.1, help="Pause entre deux lots (s), pour limiter la charge")
+        parser.add_argument("--start-id", type=int, default=0, help="Reprendre après cet id")
+        parser.add_argument("--limit", type=int, help="Nombre max de lignes traitées")
+        parser.add_argument("--dry-run", action="store_true", help="Compte les lignes et mesure le gain sur un lot")
+
+    def handle(self, *args, **options):
+        mode = options["mode"] or storage_mode()
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size doit être > 0")
+
+        # lignes pas encore converties: JSON brut encore présent
+        pending = TTNUplink.objects.filter(raw_payload__isnull=False)
+
+        if options["dry_run"]:
+            self._dry_run(pending, mode, batch_size)
+            return
+
+        fields = ["f_cnt", "gateway_id", "spreading_factor", "airtime", "frm_payload_size"]
+        if mode != "json":
+            fields += ["raw_payload", "raw_payload_compressed"]
+
+        last_id = options["start_id"]
+        done = 0
+        while options["limit"] is None or done < options["limit"]:
+            size = batch_size if options["limit"] is None else min(batch_size, options["limit"] - done)
+            rows = list(
+                pending.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "received_at", "raw_payload", "f_cnt")[:size]
+            )
+            if not rows:
+                break
+
+            for row in rows:
+                extracted = extract_uplink_fields(row.raw_payload)
+                if row.f_cnt is None:
+                    try:
+                        extracted["f_cnt"] = int((row.raw_payload.get("uplink_message") or {}).get("f_cnt"))
+                    except (TypeError, ValueError):
+                        extracted["f_cnt"] = None
+                else:
+                    extracted["f_cnt"] = row.f_cnt
+                if mode != "json":
+                    extracted.update(storage_fields(row.raw_payload, mode))
+                for name, value in extracted.items():
+                    setattr(row, name, value)
+
+            # borne sur received_at: élagage des partitions pour l'UPDATE
+            received = [row.received_at for row in rows]
+            TTNUplink.objects.filter(
+                received_at__gte=min(received), received_at__lte=max(received),
+            ).bulk_update(rows, fields)
+
+            last_id = rows[-1].id
+            done += len(rows)
+            self.stdout.write(f"{done} ligne(s) converties (dernier id: {last_id})")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Terminé: {done} ligne(s), mode {mode}"))
+
+    def _dry_run(self, pending, mode, batch_size):
+        self.stdout.write(f"{pending.count()} ligne(s) à convertir (mode {mode})")
+        if mode == "json":
+            return
+        raw_size = compressed_size = 0
+        for payload in pending.order_by("-id").values_list("raw_payload", flat=True)[:batch_size]:
+            raw_size += len(json.dumps(payload).encode("utf-8"))
+            compressed_size += len(storage_fields(payload, mode)["raw_payload_compressed"])
+        if raw_size:
+            self.stdout.write(
+                f"échantillon: {raw_size} -> {compressed_size} octets "
+                f"({compressed_size / raw_size:.0%} du JSON)"
+            )
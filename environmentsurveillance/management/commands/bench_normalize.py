@@ -0,0 +1,177 @@
+import random
+import re
+import time
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from environmentsurveillance.normalize import extract_decoded, normalize_telemetry, to_float
+
+
+# --------------------------
+# Référence: helpers d'avant normalize.py (ingest._to_float, _extract_gps, parse_telemetry)
+# --------------------------
+def legacy_to_float(v):
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        m = re.search(r'[-+]?\d+(\.\d+)?', v)
+        if not m:
+            return None
+        try:
+            return float(m.group(0))
+        except ValueError:
+            return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def legacy_extract_gps(decoded_payload):
+    if not isinstance(decoded_payload, dict):
+        return None, None
+    lat = decoded_payload.get("lat")
+    lng = decoded_payload.get("lng")
+    if lat is None:
+        lat = decoded_payload.get("latitude")
+    if lng is None:
+        lng = decoded_payload.get("longitude")
+    gps = decoded_payload.get("gps")
+    if (lat is None or lng is None) and isinstance(gps, dict):
+        if lat is None:
+            lat = gps.get("lat") or gps.get("latitude")
+        if lng is None:
+            lng = gps.get("lng") or gps.get("lon") or gps.get("longitude")
+    return legacy_to_float(lat), legacy_to_float(lng)
+
+
+def legacy_parse_ts(ts_raw):
+    if ts_raw is None:
+        return timezone.now()
+    try:
+        ts = float(ts_raw)
+        if ts > 1_000_000_000_000:
+            ts /= 1000
+        return timezone.datetime.fromtimestamp(ts, tz=timezone.get_current_timezone())
+    except Exception:
+        return timezone.now()
+
+
+def legacy_parse_telemetry(data):
+    if not isinstance(data, dict):
+        return None, "Invalid payload"
+    device_eui = str(data.get("device_eui") or "").strip()
+    if not device_eui:
+        return None, "Missing device_eui"
+    lat = legacy_to_float(data.get("lat"))
+    lng = legacy_to_float(data.get("lng"))
+    if lat is None or lng is None:
+        return None, "Missing lat/lng"
+    return {
+        "device_eui": device_eui,
+        "point": {
+            "ts": legacy_parse_ts(data.get("ts")),
+            "lat": lat,
+            "lng": lng,
+            "temp": legacy_to_float(data.get("temp")),
+            "battery": legacy_to_float(data.get("battery") or data.get("battery_level")),
+            "rssi": legacy_to_float(data.get("rssi")),
+            "snr": legacy_to_float(data.get("snr")),
+        },
+    }, None
+
+
+# --------------------------
+# Jeux de données
+# --------------------------
+SHAPES = ("numeric", "strings", "nested")
+
+
+def make_telemetry(n, shape, rng):
+    start = int(time.time()) - n
+    payloads = []
+    for i in range(n):
+        lat, lng = 14.7 + rng.random() / 10, -17.4 + rng.random() / 10
+        temp, battery = round(rng.uniform(15, 40), 1), rng.randint(0, 100)
+        if shape == "strings":
+            lat, lng, temp, battery = f"{lat:.6f}", f"{lng:.6f}", f"{temp} C", f"{battery}%"
+        payloads.append({
+            "device_eui": f"70B3D57ED00{i % 100:05X}",
+            "ts": (start + i) * 1000,
+            "lat": lat,
+            "lng": lng,
+            "temp": temp,
+            "battery_level": battery,
+            "rssi": -rng.randint(60, 120),
+            "snr": round(rng.uniform(-10, 10), 1),
+        })
+    return payloads
+
+
+def make_decoded(n, shape, rng):
+    decoded = []
+    for _ in range(n):
+        lat, lng = 14.7 + rng.random() / 10, -17.4 + rng.random() / 10
+        if shape == "nested":
+            decoded.append({"gps": {"latitude": lat, "lon": lng}, "temp": 22.5, "battery": 90})
+        elif shape == "strings":
+            decoded.append({"latitude": f"{lat:.6f}", "longitude": f"{lng:.6f}", "temp": "22.5 C"})
+        else:
+            decoded.append({"lat": lat, "lng": lng, "temp": 22.5, "battery": 90})
+    return decoded
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmarks de la normalisation (normalize.py) face aux anciens helpers "
+        "d'ingest (_to_float, _extract_gps, parse_telemetry point par point). "
+        "Affiche ns/message et le gain par forme de payload et taille de lot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, action="append", help="Taille de lot (répétable, défaut: 1, 500, 10000)")
+        parser.add_argument("--shape", action="append", choices=SHAPES, help="Répétable (défaut: toutes)")
+        parser.add_argument("--repeat", type=int, default=5, help="Meilleur temps sur N mesures")
+
+    def handle(self, *args, **options):
+        sizes = options["size"] or [1, 500, 10000]
+        shapes = options["shape"] or list(SHAPES)
+        if min(sizes) < 1 or options["repeat"] < 1:
+            raise CommandError("--size et --repeat doivent être > 0")
+        rng = random.Random(0)
+
+        self.stdout.write(f"{'bench':<22} {'forme':<8} {'lot':>6} {'avant':>10} {'après':>10} {'gain':>6}")
+        for shape in shapes:
+            for size in sizes:
+                payloads = make_telemetry(size, shape, rng)
+                decoded = make_decoded(size, shape, rng)
+                values = [v for p in payloads for v in (p["lat"], p["temp"], p["battery_level"])]
+
+                self._compare(
+                    "to_float", shape, size, len(values), options["repeat"],
+                    lambda: [legacy_to_float(v) for v in values],
+                    lambda: [to_float(v) for v in values],
+                )
+                self._compare(
+                    "extract_gps", shape, size, size, options["repeat"],
+                    lambda: [(legacy_extract_gps(d), legacy_to_float(d.get("temp"))) for d in decoded],
+                    lambda: [extract_decoded(d) for d in decoded],
+                )
+                self._compare(
+                    "telemetry batch", shape, size, size, options["repeat"],
+                    lambda: [legacy_parse_telemetry(p) for p in payloads],
+                    lambda: normalize_telemetry(payloads),
+                )
+
+    def _compare(self, name, shape, size, count, repeat, before, after):
+        number = max(1, 20000 // count)
+        t_before = min(timeit.repeat(before, number=number, repeat=repeat)) / (number * count)
+        t_after = min(timeit.repeat(after, number=number, repeat=repeat)) / (number * count)
+        self.stdout.write(
+            f"{name:<22} {shape:<8} {size:>6} {t_before * 1e9:>8.0f}ns {t_after * 1e9:>8.0f}ns "
+            f"{t_before / t_after:>5.2f}x"
+        )
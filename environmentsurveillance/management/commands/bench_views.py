@@ -0,0 +1,147 @@
+import json
+import platform
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+from environmentsurveillance.benchmarks import (
+    BenchContext,
+    HISTORY_LIMITS,
+    WRITE_BENCHMARKS,
+    benchmarks,
+    compare,
+    run_benchmark,
+)
+from environmentsurveillance.device_registry import device_registry
+from environmentsurveillance.fleet import generate_fleet, make_fleet_euis
+
+
+def _fmt(value, spec=""):
+    """
+    Valeur numérique formatée, "-" si absente (pas de mesure: --iterations 0,
+    benchmark absent du run de référence); le cadrage se fait ensuite sur la chaîne.
+    """
+    return "-" if value is None else format(value, spec)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks des vues (ttn_uplink, telemetry_ingest, telemetry_latest, telemetry_history, "
+        "list_ttn_uplinks): débit, percentiles de latence, requêtes SQL par requête.\n"
+        "Par défaut sur une base de test créée pour l'occasion et remplie par une flotte "
+        "synthétique (--devices x --points); --current-db pour mesurer la base configurée telle quelle "
+        "(lectures seules, sauf --include-writes).\n"
+        "  manage.py bench_views --output avant.json\n"
+        "  manage.py bench_views --compare avant.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--devices", type=int, default=10)
+        parser.add_argument("--points", type=int, default=5000, help="Points par device (>= la plus grande limite)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=200, help="Requêtes mesurées par benchmark")
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--limits", default=",".join(str(n) for n in HISTORY_LIMITS),
+            help="Valeurs de limit pour telemetry_history",
+        )
+        parser.add_argument("--benchmark", action="append", help="Préfixe du nom (répétable, défaut: tous)")
+        parser.add_argument("--current-db", action="store_true", help="Base configurée, sans générer de flotte")
+        parser.add_argument(
+            "--include-writes", action="store_true",
+            help="Avec --current-db: lance aussi ttn_uplink / telemetry_ingest (écrit dans la base configurée)",
+        )
+        parser.add_argument("--prefix", default="FL", help="Préfixe des EUI de la flotte (--current-db)")
+        parser.add_argument("--keepdb", action="store_true", help="Garde la base de test entre deux runs")
+        parser.add_argument("--output", help="Fichier JSON des résultats")
+        parser.add_argument("--compare", help="Résultats JSON d'un run précédent")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            # tables partitionnées, index CONCURRENTLY, ON CONFLICT / DISTINCT ON de l'ingest
+            raise CommandError("Les benchmarks nécessitent PostgreSQL (schéma et ingest spécifiques)")
+        try:
+            limits = tuple(int(x) for x in options["limits"].split(",") if x)
+        except ValueError:
+            raise CommandError(f"--limits invalide: {options['limits']!r}")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+
+        suite = benchmarks(limits)
+        if options["benchmark"]:
+            suite = {name: b for name, b in suite.items() if name.startswith(tuple(options["benchmark"]))}
+            if not suite:
+                raise CommandError("Aucun benchmark ne correspond à --benchmark")
+
+        if options["current_db"] and not options["include_writes"]:
+            # la base configurée peut être celle de production: pas d'écriture sans accord explicite
+            skipped = [name for name in suite if name in WRITE_BENCHMARKS]
+            suite = {name: b for name, b in suite.items() if name not in WRITE_BENCHMARKS}
+            if skipped:
+                self.stdout.write(self.style.WARNING(
+                    f"--current-db: {', '.join(skipped)} ignorés (écritures), --include-writes pour les lancer"
+                ))
+            if not suite:
+                raise CommandError("Aucun benchmark en lecture ne correspond à --benchmark")
+
+        if options["current_db"]:
+            results = self.run_suite(suite, options)
+        else:
+            old_config = setup_databases(verbosity=0, interactive=False, keepdb=options["keepdb"])
+            try:
+                device_registry.clear()
+                if not options["keepdb"] or not self.fleet_exists(options):
+                    written = generate_fleet(options["devices"], options["points"], seed=options["seed"])
+                    self.stdout.write(f"Flotte: {written} uplinks ({options['devices']} devices)")
+                results = self.run_suite(suite, options)
+            finally:
+                teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+
+        report = {
+            "created_at": datetime.now(dt_timezone.utc).isoformat(),
+            "environment": {
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "params": {k: options[k] for k in ("devices", "points", "seed", "iterations", "warmup", "current_db")},
+            "results": results,
+        }
+        if baseline is not None:
+            deltas = compare(results, baseline)
+            if baseline.get("params", {}) != report["params"]:
+                self.stdout.write(self.style.WARNING("Paramètres différents du run de référence: écarts indicatifs"))
+            report["compare"] = {"baseline": options["compare"], "deltas": deltas}
+            self.stdout.write(f"\nÉcarts par rapport à {options['compare']}:")
+            for name, delta in deltas.items():
+                self.stdout.write(
+                    f"{name:<44} rps {_fmt(delta.get('rps'), '+'):>7} %  p50 {_fmt(delta.get('p50_ms'), '+'):>7} %  "
+                    f"p99 {_fmt(delta.get('p99_ms'), '+'):>7} %  requêtes SQL {_fmt(delta.get('queries_mean'), '+'):>6}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+    def fleet_exists(self, options):
+        from environmentsurveillance.models import Device
+        return Device.objects.filter(device_eui__in=make_fleet_euis(options["devices"])).count() == options["devices"]
+
+    def run_suite(self, suite, options):
+        euis = make_fleet_euis(options["devices"], options["prefix"])
+        results = []
+        for name, build_request in suite.items():
+            ctx = BenchContext(euis, seed=options["seed"])
+            summary = run_benchmark(build_request, ctx, iterations=options["iterations"], warmup=options["warmup"])
+            results.append({"name": name, **summary})
+            self.stdout.write(
+                f"{name:<44} {_fmt(summary['rps'], '.1f'):>8} req/s  p50 {_fmt(summary['p50_ms']):>8} ms  "
+                f"p99 {_fmt(summary['p99_ms']):>8} ms  SQL {_fmt(summary['queries_mean']):>5}  erreurs {summary['errors']}"
+            )
+        return results
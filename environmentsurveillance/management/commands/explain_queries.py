@@ -0,0 +1,124 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from environmentsurveillance.models import Device
+from environmentsurveillance.queries import (
+    UPLINK_COLUMNS,
+    area_queryset,
+    history_queryset,
+    latest_all_queryset,
+    latest_point_queryset,
+    uplinks_queryset,
+)
+
+
+INDEX_SCAN_RE = re.compile(r"(?:Index (?:Only )?Scan (?:Backward )?using|Bitmap Index Scan on) (\w+)")
+SEQ_SCAN_RE = re.compile(r"Seq Scan on (\w+)")
+
+# tables où un Seq Scan est une régression (elles grossissent sans fin)
+LARGE_TABLES = ("environmentsurveillance_telemetrypoint", "environmentsurveillance_ttnuplink")
+
+
+def _parent_index_names(cursor):
+    """
+    Index de partition -> index parent (tables partitionnées, migration 0008).
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, p.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE c.relkind = 'i'
+        """
+    )
+    return dict(cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN chaque requête de l'API et vérifie qu'elle utilise ses index (code retour 1 sinon)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--device", help="EUI du device utilisé pour les requêtes (défaut: le dernier créé)")
+        parser.add_argument("--analyze", action="store_true", help="EXPLAIN ANALYZE (exécute les requêtes)")
+        parser.add_argument(
+            "--planner-defaults",
+            action="store_true",
+            help="Garde enable_seqscan=on. Par défaut les seq scans sont désactivés pour vérifier "
+                 "que les index sont utilisables même sur une petite base de dev.",
+        )
+        parser.add_argument(
+            "--analyze-tables",
+            action="store_true",
+            help="ANALYZE les tables avant (statistiques à jour, évite des plans faux sur une base fraîche)",
+        )
+        parser.add_argument("--verbose-plans", action="store_true", help="Affiche les plans complets")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("explain_queries nécessite PostgreSQL")
+
+        if options["device"]:
+            device = Device.objects.filter(device_eui=options["device"]).first()
+        else:
+            device = Device.objects.order_by("-id").first()
+        if device is None:
+            raise CommandError("Aucun device en base")
+
+        if options["analyze_tables"]:
+            with connection.cursor() as cursor:
+                for table in ("environmentsurveillance_device", "environmentsurveillance_devicelastseen") + LARGE_TABLES:
+                    cursor.execute(f"ANALYZE {table}")
+
+        now = timezone.now()
+        # index acceptables (un seul suffit): la clé unique (device, ts) des partitions
+        # sert aussi bien les lectures d'un device
+        device_ts = {"telemetry_device_ts_idx", "telemetry_device_ts_unique"}
+        queries = [
+            ("telemetry_latest", latest_point_queryset(device.id)[:1], device_ts),
+            ("telemetry_history", history_queryset(device.id, now - timedelta(days=1), now)[:300], device_ts),
+            ("telemetry_latest_all", latest_all_queryset(), device_ts),
+            ("telemetry_area", area_queryset((-17.5, 14.6, -17.3, 14.8), now - timedelta(days=1), now)[:1000], {"telemetry_geohash_idx"}),
+            ("list_ttn_uplinks", uplinks_queryset().values_list("id", *UPLINK_COLUMNS)[:500], {"ttnuplink_received_idx"}),
+        ]
+
+        with connection.cursor() as cursor:
+            parents = _parent_index_names(cursor)
+
+        failures = 0
+        with transaction.atomic():
+            if not options["planner_defaults"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for name, qs, expected in queries:
+                plan = qs.explain(analyze=options["analyze"])
+                used = {parents.get(idx, idx) for idx in INDEX_SCAN_RE.findall(plan)}
+                seq_scans = set(SEQ_SCAN_RE.findall(plan))
+
+                problems = []
+                if not expected & used:
+                    problems.append("index non utilisé: " + " ou ".join(sorted(expected)))
+                bad_seq = {t for t in seq_scans if t.startswith(LARGE_TABLES)}
+                if bad_seq:
+                    problems.append("seq scan: " + ", ".join(sorted(bad_seq)))
+
+                status = self.style.ERROR("FAIL") if problems else self.style.SUCCESS("OK")
+                self.stdout.write(f"{status} {name}")
+                self.stdout.write(f"    index: {', '.join(sorted(used)) or '-'}")
+                if seq_scans:
+                    self.stdout.write(f"    seq scan: {', '.join(sorted(seq_scans))}")
+                for problem in problems:
+                    self.stdout.write(f"    ! {problem}")
+                if options["verbose_plans"] or problems:
+                    for line in plan.splitlines():
+                        self.stdout.write(f"      {line}")
+
+                failures += bool(problems)
+
+        if failures:
+            raise CommandError(f"{failures} requête(s) n'utilisent pas leurs index", returncode=1)
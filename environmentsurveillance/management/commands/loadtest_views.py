@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from environmentsurveillance.loadtest import SCENARIOS, make_euis, run_load, seed_devices
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge HTTP des vues d'ingest / lecture. Compare plusieurs serveurs déjà lancés, ex.:\n"
+        "  TELEMETRY_VIEWS=sync  gunicorn EnvironmentSurveillance.wsgi -w 4 --threads 8 -b :8001\n"
+        "  TELEMETRY_VIEWS=async uvicorn EnvironmentSurveillance.asgi:application --workers 4 --port 8002\n"
+        "  manage.py loadtest_views --target sync=http://127.0.0.1:8001/api "
+        "--target async=http://127.0.0.1:8002/api --concurrency 200"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", action="append", required=True,
+            help="nom=URL de base de l'API (répétable), ex. async=http://127.0.0.1:8002/api",
+        )
+        parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Répétable (défaut: tous)")
+        parser.add_argument("--concurrency", type=int, default=100, help="Connexions simultanées")
+        parser.add_argument("--duration", type=float, default=15, help="Secondes par scénario et par cible")
+        parser.add_argument("--rate", type=float, help="Plafond de requêtes/s (défaut: sans limite)")
+        parser.add_argument("--devices", type=int, default=200, help="Nombre de devices simulés")
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--no-seed", action="store_true", help="Ne pas créer les devices avant le test")
+        parser.add_argument("--output", help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        targets = []
+        for value in options["target"]:
+            name, sep, url = value.partition("=")
+            if not sep or not url.startswith("http://"):
+                raise CommandError(f"--target invalide: {value!r} (attendu nom=http://hôte:port/api)")
+            targets.append((name, url))
+
+        scenarios = options["scenario"] or list(SCENARIOS)
+        euis = make_euis(options["devices"])
+        results = []
+
+        for name, url in targets:
+            if not options["no_seed"]:
+                asyncio.run(seed_devices(url, euis, timeout=options["timeout"]))
+            for scenario in scenarios:
+                summary = asyncio.run(run_load(
+                    url, scenario, euis,
+                    concurrency=options["concurrency"],
+                    duration=options["duration"],
+                    rate=options["rate"],
+                    timeout=options["timeout"],
+                    seed=0,
+                ))
+                results.append({"target": name, "scenario": scenario, **summary})
+                self.stdout.write(
+                    f"{name:<10} {scenario:<8} {summary['rps']:>9.1f} req/s  "
+                    f"p50 {summary['p50_ms']} ms  p99 {summary['p99_ms']} ms  "
+                    f"erreurs {summary['errors']}/{summary['requests'] + summary['errors']}"
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    "concurrency": options["concurrency"],
+                    "duration": options["duration"],
+                    "rate": options["rate"],
+                    "devices": options["devices"],
+                    "results": results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
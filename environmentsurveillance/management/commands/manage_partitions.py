@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from environmentsurveillance.partitions import (
+    PARTITIONED_TABLES,
+    apply_retention,
+    ensure_partitions,
+    expired_partitions,
+    is_partitioned,
+    list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée à l'avance les partitions mensuelles de TelemetryPoint / TTNUplink et applique "
+        "la rétention (PARTITION_RETENTION_DAYS) en détachant/supprimant des partitions entières. "
+        "À lancer chaque jour (cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="Nombre de mois futurs à créer (défaut: 3)")
+        parser.add_argument("--retention", action="store_true", help="Applique la politique de rétention")
+        parser.add_argument("--detach-only", action="store_true", help="DETACH sans DROP (archivage manuel ensuite)")
+        parser.add_argument("--dry-run", action="store_true", help="Affiche ce qui serait fait")
+        parser.add_argument("--list", action="store_true", help="Liste les partitions existantes")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Le partitionnement nécessite PostgreSQL")
+
+        if options["list"]:
+            with connection.cursor() as cursor:
+                for key, (table, _) in PARTITIONED_TABLES.items():
+                    if not is_partitioned(cursor, table):
+                        self.stdout.write(f"{key}: table non partitionnée (migration 0008 non appliquée ?)")
+                        continue
+                    for name, lower, upper in list_partitions(cursor, table):
+                        self.stdout.write(f"{key}: {name} [{lower:%Y-%m-%d} .. {upper:%Y-%m-%d})")
+
+        if options["dry_run"]:
+            if options["retention"]:
+                for key, partitions in expired_partitions().items():
+                    for name, _, _ in partitions:
+                        action = "DETACH" if options["detach_only"] else "DETACH + DROP"
+                        self.stdout.write(f"[dry-run] {action} {name}")
+            return
+
+        for name in ensure_partitions(options["months_ahead"]):
+            self.stdout.write(self.style.SUCCESS(f"créée: {name}"))
+
+        if options["retention"]:
+            for name in apply_retention(drop=not options["detach_only"]):
+                verb = "détachée" if options["detach_only"] else "supprimée"
+                self.stdout.write(self.style.WARNING(f"{verb}: {name}"))
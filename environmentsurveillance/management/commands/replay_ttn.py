@@ -0,0 +1,139 @@
+import asyncio
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from environmentsurveillance.fleet import fleet_uplinks, make_fleet_euis, vary_uplink
+from environmentsurveillance.loadtest import run_replay
+
+
+def read_stream(path):
+    """
+    Fichier de webhooks TTN: NDJSON (un webhook par ligne, lu au fil de l'eau) ou tableau JSON
+    -> itérable de corps encodés
+    """
+    with open(path, "rb") as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == b"[":
+            items = json.load(f)
+            yield from (json.dumps(item).encode() for item in items)
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue un flux de webhooks TTN sur POST /api/v1/uplink d'une instance lancée, comme TTN: "
+        "rafales, retries, doublons, passerelles multiples, formats de decoded_payload variés.\n"
+        "Flux enregistré (--file, NDJSON ou tableau JSON) ou synthétique (flotte de fleet.py).\n"
+        "Recherche du point de saturation par paliers de débit:\n"
+        "  manage.py replay_ttn --url http://127.0.0.1:8000/api --rate 100,200,400,800 --step-duration 30"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", required=True, help="URL de base de l'API, ex. http://127.0.0.1:8000/api")
+        parser.add_argument("--file", help="Webhooks enregistrés (NDJSON ou tableau JSON)")
+        parser.add_argument("--devices", type=int, default=200, help="Flux synthétique: nombre de devices")
+        parser.add_argument("--points", type=int, default=500, help="Flux synthétique: uplinks par device")
+        parser.add_argument("--interval", type=int, default=60, help="Flux synthétique: secondes entre deux uplinks")
+        parser.add_argument("--prefix", default="TT", help="Flux synthétique: préfixe des EUI")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--uniform", action="store_true", help="Flux synthétique sans variantes de format")
+        parser.add_argument("--save-stream", help="Écrit le flux synthétique en NDJSON (sans l'envoyer)")
+        parser.add_argument("--rate", help="Webhooks/s, paliers séparés par des virgules (défaut: sans limite)")
+        parser.add_argument("--step-duration", type=float, default=30, help="Secondes par palier")
+        parser.add_argument("--burst", type=int, default=1, help="Webhooks lâchés ensemble")
+        parser.add_argument("--concurrency", type=int, default=50, help="Connexions keep-alive simultanées")
+        parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Part de webhooks renvoyés deux fois")
+        parser.add_argument("--retries", type=int, default=2, help="Nouvelles tentatives sur erreur réseau / 5xx")
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument("--output", help="Fichier JSON des résultats")
+
+    def handle(self, *args, **options):
+        if not options["url"].startswith("http://"):
+            raise CommandError("--url: seul http:// est géré (ex. http://127.0.0.1:8000/api)")
+        try:
+            rates = [float(r) for r in options["rate"].split(",")] if options["rate"] else [None]
+        except ValueError:
+            raise CommandError(f"--rate invalide: {options['rate']!r}")
+
+        bodies = self.stream(options)
+        if options["save_stream"]:
+            count = 0
+            with open(options["save_stream"], "wb") as f:
+                for body in bodies:
+                    f.write(body + b"\n")
+                    count += 1
+            self.stdout.write(self.style.SUCCESS(f"{count} webhooks écrits dans {options['save_stream']}"))
+            return
+
+        # un seul itérateur pour tous les paliers: chaque palier envoie des uplinks jamais vus
+        bodies = iter(bodies)
+        steps = []
+        for rate in rates:
+            summary = asyncio.run(run_replay(
+                options["url"], bodies,
+                concurrency=options["concurrency"],
+                rate=rate,
+                burst=options["burst"],
+                duration=options["step_duration"] if rate else None,
+                duplicate_rate=options["duplicate_rate"],
+                retries=options["retries"],
+                timeout=options["timeout"],
+                seed=options["seed"],
+            ))
+            if summary["sent"] == 0:
+                self.stdout.write(self.style.WARNING("Flux épuisé"))
+                break
+            total = summary["requests"] + summary["errors"]
+            error_rate = summary["errors"] / total if total else 0.0
+            # débit visé non tenu ou erreurs: ttn_uplink ne suit plus. Un palier
+            # écourté par la fin du flux n'a pas tenu sa durée: son débit ne dit rien
+            # de la saturation, seules les erreurs comptent.
+            slow = not summary["exhausted"] and summary["rps"] < 0.9 * (rate or 0)
+            saturated = bool(rate) and (slow or error_rate > 0.01)
+            steps.append({"target_rps": rate, "error_rate": round(error_rate, 4), "saturated": saturated, **summary})
+            self.stdout.write(
+                f"cible {rate or 'max':>7}  {summary['rps']:>8.1f} req/s  p50 {summary['p50_ms']} ms  "
+                f"p99 {summary['p99_ms']} ms  erreurs {error_rate:.2%}  retries {summary['retried']}"
+                + ("  SATURÉ" if saturated else "")
+            )
+            if summary["exhausted"]:
+                self.stdout.write(self.style.WARNING("Flux épuisé"))
+                break
+
+        for step in steps:
+            self.stdout.write(f"\nLatence ({step['target_rps'] or 'max'} req/s visés), ms:")
+            peak = max(step["histogram_ms"].values()) or 1
+            for label, count in step["histogram_ms"].items():
+                self.stdout.write(f"  {label:>7} {count:>8}  {'#' * round(40 * count / peak)}")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump({
+                    "url": options["url"],
+                    "source": options["file"] or "synthetic",
+                    "params": {k: options[k] for k in (
+                        "devices", "points", "seed", "concurrency", "burst", "duplicate_rate", "retries", "step_duration",
+                    )},
+                    "steps": steps,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {options['output']}"))
+
+    def stream(self, options):
+        if options["file"]:
+            return read_stream(options["file"])
+
+        euis = make_fleet_euis(options["devices"], options["prefix"])
+        payloads = fleet_uplinks(euis, options["points"], interval=options["interval"], seed=options["seed"])
+        if not options["uniform"]:
+            rng = random.Random(options["seed"])
+            payloads = (vary_uplink(p, rng) for p in payloads)
+        return (json.dumps(p).encode() for p in payloads)
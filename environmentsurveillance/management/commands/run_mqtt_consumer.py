@@ -0,0 +1,57 @@
+import json
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from environmentsurveillance.mqtt_consumer import TelemetryConsumer
+
+
+class Command(BaseCommand):
+    help = (
+        "S'abonne à MQTT_TOPIC et écrit les TelemetryPoint par lots (bulk_create). "
+        "Les messages suivent le format de /api/v1/telemetry/ingest/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", help="Défaut: MQTT_HOST")
+        parser.add_argument("--port", type=int, help="Défaut: MQTT_PORT")
+        parser.add_argument("--topic", help="Défaut: MQTT_TOPIC (jokers + et # acceptés)")
+        parser.add_argument("--qos", type=int, choices=(0,), help="Défaut: MQTT_QOS (QoS 0 uniquement)")
+        parser.add_argument("--client-id", help="Défaut: MQTT_CLIENT_ID")
+        parser.add_argument("--batch-size", type=int, help="Défaut: INGEST_BATCH_SIZE")
+        parser.add_argument("--flush-interval", type=float, help="Défaut: INGEST_FLUSH_INTERVAL")
+        parser.add_argument("--max-backoff", type=float, default=60, help="Délai max entre deux reconnexions (s)")
+        parser.add_argument("--stats-interval", type=float, default=10, help="Affiche les compteurs toutes les N s (0: jamais)")
+
+    def handle(self, *args, **options):
+        consumer = TelemetryConsumer(
+            host=options["host"],
+            port=options["port"],
+            topic=options["topic"],
+            qos=options["qos"],
+            client_id=options["client_id"],
+            batch_size=options["batch_size"],
+            flush_interval=options["flush_interval"],
+            backoff_max=options["max_backoff"],
+        )
+
+        def shutdown(signum, frame):
+            consumer.stop()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        done = threading.Event()
+        if options["stats_interval"] > 0:
+            def report():
+                while not done.wait(options["stats_interval"]):
+                    self.stdout.write(json.dumps(consumer.stats()))
+
+            threading.Thread(target=report, name="mqtt-stats", daemon=True).start()
+
+        try:
+            consumer.run()
+        finally:
+            done.set()
+            self.stdout.write(json.dumps(consumer.stats()))
@@ -0,0 +1,66 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from environmentsurveillance.lastseen import StaleTracker, rebuild_last_seen, stale_after, stale_devices
+from environmentsurveillance.models import DeviceLastSeen
+
+
+# secondes relues à chaque tick avant le watermark (transactions commitées en retard)
+WATCH_OVERLAP = 30
+
+
+class Command(BaseCommand):
+    help = (
+        "Liste les devices actifs sans point depuis plus de --after secondes (table DeviceLastSeen). "
+        "--watch: surveillance continue, affiche les passages hors ligne / de retour. "
+        "--rebuild: remplit DeviceLastSeen depuis les points existants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--after", type=int, default=None, help="Secondes (défaut DEVICE_STALE_AFTER)")
+        parser.add_argument("--include-never", action="store_true", help="Inclut les devices jamais vus")
+        parser.add_argument("--watch", action="store_true")
+        parser.add_argument("--interval", type=float, default=10, help="Secondes entre deux vérifications (--watch)")
+        parser.add_argument("--rebuild", action="store_true")
+
+    def handle(self, *args, **options):
+        after = options["after"] or stale_after()
+
+        if options["rebuild"]:
+            count = rebuild_last_seen()
+            self.stdout.write(f"{count} device(s) mis à jour")
+            return
+
+        if options["watch"]:
+            self.watch(after, options["interval"])
+            return
+
+        devices = stale_devices(after=after, include_never_seen=options["include_never"])
+        for d in devices:
+            silent = f"{d['silent_for']} s" if d["silent_for"] is not None else "jamais vu"
+            self.stdout.write(f"{d['device_eui']}  {d['name'] or ''}  {silent}")
+        self.stdout.write(f"{len(devices)} device(s) muet(s) depuis plus de {after} s")
+
+    def watch(self, after, interval):
+        tracker = StaleTracker(after)
+        watermark = None
+        while True:
+            # lignes modifiées depuis le dernier tick (horloge serveur, index updated_at).
+            # Recouvrement de WATCH_OVERLAP s: une transaction d'ingest commitée après
+            # le tick précédent peut porter un updated_at antérieur au watermark.
+            rows = DeviceLastSeen.objects.filter(device__is_active=True)
+            if watermark is not None:
+                rows = rows.filter(updated_at__gt=watermark - timedelta(seconds=WATCH_OVERLAP))
+            for eui, last_seen, updated_at in rows.values_list(
+                "device__device_eui", "last_seen", "updated_at",
+            ).iterator():
+                watermark = updated_at if watermark is None else max(watermark, updated_at)
+                if tracker.update(eui, last_seen.timestamp()):
+                    self.stdout.write(f"{timezone.now():%H:%M:%S} {eui} de retour")
+
+            for eui, last_seen in tracker.expired(time.time()):
+                self.stdout.write(f"{timezone.now():%H:%M:%S} {eui} hors ligne (dernier point {int(time.time() - last_seen)} s)")
+            time.sleep(interval)
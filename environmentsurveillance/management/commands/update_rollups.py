@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from environmentsurveillance.rollups import prune_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Met à jour les agrégats TelemetryRollup (1 min / 1 h / 1 jour) à partir des points "
+        "insérés depuis le dernier passage. À lancer en cron chaque minute, ou avec --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Tourne en continu")
+        parser.add_argument("--interval", type=float, default=60, help="Secondes entre deux passages avec --loop")
+        parser.add_argument("--prune", action="store_true", help="Applique ROLLUP_RETENTION_DAYS")
+
+    def handle(self, *args, **options):
+        while True:
+            windows, written = update_rollups()
+            if windows:
+                self.stdout.write(f"{windows} fenêtre(s), {written} bucket(s) mis à jour")
+            if options["prune"]:
+                deleted = prune_rollups()
+                if deleted:
+                    self.stdout.write(f"{deleted} bucket(s) expirés supprimés")
+
+            if not options["loop"]:
+                break
+            close_old_connections()
+            time.sleep(options["interval"])
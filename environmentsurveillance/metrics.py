@@ -0,0 +1,244 @@
+"""
+Instrumentation des vues: latence, requêtes SQL, temps DB, tailles, par nom d'URL.
+
+- MetricsMiddleware (en tête de MIDDLEWARE, sync et async): mesure chaque
+  requête et la range sous le nom de sa route (iot_uplink, telemetry_history...).
+- db_execute_wrapper, posé sur chaque connexion (signal connection_created):
+  compte les requêtes SQL et leur durée pour la requête HTTP en cours
+  (ContextVar, suit aussi les appels sync_to_async des vues async).
+- compteurs par thread: chaque thread écrit dans son propre shard, sans
+  verrou; l'export additionne les shards. Les shards des threads terminés
+  sont gardés (les compteurs Prometheus ne redescendent pas).
+- render_metrics(): format texte Prometheus, servi par /metrics.
+
+METRICS_ENABLED = False retire le middleware (MiddlewareNotUsed).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# [nombre de requêtes SQL, secondes] de la requête HTTP en cours
+_current = ContextVar("metrics_request", default=None)
+
+
+# --------------------------
+# Compteurs par thread
+# --------------------------
+class ViewStats:
+    """
+    Une vue dans un shard. Histogrammes: compte par seau (non cumulé), le
+    dernier seau étant +Inf.
+    """
+    __slots__ = (
+        "statuses", "duration", "duration_buckets", "db_time", "db_time_buckets",
+        "queries", "query_buckets", "request_bytes", "request_bytes_buckets", "response_bytes",
+    )
+
+    def __init__(self):
+        self.statuses = {}  # (méthode, code) -> nombre
+        self.duration = 0.0
+        self.duration_buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.db_time = 0.0
+        self.db_time_buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.queries = 0
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.request_bytes = 0
+        self.request_bytes_buckets = [0] * (len(SIZE_BUCKETS) + 1)
+        self.response_bytes = 0
+
+
+_local = threading.local()
+_shards = []  # un dict {vue: ViewStats} par thread
+_shards_lock = threading.Lock()
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append(shard)
+        return shard
+
+
+def record(view, method, status, duration, queries, db_time, request_bytes, response_bytes):
+    shard = _shard()
+    stats = shard.get(view)
+    if stats is None:
+        stats = shard[view] = ViewStats()
+    key = (method, status)
+    stats.statuses[key] = stats.statuses.get(key, 0) + 1
+    stats.duration += duration
+    stats.duration_buckets[bisect_left(DURATION_BUCKETS, duration)] += 1
+    stats.db_time += db_time
+    stats.db_time_buckets[bisect_left(DURATION_BUCKETS, db_time)] += 1
+    stats.queries += queries
+    stats.query_buckets[bisect_left(QUERY_BUCKETS, queries)] += 1
+    stats.request_bytes += request_bytes
+    stats.request_bytes_buckets[bisect_left(SIZE_BUCKETS, request_bytes)] += 1
+    stats.response_bytes += response_bytes
+
+
+def reset_metrics():
+    """
+    Remet tous les compteurs à zéro (tests).
+    """
+    with _shards_lock:
+        for shard in _shards:
+            shard.clear()
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        # hors requête HTTP (threads d'écriture, commandes)
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current[0] += 1
+        current[1] += time.perf_counter() - started
+
+
+def install_db_wrapper(connection):
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+# --------------------------
+# Middleware
+# --------------------------
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        db = [0, 0.0]
+        token = _current.set(db)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, time.perf_counter() - started, db)
+        return response
+
+    async def __acall__(self, request):
+        db = [0, 0.0]
+        token = _current.set(db)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, time.perf_counter() - started, db)
+        return response
+
+    @staticmethod
+    def _record(request, response, duration, db):
+        match = request.resolver_match
+        if match is None:
+            view = "unmatched"
+        else:
+            view = match.url_name or match.route
+        try:
+            request_bytes = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            request_bytes = 0
+        # réponse en flux (SSE, exports): durée jusqu'aux en-têtes, taille inconnue
+        response_bytes = 0 if response.streaming else len(response.content)
+        record(view, request.method, response.status_code, duration, db[0], db[1], request_bytes, response_bytes)
+
+
+# --------------------------
+# Export Prometheus
+# --------------------------
+def _snapshot():
+    """
+    -> {vue: ViewStats} additionné sur tous les shards
+    """
+    with _shards_lock:
+        shards = list(_shards)
+    total = {}
+    for shard in shards:
+        # copie atomique sous le GIL: le thread propriétaire peut ajouter une vue pendant l'export
+        for view, stats in list(shard.items()):
+            t = total.get(view)
+            if t is None:
+                t = total[view] = ViewStats()
+            for key, count in list(stats.statuses.items()):
+                t.statuses[key] = t.statuses.get(key, 0) + count
+            for name in ("duration", "db_time", "queries", "request_bytes", "response_bytes"):
+                setattr(t, name, getattr(t, name) + getattr(stats, name))
+            for name in ("duration_buckets", "db_time_buckets", "query_buckets", "request_bytes_buckets"):
+                setattr(t, name, [a + b for a, b in zip(getattr(t, name), getattr(stats, name))])
+    return total
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines, name, view, bounds, buckets, total):
+    cumulative = 0
+    for bound, count in zip((*bounds, "+Inf"), buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_sum{{view="{view}"}} {total}')
+    lines.append(f'{name}_count{{view="{view}"}} {cumulative}')
+
+
+def render_metrics():
+    snapshot = sorted(_snapshot().items())
+    lines = [
+        "# HELP es_http_requests_total HTTP requests by view, method and status.",
+        "# TYPE es_http_requests_total counter",
+    ]
+    for view, stats in snapshot:
+        view = _label(view)
+        for (method, status), count in sorted(stats.statuses.items()):
+            lines.append(f'es_http_requests_total{{view="{view}",method="{_label(method)}",status="{status}"}} {count}')
+
+    histograms = (
+        ("es_http_request_duration_seconds", "Time spent in the view (up to response headers).",
+         DURATION_BUCKETS, "duration_buckets", "duration"),
+        ("es_http_db_duration_seconds", "Time spent in SQL queries per request.",
+         DURATION_BUCKETS, "db_time_buckets", "db_time"),
+        ("es_http_db_queries", "SQL queries per request.",
+         QUERY_BUCKETS, "query_buckets", "queries"),
+        ("es_http_request_size_bytes", "Request body size (Content-Length).",
+         SIZE_BUCKETS, "request_bytes_buckets", "request_bytes"),
+    )
+    for name, help_text, bounds, buckets, total in histograms:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for view, stats in snapshot:
+            _histogram(lines, name, _label(view), bounds, getattr(stats, buckets), getattr(stats, total))
+
+    lines += [
+        "# HELP es_http_response_size_bytes_total Response body bytes (streaming responses excluded).",
+        "# TYPE es_http_response_size_bytes_total counter",
+    ]
+    for view, stats in snapshot:
+        lines.append(f'es_http_response_size_bytes_total{{view="{_label(view)}"}} {stats.response_bytes}')
+    return "\n".join(lines) + "\n"
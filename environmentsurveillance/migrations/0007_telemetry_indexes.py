@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:12
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY: pas de verrou d'écriture sur les tables pendant la construction
+    atomic = False
+
+    dependencies = [
+        ('environmentsurveillance', '0006_telemetrypoint_snr_alter_telemetrypoint_device_and_more'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='telemetrypoint',
+            index=models.Index(fields=['device', '-ts', '-id'], name='telemetry_device_ts_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='telemetrypoint',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['ts'], name='telemetry_ts_brin'),
+        ),
+        AddIndexConcurrently(
+            model_name='ttnuplink',
+            index=models.Index(fields=['-received_at', '-id'], name='ttnuplink_received_idx'),
+        ),
+        migrations.AlterField(
+            model_name='telemetrypoint',
+            name='device',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='telemetry', to='environmentsurveillance.device'),
+        ),
+    ]
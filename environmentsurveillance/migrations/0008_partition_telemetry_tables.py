@@ -0,0 +1,108 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:05
+
+from datetime import timezone
+
+from django.db import migrations
+
+
+TABLES = (
+    ("environmentsurveillance_telemetrypoint", "ts"),
+    ("environmentsurveillance_ttnuplink", "received_at"),
+)
+
+MONTHS_AHEAD = 3
+
+
+def _month_start(dt):
+    return dt.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(dt, n):
+    month = dt.month - 1 + n
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def _partition_table(cursor, table, column, now):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [table])
+    if cursor.fetchone()[0] == "p":
+        return
+
+    # index et clés étrangères existants, recréés à l'identique sur la table partitionnée
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [table, f"{table}_pkey"],
+    )
+    indexes = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+
+    new = f"{table}_new"
+    cursor.execute(
+        f'CREATE TABLE "{new}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+        f'PARTITION BY RANGE ("{column}")'
+    )
+    # la clé primaire d'une table partitionnée doit contenir la clé de partition
+    cursor.execute(f'ALTER TABLE "{new}" ADD CONSTRAINT "{new}_pkey" PRIMARY KEY ("id", "{column}")')
+
+    # une partition par mois, des données existantes jusqu'à MONTHS_AHEAD mois dans le futur
+    cursor.execute(f'SELECT MIN("{column}"), MAX("{column}") FROM "{table}"')
+    first, last = cursor.fetchone()
+    start = _month_start(min(first or now, now))
+    stop = _add_months(_month_start(max(last or now, now)), MONTHS_AHEAD)
+    while start <= stop:
+        end = _add_months(start, 1)
+        cursor.execute(
+            f'CREATE TABLE "{table}_p{start:%Y%m}" PARTITION OF "{new}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        start = end
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{new}" DEFAULT')
+
+    cursor.execute(f'INSERT INTO "{new}" SELECT * FROM "{table}"')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM \"{new}\"), 0) + 1, false)",
+        [new],
+    )
+
+    cursor.execute(f'DROP TABLE "{table}"')
+    cursor.execute(f'ALTER TABLE "{new}" RENAME TO "{table}"')
+    cursor.execute(f'ALTER TABLE "{table}" RENAME CONSTRAINT "{new}_pkey" TO "{table}_pkey"')
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    cursor.execute(f'ALTER SEQUENCE {cursor.fetchone()[0]} RENAME TO "{table}_id_seq"')
+
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        cursor.execute(definition)
+
+
+def partition_tables(apps, schema_editor):
+    """
+    Convertit TelemetryPoint et TTNUplink en tables partitionnées par mois.
+    PostgreSQL uniquement (no-op ailleurs, ex. SQLite pour les benchmarks).
+    La copie se fait sous verrou exclusif: à lancer pendant une fenêtre de maintenance.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    from django.utils import timezone as dj_timezone
+
+    now = dj_timezone.now()
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in TABLES:
+            _partition_table(cursor, table, column, now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0007_telemetry_indexes'),
+    ]
+
+    operations = [
+        # pas de retour arrière automatique: les données restent dans les partitions
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
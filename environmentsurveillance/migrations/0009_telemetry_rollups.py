@@ -0,0 +1,65 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0008_partition_telemetry_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('position', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TelemetryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 heure'), ('1d', '1 jour')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('temp_count', models.IntegerField(default=0)),
+                ('temp_sum', models.FloatField(blank=True, null=True)),
+                ('temp_min', models.FloatField(blank=True, null=True)),
+                ('temp_max', models.FloatField(blank=True, null=True)),
+                ('battery_count', models.IntegerField(default=0)),
+                ('battery_sum', models.FloatField(blank=True, null=True)),
+                ('battery_min', models.FloatField(blank=True, null=True)),
+                ('battery_max', models.FloatField(blank=True, null=True)),
+                ('rssi_count', models.IntegerField(default=0)),
+                ('rssi_sum', models.FloatField(blank=True, null=True)),
+                ('rssi_min', models.FloatField(blank=True, null=True)),
+                ('rssi_max', models.FloatField(blank=True, null=True)),
+                ('snr_count', models.IntegerField(default=0)),
+                ('snr_sum', models.FloatField(blank=True, null=True)),
+                ('snr_min', models.FloatField(blank=True, null=True)),
+                ('snr_max', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='telemetrypoint',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['created_at'], name='telemetry_created_brin'),
+        ),
+        migrations.AddField(
+            model_name='telemetryrollup',
+            name='device',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='environmentsurveillance.device'),
+        ),
+        migrations.AddIndex(
+            model_name='telemetryrollup',
+            index=models.Index(fields=['granularity', 'bucket'], name='telemetry_rollup_gran_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='telemetryrollup',
+            constraint=models.UniqueConstraint(fields=('device', 'granularity', 'bucket'), name='telemetry_rollup_unique'),
+        ),
+    ]
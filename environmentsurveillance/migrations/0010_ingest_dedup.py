@@ -0,0 +1,63 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def delete_duplicate_points(apps, schema_editor):
+    """
+    Garde le plus ancien (plus petit id) de chaque (device, ts) avant la contrainte unique.
+    """
+    table = apps.get_model("environmentsurveillance", "TelemetryPoint")._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        if schema_editor.connection.vendor == "postgresql":
+            cursor.execute(
+                f'DELETE FROM "{table}" a USING "{table}" b '
+                f'WHERE a.device_id = b.device_id AND a.ts = b.ts AND a.id > b.id'
+            )
+        else:
+            cursor.execute(
+                f'DELETE FROM "{table}" WHERE id NOT IN '
+                f'(SELECT MIN(id) FROM "{table}" GROUP BY device_id, ts)'
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0009_telemetry_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UplinkDedupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('f_cnt', models.BigIntegerField()),
+                ('seen_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='f_cnt',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(delete_duplicate_points, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='telemetrypoint',
+            constraint=models.UniqueConstraint(fields=('device', 'ts'), name='telemetry_device_ts_unique'),
+        ),
+        migrations.AddField(
+            model_name='uplinkdedupkey',
+            name='device',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='environmentsurveillance.device'),
+        ),
+        migrations.AddIndex(
+            model_name='uplinkdedupkey',
+            index=models.Index(fields=['seen_at'], name='uplink_dedup_seen_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='uplinkdedupkey',
+            constraint=models.UniqueConstraint(fields=('device', 'f_cnt'), name='uplink_dedup_unique'),
+        ),
+    ]
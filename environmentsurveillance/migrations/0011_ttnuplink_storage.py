@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0010_ingest_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='airtime',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='frm_payload_size',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='gateway_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='raw_payload_compressed',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ttnuplink',
+            name='spreading_factor',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='ttnuplink',
+            name='raw_payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0011_ttnuplink_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Geofence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('polygon', models.JSONField(blank=True, null=True)),
+                ('center_lat', models.FloatField(blank=True, null=True)),
+                ('center_lng', models.FloatField(blank=True, null=True)),
+                ('radius', models.FloatField(blank=True, null=True, verbose_name='Rayon (m)')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='telemetrypoint',
+            name='geohash',
+            field=models.CharField(blank=True, max_length=12, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='telemetrypoint',
+            index=models.Index(fields=['geohash'], name='telemetry_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0012_telemetry_geohash_geofence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('metric', models.CharField(choices=[('temp', 'Température'), ('battery', 'Batterie'), ('rssi', 'RSSI'), ('snr', 'SNR'), ('silence', 'Silence (s)')], max_length=16)),
+                ('stat', models.CharField(choices=[('value', 'Dernière valeur'), ('ewma', 'Moyenne mobile exponentielle'), ('min', 'Minimum sur la fenêtre'), ('max', 'Maximum sur la fenêtre')], default='value', max_length=8)),
+                ('operator', models.CharField(choices=[('gt', '>'), ('lt', '<')], max_length=2)),
+                ('threshold', models.FloatField()),
+                ('clear_threshold', models.FloatField(blank=True, null=True)),
+                ('debounce', models.PositiveSmallIntegerField(default=1)),
+                ('window', models.PositiveIntegerField(default=300, verbose_name='Fenêtre min/max (s)')),
+                ('ewma_alpha', models.FloatField(default=0.3)),
+                ('severity', models.CharField(choices=[('info', 'Info'), ('warning', 'Avertissement'), ('critical', 'Critique')], default='warning', max_length=8)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('device', models.ForeignKey(blank=True, help_text='Vide: tous les devices', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='environmentsurveillance.device')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('firing', 'Déclenchée'), ('resolved', 'Résolue')], max_length=8)),
+                ('value', models.FloatField(blank=True, null=True)),
+                ('threshold', models.FloatField()),
+                ('ts', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('device', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='alert_events', to='environmentsurveillance.device')),
+                ('rule', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='environmentsurveillance.alertrule')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-ts', '-id'], name='alert_event_ts_idx'), models.Index(fields=['device', '-ts', '-id'], name='alert_event_device_ts_idx'), models.Index(fields=['rule', 'device', '-ts', '-id'], name='alert_event_rule_device_idx')],
+            },
+        ),
+    ]
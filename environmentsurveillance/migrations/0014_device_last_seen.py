@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0013_alerting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceLastSeen',
+            fields=[
+                ('device', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_seen', serialize=False, to='environmentsurveillance.device')),
+                ('last_seen', models.DateTimeField()),
+                ('last_rssi', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_seen'], name='device_last_seen_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0014_device_last_seen'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='devicelastseen',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='devicelastseen',
+            index=models.Index(fields=['updated_at'], name='device_last_seen_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:10
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def fill_last_seen(apps, schema_editor):
+    """
+    Remplit DeviceLastSeen depuis le dernier point de chaque device (même
+    logique que lastseen.rebuild_last_seen): sans cela, latest_all_queryset
+    ne voit aucun device tant qu'il n'a pas envoyé de nouveau point.
+    """
+    Device = apps.get_model("environmentsurveillance", "Device")
+    DeviceLastSeen = apps.get_model("environmentsurveillance", "DeviceLastSeen")
+    TelemetryPoint = apps.get_model("environmentsurveillance", "TelemetryPoint")
+
+    newest = TelemetryPoint.objects.filter(device_id=OuterRef("pk")).order_by("-ts", "-id")
+    rows = (
+        Device.objects
+        .annotate(last_ts=Subquery(newest.values("ts")[:1]), last_rssi=Subquery(newest.values("rssi")[:1]))
+        .filter(last_ts__isnull=False)
+        .values_list("pk", "last_ts", "last_rssi")
+    )
+    batch = []
+    for device_id, last_ts, last_rssi in rows.iterator(chunk_size=1000):
+        batch.append(DeviceLastSeen(device_id=device_id, last_seen=last_ts, last_rssi=last_rssi))
+        if len(batch) >= 1000:
+            # ignore_conflicts: une ligne écrite par l'ingest est au moins aussi récente
+            DeviceLastSeen.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        DeviceLastSeen.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('environmentsurveillance', '0015_device_last_seen_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_last_seen, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,10 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
 from django.utils import timezone
 
+from .geo import Circle, Polygon
+from .uplink_storage import decompress_payload
+
 
 class Device(models.Model):
     """
@@ -23,8 +27,9 @@ class TTNUplink(models.Model):
     device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name='ttn_uplinks')
     application_id = models.CharField(max_length=128)
 
-    # Full webhook payload
-    raw_payload = models.JSONField()
+    # Full webhook payload: jsonb, ou compressé selon TTN_RAW_PAYLOAD_STORAGE (voir raw())
+    raw_payload = models.JSONField(null=True, blank=True)
+    raw_payload_compressed = models.BinaryField(null=True, blank=True)
 
     # Only the useful extracted data
     decoded_payload = models.JSONField(null=True, blank=True)
@@ -33,15 +38,36 @@ class TTNUplink(models.Model):
     rssi = models.FloatField(null=True, blank=True)
     snr = models.FloatField(null=True, blank=True)
     f_port = models.IntegerField(null=True, blank=True)
+    # compteur de trames LoRaWAN (uplink_message.f_cnt), clé de déduplication avec device
+    f_cnt = models.BigIntegerField(null=True, blank=True)
+    gateway_id = models.CharField(max_length=64, null=True, blank=True)
+    spreading_factor = models.SmallIntegerField(null=True, blank=True)
+    airtime = models.FloatField(null=True, blank=True)  # secondes
+    frm_payload_size = models.IntegerField(null=True, blank=True)  # octets
 
     received_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # list_ttn_uplinks: ORDER BY received_at DESC, id DESC LIMIT n
+            models.Index(fields=["-received_at", "-id"], name="ttnuplink_received_idx"),
+        ]
+
     def __str__(self):
         return f"{self.device.device_eui} @ {self.received_at}"
 
+    def raw(self):
+        """
+        Webhook TTN complet, quel que soit le mode de stockage de la ligne.
+        """
+        if self.raw_payload_compressed is not None:
+            return decompress_payload(self.raw_payload_compressed)
+        return self.raw_payload
+
 
 class TelemetryPoint(models.Model):
-    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="telemetry")
+    # pas d'index simple sur device: telemetry_device_ts_idx le couvre (1re colonne)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="telemetry", db_index=False)
     ts = models.DateTimeField(default=timezone.now)
 
     lat = models.FloatField()
@@ -52,10 +78,230 @@ class TelemetryPoint(models.Model):
     rssi = models.FloatField(null=True, blank=True)
     snr = models.FloatField(null=True, blank=True)
 
+    # cellule geohash de (lat, lng), renseignée à l'ingest (voir geo.py)
+    geohash = models.CharField(max_length=12, null=True, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["ts"]
+        constraints = [
+            # idempotence de l'ingest (rejeux): contient la clé de partition ts
+            models.UniqueConstraint(fields=["device", "ts"], name="telemetry_device_ts_unique"),
+        ]
+        indexes = [
+            # history / latest: WHERE device = x [AND ts range] ORDER BY ts DESC, id DESC
+            models.Index(fields=["device", "-ts", "-id"], name="telemetry_device_ts_idx"),
+            # scans par plage de temps sur une table en ajout seul (export, agrégats, rétention)
+            BrinIndex(fields=["ts"], name="telemetry_ts_brin"),
+            # delta des agrégats (update_rollups): WHERE created_at > watermark
+            BrinIndex(fields=["created_at"], name="telemetry_created_brin"),
+            # requêtes par zone: geohash LIKE 'cellule%' (préfixes)
+            models.Index(fields=["geohash"], name="telemetry_geohash_idx", opclasses=["varchar_pattern_ops"]),
+        ]
 
     def __str__(self):
         return f"{self.device.device_eui} @ {self.ts}"
+
+
+class Geofence(models.Model):
+    """
+    Zone surveillée: polygone [[lng, lat], ...] ou cercle (centre + rayon en mètres).
+    Évaluée pour chaque point ingéré (voir geofences.py).
+    """
+    name = models.CharField(max_length=100)
+    polygon = models.JSONField(null=True, blank=True)
+    center_lat = models.FloatField(null=True, blank=True)
+    center_lng = models.FloatField(null=True, blank=True)
+    radius = models.FloatField(null=True, blank=True, verbose_name="Rayon (m)")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def shape(self):
+        if self.polygon:
+            return Polygon(self.polygon)
+        return Circle(self.center_lat, self.center_lng, self.radius)
+
+    def __str__(self):
+        return self.name
+
+
+class DeviceLastSeen(models.Model):
+    """
+    Dernier passage de chaque device, mis à jour par l'ingest (upsert, voir lastseen.py).
+    Table étroite: la détection des devices muets ne touche jamais TelemetryPoint.
+    """
+    device = models.OneToOneField(Device, on_delete=models.CASCADE, primary_key=True, related_name="last_seen")
+    last_seen = models.DateTimeField()
+    last_rssi = models.FloatField(null=True, blank=True)
+    # horloge serveur de la dernière mise à jour (last_seen vient du client et peut être dans le futur)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # devices muets: WHERE last_seen < now - délai
+            models.Index(fields=["last_seen"], name="device_last_seen_idx"),
+            # stale_devices --watch: WHERE updated_at > watermark
+            models.Index(fields=["updated_at"], name="device_last_seen_updated_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} @ {self.last_seen}"
+
+
+class UplinkDedupKey(models.Model):
+    """
+    Clés (device, f_cnt) des uplinks TTN récemment écrits (voir dedup.py).
+    Table séparée: TTNUplink est partitionnée par received_at, une contrainte
+    unique dessus devrait contenir received_at et ne dédupliquerait rien.
+    """
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="+", db_index=False)
+    f_cnt = models.BigIntegerField()
+    seen_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["device", "f_cnt"], name="uplink_dedup_unique"),
+        ]
+        indexes = [
+            # purge des clés expirées
+            models.Index(fields=["seen_at"], name="uplink_dedup_seen_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} f_cnt={self.f_cnt} @ {self.seen_at}"
+
+
+class TelemetryRollup(models.Model):
+    """
+    Agrégats par device et bucket de temps (1 min / 1 h / 1 jour).
+    On stocke count/sum/min/max (et pas la moyenne) pour pouvoir fusionner
+    des deltas, y compris des points arrivés en retard.
+    """
+    GRANULARITY_CHOICES = [
+        ("1m", "1 minute"),
+        ("1h", "1 heure"),
+        ("1d", "1 jour"),
+    ]
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="rollups", db_index=False)
+    granularity = models.CharField(max_length=2, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+
+    count = models.IntegerField(default=0)
+
+    temp_count = models.IntegerField(default=0)
+    temp_sum = models.FloatField(null=True, blank=True)
+    temp_min = models.FloatField(null=True, blank=True)
+    temp_max = models.FloatField(null=True, blank=True)
+
+    battery_count = models.IntegerField(default=0)
+    battery_sum = models.FloatField(null=True, blank=True)
+    battery_min = models.FloatField(null=True, blank=True)
+    battery_max = models.FloatField(null=True, blank=True)
+
+    rssi_count = models.IntegerField(default=0)
+    rssi_sum = models.FloatField(null=True, blank=True)
+    rssi_min = models.FloatField(null=True, blank=True)
+    rssi_max = models.FloatField(null=True, blank=True)
+
+    snr_count = models.IntegerField(default=0)
+    snr_sum = models.FloatField(null=True, blank=True)
+    snr_min = models.FloatField(null=True, blank=True)
+    snr_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # cible de l'upsert, sert aussi la lecture (device, granularité, plage de buckets)
+            models.UniqueConstraint(fields=["device", "granularity", "bucket"], name="telemetry_rollup_unique"),
+        ]
+        indexes = [
+            # purge de rétention par granularité
+            models.Index(fields=["granularity", "bucket"], name="telemetry_rollup_gran_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} {self.granularity} @ {self.bucket}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Position (TelemetryPoint.created_at) jusqu'à laquelle les agrégats sont à jour.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    position = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class AlertRule(models.Model):
+    """
+    Règle de seuil évaluée à l'ingest (voir alerts.py), sur une statistique
+    glissante d'une mesure: dernière valeur, EWMA, min / max sur `window` s,
+    ou silence (secondes depuis le dernier point).
+    """
+    METRIC_CHOICES = [
+        ("temp", "Température"),
+        ("battery", "Batterie"),
+        ("rssi", "RSSI"),
+        ("snr", "SNR"),
+        ("silence", "Silence (s)"),
+    ]
+    STAT_CHOICES = [
+        ("value", "Dernière valeur"),
+        ("ewma", "Moyenne mobile exponentielle"),
+        ("min", "Minimum sur la fenêtre"),
+        ("max", "Maximum sur la fenêtre"),
+    ]
+    OPERATOR_CHOICES = [("gt", ">"), ("lt", "<")]
+    SEVERITY_CHOICES = [("info", "Info"), ("warning", "Avertissement"), ("critical", "Critique")]
+
+    name = models.CharField(max_length=100)
+    device = models.ForeignKey(
+        Device, on_delete=models.CASCADE, null=True, blank=True, related_name="alert_rules",
+        help_text="Vide: tous les devices",
+    )
+    metric = models.CharField(max_length=16, choices=METRIC_CHOICES)
+    stat = models.CharField(max_length=8, choices=STAT_CHOICES, default="value")
+    operator = models.CharField(max_length=2, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField()
+    # hystérésis: une alerte active ne retombe qu'au franchissement de clear_threshold
+    clear_threshold = models.FloatField(null=True, blank=True)
+    # anti-rebond: nombre d'évaluations consécutives avant déclenchement / retour à la normale
+    debounce = models.PositiveSmallIntegerField(default=1)
+    window = models.PositiveIntegerField(default=300, verbose_name="Fenêtre min/max (s)")
+    ewma_alpha = models.FloatField(default=0.3)
+    severity = models.CharField(max_length=8, choices=SEVERITY_CHOICES, default="warning")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class AlertEvent(models.Model):
+    """
+    Transition d'une alerte (règle, device): déclenchée ou résolue.
+    """
+    STATE_CHOICES = [("firing", "Déclenchée"), ("resolved", "Résolue")]
+
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name="events", db_index=False)
+    device = models.ForeignKey(Device, on_delete=models.CASCADE, related_name="alert_events", db_index=False)
+    state = models.CharField(max_length=8, choices=STATE_CHOICES)
+    value = models.FloatField(null=True, blank=True)
+    threshold = models.FloatField()
+    ts = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # liste des événements (plus récents d'abord), filtre par device
+            models.Index(fields=["-ts", "-id"], name="alert_event_ts_idx"),
+            models.Index(fields=["device", "-ts", "-id"], name="alert_event_device_ts_idx"),
+            # alertes actives: dernier événement par (règle, device)
+            models.Index(fields=["rule", "device", "-ts", "-id"], name="alert_event_rule_device_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.rule_id} {self.device_id} {self.state} @ {self.ts}"
@@ -0,0 +1,219 @@
+"""
+Consommateur MQTT de télémétrie (commande `run_mqtt_consumer`).
+
+Les drones publient sur MQTT_TOPIC un JSON identique au corps de
+telemetry_ingest; chaque message est validé par ingest.parse_telemetry puis
+écrit par lots (BatchWriter + save_points => bulk_create).
+
+Le client MQTT est injectable (client_factory): paho-mqtt en production,
+un faux broker en mémoire dans les tests.
+"""
+import json
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .ingest import BatchWriter, parse_telemetry, save_points
+
+
+logger = logging.getLogger(__name__)
+
+
+def paho_client_factory(client_id):
+    """
+    Client paho-mqtt (1.x ou 2.x, callbacks au format 2.x si disponible).
+    """
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise RuntimeError("paho-mqtt is required for the MQTT consumer (pip install paho-mqtt)")
+
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+def _is_failure(reason_code):
+    # paho 2.x: ReasonCode, paho 1.x: int (0 = succès)
+    return getattr(reason_code, "is_failure", reason_code != 0)
+
+
+class TelemetryConsumer:
+    """
+    - reconnexion avec backoff exponentiel (+ jitter) entre backoff_min et backoff_max
+    - file pleine: le message est écarté et compté dans `dropped`. on_message tourne
+      dans le thread réseau de paho: attendre une place y bloquerait aussi les
+      PINGREQ/PINGRESP et le broker couperait la connexion (keepalive)
+    - stats(): compteurs, débits depuis l'appel précédent, retard (lag)
+    - QoS 0 uniquement: paho acquitte (PUBACK/PUBREC) un message QoS 1/2 avant
+      on_message, un message écarté ensuite serait perdu sans que le broker le
+      sache. Refuser QoS > 0 évite de promettre une livraison qu'on ne tient pas
+    """
+
+    def __init__(
+        self,
+        client_factory=None,
+        host=None,
+        port=None,
+        topic=None,
+        qos=None,
+        client_id=None,
+        username=None,
+        password=None,
+        keepalive=60,
+        batch_size=None,
+        flush_interval=None,
+        maxsize=None,
+        backoff_min=1.0,
+        backoff_max=60.0,
+    ):
+        self.client_factory = client_factory or paho_client_factory
+        self.host = host or getattr(settings, "MQTT_HOST", "localhost")
+        self.port = port or getattr(settings, "MQTT_PORT", 1883)
+        self.topic = topic or getattr(settings, "MQTT_TOPIC", "drone/telemetry")
+        self.qos = getattr(settings, "MQTT_QOS", 0) if qos is None else qos
+        if self.qos != 0:
+            raise ValueError(f"MQTT QoS {self.qos} not supported: messages may be dropped after the broker ack, use QoS 0")
+        self.client_id = client_id or getattr(settings, "MQTT_CLIENT_ID", "django-telemetry-consumer")
+        self.username = username or getattr(settings, "MQTT_USERNAME", None)
+        self.password = password or getattr(settings, "MQTT_PASSWORD", None)
+        self.keepalive = keepalive
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self.writer = BatchWriter(
+            self._write,
+            name="mqtt-telemetry-writer",
+            maxsize=maxsize or getattr(settings, "INGEST_QUEUE_MAXSIZE", 10000),
+            batch_size=batch_size or getattr(settings, "INGEST_BATCH_SIZE", 500),
+            flush_interval=flush_interval or getattr(settings, "INGEST_FLUSH_INTERVAL", 0.5),
+        )
+
+        self._stopping = threading.Event()
+        self.connected = False
+
+        self.received = 0
+        self.invalid = 0
+        self.dropped = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.lag = None        # s entre le ts du point et son écriture (dernier lot, max)
+        self.queue_lag = None  # s entre réception et écriture (dernier lot, max)
+
+        self._last_stats = (time.monotonic(), 0, 0)
+
+    # ---- callbacks MQTT ----
+    def on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if _is_failure(reason_code):
+            logger.warning("MQTT connection refused: %s", reason_code)
+            return
+        # (ré)abonnement à chaque connexion: la session peut être perdue
+        client.subscribe(self.topic, self.qos)
+        self.connected = True
+        self.connects += 1
+        logger.info("MQTT connected to %s:%s, subscribed to %s", self.host, self.port, self.topic)
+
+    def on_disconnect(self, client, userdata, *args):
+        self.connected = False
+
+    def on_message(self, client, userdata, message):
+        self.received += 1
+        try:
+            data = json.loads(message.payload)
+        except (ValueError, UnicodeDecodeError):
+            self.invalid += 1
+            return
+
+        record, error = parse_telemetry(data)
+        if error:
+            self.invalid += 1
+            return
+
+        if not self.writer.offer((record, time.monotonic())):
+            self.dropped += 1
+
+    # ---- écriture ----
+    def _write(self, batch):
+        save_points([record for record, _ in batch])
+        now = timezone.now()
+        mono = time.monotonic()
+        self.lag = max((now - record["point"]["ts"]).total_seconds() for record, _ in batch)
+        self.queue_lag = max(mono - received_at for _, received_at in batch)
+
+    # ---- boucle ----
+    def _backoff(self, delay):
+        self.reconnects += 1
+        self._stopping.wait(random.uniform(delay / 2, delay))
+        return min(delay * 2, self.backoff_max)
+
+    def run(self):
+        """
+        Bloque jusqu'à stop(). Les messages en file sont écrits avant de rendre la main.
+        """
+        self._stopping.clear()
+        self.writer.start()
+
+        client = self.client_factory(self.client_id)
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+        client.on_message = self.on_message
+        if self.username:
+            client.username_pw_set(self.username, self.password)
+
+        delay = self.backoff_min
+        try:
+            while not self._stopping.is_set():
+                try:
+                    client.connect(self.host, self.port, self.keepalive)
+                except OSError as exc:
+                    logger.warning("MQTT connect to %s:%s failed: %s", self.host, self.port, exc)
+                    delay = self._backoff(delay)
+                    continue
+
+                while not self._stopping.is_set():
+                    rc = client.loop(timeout=1.0)
+                    if rc != 0:
+                        break
+                    if self.connected:
+                        delay = self.backoff_min
+
+                if not self._stopping.is_set():
+                    logger.warning("MQTT connection lost (rc=%s), reconnecting", rc)
+                    self.connected = False
+                    delay = self._backoff(delay)
+        finally:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+            self.connected = False
+            self.writer.stop()
+
+    def stop(self):
+        self._stopping.set()
+
+    def stats(self):
+        writer = self.writer.stats()
+        now = time.monotonic()
+        last_at, last_received, last_written = self._last_stats
+        elapsed = max(now - last_at, 1e-9)
+        self._last_stats = (now, self.received, writer["written"])
+        return {
+            "connected": self.connected,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "received": self.received,
+            "invalid": self.invalid,
+            "dropped": self.dropped,
+            "written": writer["written"],
+            "failed": writer["failed"],
+            "queued": writer["queued"],
+            "received_per_s": round((self.received - last_received) / elapsed, 1),
+            "written_per_s": round((writer["written"] - last_written) / elapsed, 1),
+            "lag_seconds": self.lag,
+            "queue_lag_seconds": self.queue_lag,
+        }
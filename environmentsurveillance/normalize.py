@@ -0,0 +1,239 @@
+"""
+Normalisation des payloads (ingest direct, MQTT, TTN decoded_payload).
+
+Les tables d'alias sont compilées une fois en fonctions d'extraction
+spécialisées (une suite de dict.get, sans boucle sur les alias), et un lot
+de payloads est normalisé en une passe vers une structure en colonnes
+(PointColumns: listes device_eui, ts, lat, lng, temp, battery, rssi, snr)
+que l'écriture par lots (ingest.save_point_columns) consomme directement.
+
+Règle commune: un alias est retenu dès que sa valeur n'est pas None
+(0 est une valeur valide, y compris pour lat/lng et battery).
+"""
+import math
+import re
+from datetime import datetime
+
+from django.utils import timezone
+
+
+POINT_FIELDS = ("lat", "lng", "temp", "battery", "rssi", "snr")
+
+# champ -> alias, dans l'ordre de priorité; "a.b" = clé b du sous-objet a
+TELEMETRY_ALIASES = {
+    "lat": ("lat",),
+    "lng": ("lng",),
+    "temp": ("temp",),
+    "battery": ("battery", "battery_level"),
+    "rssi": ("rssi",),
+    "snr": ("snr",),
+}
+
+# decoded_payload TTN (formatters variés)
+DECODED_ALIASES = {
+    "lat": ("lat", "latitude", "gps.lat", "gps.latitude"),
+    "lng": ("lng", "longitude", "gps.lng", "gps.lon", "gps.longitude"),
+    "temp": ("temp",),
+    "battery": ("battery", "battery_level"),
+}
+
+
+# --------------------------
+# Nombres
+# --------------------------
+_NUMBER_RE = re.compile(r"[-+]?\d+(\.\d+)?")
+
+
+def to_float(v):
+    """
+    Valeur JSON -> float ou None. "21.5 C" -> 21.5 (1er nombre de la chaîne).
+    """
+    cls = v.__class__
+    if cls is float:
+        return v if math.isfinite(v) else None
+    if cls is int or cls is bool:
+        return float(v)
+    if cls is str:
+        try:
+            f = float(v)
+            if math.isfinite(f):
+                return f
+        except ValueError:
+            pass
+        m = _NUMBER_RE.search(v)
+        return float(m.group(0)) if m else None
+    if v is None:
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_ts(ts_raw, tz=None):
+    """
+    ts client en secondes ou millisecondes -> datetime (maintenant si absent/invalide)
+    Les millisecondes sont conservées: (device, ts) est la clé de déduplication,
+    deux points d'une même seconde ne doivent pas se confondre.
+    """
+    if ts_raw is None:
+        return timezone.now()
+    try:
+        ts = float(ts_raw)
+        if ts > 1_000_000_000_000:
+            ts /= 1000
+        return datetime.fromtimestamp(ts, tz=tz or timezone.get_current_timezone())
+    except Exception:
+        return timezone.now()
+
+
+# --------------------------
+# Extraction compilée
+# --------------------------
+def compile_extractor(aliases):
+    """
+    {champ: (alias, ...)} -> fonction payload -> tuple de floats (ordre des champs).
+
+    Le code est généré une fois, par ex. pour DECODED_ALIASES:
+        def extract(p):
+            v0 = p.get('lat')
+            if v0 is None: v0 = p.get('latitude')
+            if v0 is None: v0 = _sub(p.get('gps'), 'lat')
+            ...
+            v0 = None if v0 is None else _to_float(v0)
+            ...
+            return (v0, v1, v2, v3,)
+    """
+    lines = ["def extract(p):"]
+    outputs = []
+    for i, (field, paths) in enumerate(aliases.items()):
+        var = f"v{i}"
+        first = True
+        for path in paths:
+            parent, _, key = path.rpartition(".")
+            guard = "" if first else f"if {var} is None: "
+            if parent:
+                lines.append(f"    {guard}{var} = _sub(p.get({parent!r}), {key!r})")
+            else:
+                lines.append(f"    {guard}{var} = p.get({key!r})")
+            first = False
+        lines.append(f"    {var} = None if {var} is None else _to_float({var})")
+        outputs.append(var)
+    lines.append(f"    return ({', '.join(outputs)},)")
+
+    namespace = {"_to_float": to_float, "_sub": _sub}
+    exec("\n".join(lines), namespace)
+    extract = namespace["extract"]
+    extract.fields = tuple(aliases)
+    return extract
+
+
+def _sub(obj, key):
+    return obj.get(key) if obj.__class__ is dict else None
+
+
+extract_telemetry = compile_extractor(TELEMETRY_ALIASES)
+extract_decoded = compile_extractor(DECODED_ALIASES)
+
+
+def extract_gps(decoded_payload):
+    """
+    decoded_payload TTN -> (lat, lng), (None, None) si absent
+    """
+    if not isinstance(decoded_payload, dict):
+        return None, None
+    lat, lng, _, _ = extract_decoded(decoded_payload)
+    return lat, lng
+
+
+# --------------------------
+# Colonnes
+# --------------------------
+class PointColumns:
+    """
+    Lot de points en colonnes (une liste par champ, même longueur).
+    """
+    __slots__ = ("device_eui", "ts") + POINT_FIELDS
+
+    def __init__(self, device_eui=(), ts=(), lat=(), lng=(), temp=(), battery=(), rssi=(), snr=()):
+        self.device_eui = list(device_eui)
+        self.ts = list(ts)
+        self.lat = list(lat)
+        self.lng = list(lng)
+        self.temp = list(temp)
+        self.battery = list(battery)
+        self.rssi = list(rssi)
+        self.snr = list(snr)
+
+    def __len__(self):
+        return len(self.device_eui)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        [{"device_eui": ..., "point": {ts, lat, ...}}, ...] -> PointColumns
+        """
+        return cls(
+            [r["device_eui"] for r in records],
+            *([r["point"][name] for r in records] for name in ("ts",) + POINT_FIELDS),
+        )
+
+    def take(self, indices):
+        return PointColumns(*([column[i] for i in indices] for column in self.columns()))
+
+    def columns(self):
+        return (self.device_eui, self.ts, self.lat, self.lng, self.temp, self.battery, self.rssi, self.snr)
+
+    def keys(self):
+        return list(zip(self.device_eui, self.ts))
+
+    def rows(self):
+        """
+        -> (device_eui, ts, lat, lng, temp, battery, rssi, snr) par point
+        """
+        return zip(*self.columns())
+
+    def records(self):
+        return [
+            {"device_eui": eui, "point": dict(zip(("ts",) + POINT_FIELDS, values))}
+            for eui, *values in self.rows()
+        ]
+
+
+def normalize_telemetry(payloads, lines=None):
+    """
+    Lot de payloads telemetry_ingest / MQTT -> (PointColumns, [(ligne, erreur), ...])
+    lines: numéro de ligne de chaque payload dans la requête (défaut: rang, à partir de 1)
+    """
+    tz = timezone.get_current_timezone()
+    euis = []
+    ts = []
+    values = []
+    rejected = []
+
+    for line, data in zip(lines or range(1, len(payloads) + 1), payloads):
+        if data.__class__ is not dict:
+            rejected.append((line, "Invalid payload"))
+            continue
+        eui = data.get("device_eui")
+        eui = eui.strip() if eui.__class__ is str else str(eui or "").strip()
+        if not eui:
+            rejected.append((line, "Missing device_eui"))
+            continue
+        row = extract_telemetry(data)
+        if row[0] is None or row[1] is None:
+            rejected.append((line, "Missing lat/lng"))
+            continue
+        euis.append(eui)
+        ts.append(parse_ts(data.get("ts"), tz))
+        values.append(row)
+
+    columns = PointColumns(euis, ts, *(zip(*values) if values else ((),) * len(POINT_FIELDS)))
+    return columns, rejected
@@ -0,0 +1,173 @@
+"""
+Partitionnement mensuel (PostgreSQL) de TelemetryPoint (ts) et TTNUplink (received_at).
+
+La conversion des tables existantes est faite par la migration 0008;
+ici: création des partitions à venir et rétention (DETACH / DROP de
+partitions entières au lieu de DELETE ligne par ligne).
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+# clé -> (table, colonne de partitionnement)
+PARTITIONED_TABLES = {
+    "telemetrypoint": ("environmentsurveillance_telemetrypoint", "ts"),
+    "ttnuplink": ("environmentsurveillance_ttnuplink", "received_at"),
+}
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def month_start(dt):
+    return dt.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(dt, n):
+    month = dt.month - 1 + n
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(table, start):
+    return f"{table}_p{start:%Y%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [table])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def list_partitions(cursor, table):
+    """
+    [(nom, début, fin)] triés; la partition DEFAULT n'est pas incluse.
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = %s
+        """,
+        [table],
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        m = _BOUND_RE.search(bound or "")
+        if not m:
+            continue
+        lower, upper = (datetime.fromisoformat(v).astimezone(dt_timezone.utc) for v in m.groups())
+        partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def create_partition(cursor, table, column, start):
+    """
+    Crée la partition du mois `start` si elle n'existe pas.
+    Si la partition DEFAULT contient déjà des lignes de ce mois (ts client dans le futur),
+    elles sont déplacées dans la nouvelle partition.
+    Retour: True si créée.
+    """
+    name = partition_name(table, start)
+    cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [name])
+    if cursor.fetchone():
+        return False
+
+    end = add_months(start, 1)
+    default = default_partition_name(table)
+
+    cursor.execute(
+        f'SELECT 1 FROM "{default}" WHERE "{column}" >= %s AND "{column}" < %s LIMIT 1',
+        [start, end],
+    )
+    if cursor.fetchone():
+        with transaction.atomic():
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{default}"')
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE "{column}" >= %s AND "{column}" < %s RETURNING *) '
+                f'INSERT INTO "{table}" SELECT * FROM moved',
+                [start, end],
+            )
+            cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{default}" DEFAULT')
+    else:
+        cursor.execute(
+            f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+    return True
+
+
+def ensure_partitions(months_ahead=3, now=None):
+    """
+    Crée les partitions du mois courant et des `months_ahead` suivants.
+    Retour: liste des partitions créées.
+    """
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        for table, column in PARTITIONED_TABLES.values():
+            if not is_partitioned(cursor, table):
+                continue
+            for n in range(months_ahead + 1):
+                start = add_months(current, n)
+                if create_partition(cursor, table, column, start):
+                    created.append(partition_name(table, start))
+    return created
+
+
+def retention_days():
+    return getattr(settings, "PARTITION_RETENTION_DAYS", {})
+
+
+def expired_partitions(now=None):
+    """
+    {clé: [(nom, début, fin)]}: partitions entièrement plus vieilles que la rétention.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    expired = {}
+    with connection.cursor() as cursor:
+        for key, days in retention_days().items():
+            if key not in PARTITIONED_TABLES or not days:
+                continue
+            table, _ = PARTITIONED_TABLES[key]
+            if not is_partitioned(cursor, table):
+                continue
+            cutoff = now - timedelta(days=days)
+            expired[key] = [p for p in list_partitions(cursor, table) if p[2] <= cutoff]
+    return expired
+
+
+def apply_retention(drop=True, now=None):
+    """
+    DETACH (puis DROP si drop=True) les partitions expirées, et purge
+    les lignes expirées de la partition DEFAULT (normalement quasi vide).
+    Retour: liste des partitions traitées.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    done = []
+    with connection.cursor() as cursor:
+        for key, partitions in expired_partitions(now).items():
+            table, column = PARTITIONED_TABLES[key]
+            for name, _, _ in partitions:
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+                done.append(name)
+
+            cutoff = now - timedelta(days=retention_days()[key])
+            cursor.execute(
+                f'DELETE FROM "{default_partition_name(table)}" WHERE "{column}" < %s',
+                [cutoff],
+            )
+    return done
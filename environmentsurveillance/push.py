@@ -0,0 +1,301 @@
+"""
+Push temps réel des nouveaux points (Server-Sent Events), à la place du
+polling de telemetry_latest / telemetry_history par le client Angular.
+
+- PushHub (un par process): abonnés SSE de ce worker, chacun avec son filtre
+  de devices. Coalescence par abonné: tant qu'un client n'a pas lu, un
+  nouveau point d'un device remplace le précédent (un client lent ne reçoit
+  que le dernier état, la mémoire par client est bornée par son nombre de
+  devices).
+- broker (TELEMETRY_PUSH["BROKER"]): transporte les points écrits par un
+  worker vers les hubs de tous les workers.
+    LocalBroker          : dans le process (un seul worker, défaut)
+    PostgresNotifyBroker : NOTIFY / LISTEN PostgreSQL, sans service en plus
+
+Les points arrivent par le listener de points de l'ingest (ingest.notify_points).
+Le flux SSE est une vue async: à servir via EnvironmentSurveillance.asgi.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .ingest import BatchWriter
+from .latest_cache import _point_data
+
+
+logger = logging.getLogger(__name__)
+
+
+def push_config():
+    return getattr(settings, "TELEMETRY_PUSH", {})
+
+
+# --------------------------
+# Hub (abonnés du process)
+# --------------------------
+class Subscriber:
+
+    def __init__(self, devices, loop):
+        self.devices = devices  # frozenset d'EUI, None = tous
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.pending = {}  # EUI -> dernier point pas encore envoyé
+        self.coalesced = 0
+
+
+class PushHub:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_device = {}  # EUI -> {Subscriber}
+        self._all = set()
+        self.published = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._all) + len({s for subs in self._by_device.values() for s in subs})
+
+    @property
+    def has_subscribers(self):
+        return bool(self._all or self._by_device)
+
+    def subscribe(self, devices=None):
+        sub = Subscriber(frozenset(devices) if devices else None, asyncio.get_running_loop())
+        with self._lock:
+            if sub.devices is None:
+                self._all.add(sub)
+            else:
+                for eui in sub.devices:
+                    self._by_device.setdefault(eui, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._all.discard(sub)
+            for eui in sub.devices or ():
+                subs = self._by_device.get(eui)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_device[eui]
+
+    def dispatch(self, points):
+        """
+        points: [{"device_eui": ..., "ts": ..., ...}, ...] (thread quelconque)
+        """
+        woken = set()
+        with self._lock:
+            if not self.has_subscribers:
+                return
+            for data in points:
+                eui = data["device_eui"]
+                targets = self._by_device.get(eui, ())
+                for sub in (*targets, *self._all):
+                    current = sub.pending.get(eui)
+                    if current is not None:
+                        if current["ts"] > data["ts"]:
+                            continue
+                        sub.coalesced += 1
+                        self.coalesced += 1
+                    sub.pending[eui] = data
+                    woken.add(sub)
+            self.published += len(points)
+
+        for sub in woken:
+            try:
+                sub.loop.call_soon_threadsafe(sub.event.set)
+            except RuntimeError:
+                # boucle fermée: l'abonné est en train de partir
+                pass
+
+    def take(self, sub):
+        with self._lock:
+            pending, sub.pending = sub.pending, {}
+        return sorted(pending.values(), key=lambda data: data["ts"])
+
+    async def stream(self, sub, snapshot=(), heartbeat=15):
+        """
+        Générateur SSE d'un abonné (désabonné quand le client se déconnecte).
+        """
+        try:
+            yield "retry: 3000\n\n"
+            for data in snapshot:
+                yield _sse_event(data)
+            while True:
+                try:
+                    await asyncio.wait_for(sub.event.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                sub.event.clear()
+                for data in self.take(sub):
+                    yield _sse_event(data)
+        finally:
+            self.unsubscribe(sub)
+
+    def stats(self):
+        return {
+            "subscribers": len(self),
+            "published": self.published,
+            "coalesced": self.coalesced,
+        }
+
+
+def _sse_event(data):
+    return f"event: point\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+push_hub = PushHub()
+
+
+# --------------------------
+# Brokers
+# --------------------------
+class LocalBroker:
+    """
+    Un seul process: les points vont directement au hub.
+    """
+
+    def __init__(self, hub, **options):
+        self.hub = hub
+
+    @property
+    def active(self):
+        return self.hub.has_subscribers
+
+    def start(self):
+        pass
+
+    def publish(self, points):
+        self.hub.dispatch(points)
+
+    def stats(self):
+        return {"backend": "local"}
+
+
+class PostgresNotifyBroker:
+    """
+    Fan-out entre workers via NOTIFY/LISTEN (même base que l'ingest).
+
+    - publish(): met les points en file; un BatchWriter les envoie par
+      pg_notify groupés (payload < 8000 octets), hors du chemin d'ingest.
+      File pleine: les points sont perdus pour le push (pas pour la base).
+    - un thread par process écoute le canal sur sa propre connexion et
+      distribue au hub local (y compris les points publiés par ce process).
+    """
+
+    MAX_PAYLOAD = 7500
+
+    # les abonnés peuvent être dans un autre worker
+    active = True
+
+    def __init__(self, hub, channel="telemetry_points", alias="default", maxsize=10000):
+        self.hub = hub
+        self.channel = channel
+        self.alias = alias
+        self.writer = BatchWriter(
+            self._send, name="push-notify", maxsize=maxsize, batch_size=500, flush_interval=0.05,
+        )
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, points):
+        self.start()
+        for data in points:
+            self.writer.offer(data)
+
+    def start(self):
+        # appelé au premier publish() et au premier abonné du process
+        with self._lock:
+            if self._listener is None:
+                self.writer.start()
+                self._listener = threading.Thread(target=self._listen, name="push-listen", daemon=True)
+                self._listener.start()
+
+    def _send(self, points):
+        payloads = []
+        chunk, size = [], 2
+        for data in points:
+            encoded = json.dumps(data, separators=(",", ":"))
+            if chunk and size + len(encoded) + 1 > self.MAX_PAYLOAD:
+                payloads.append("[" + ",".join(chunk) + "]")
+                chunk, size = [], 2
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        if chunk:
+            payloads.append("[" + ",".join(chunk) + "]")
+
+        with connections[self.alias].cursor() as cursor:
+            for payload in payloads:
+                cursor.execute("SELECT pg_notify(%s, %s)", [self.channel, payload])
+
+    def _listen(self):
+        delay = 1
+        while True:
+            conn = connections.create_connection(self.alias)
+            try:
+                conn.ensure_connection()
+                raw = conn.connection
+                with raw.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                delay = 1
+                while True:
+                    for payload in self._wait(raw):
+                        self.hub.dispatch(json.loads(payload))
+            except Exception:
+                logger.exception("Push listener on %r failed, reconnecting in %ss", self.channel, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                conn.close()
+
+    @staticmethod
+    def _wait(raw, timeout=5):
+        if hasattr(raw, "poll"):
+            # psycopg2
+            if select.select([raw], [], [], timeout)[0]:
+                raw.poll()
+            while raw.notifies:
+                yield raw.notifies.pop(0).payload
+        else:
+            # psycopg 3
+            for notify in raw.notifies(timeout=timeout):
+                yield notify.payload
+
+    def stats(self):
+        return {"backend": "postgres", "channel": self.channel, "queue": self.writer.stats()}
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_push_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = push_config()
+                broker_cls = import_string(config.get("BROKER", "environmentsurveillance.push.LocalBroker"))
+                _broker = broker_cls(push_hub, **config.get("OPTIONS", {}))
+    return _broker
+
+
+def publish_points(points):
+    """
+    Listener de points (ingest.register_point_listener): [(EUI, TelemetryPoint), ...]
+    """
+    broker = get_push_broker()
+    if broker.active:
+        broker.publish([_point_data(eui, p) for eui, p in points])
+
+
+def push_stats():
+    return {**push_hub.stats(), "broker": get_push_broker().stats()}
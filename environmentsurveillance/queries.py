@@ -0,0 +1,97 @@
+"""
+Querysets des endpoints de l'API, partagés entre les vues et la commande
+`explain_queries` (qui vérifie que chacun utilise bien ses index).
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from .geo import covering_cells
+
+from .models import Device, DeviceLastSeen, TTNUplink, TelemetryPoint
+
+
+# colonnes renvoyées par l'historique / la liste des uplinks (values_list)
+HISTORY_COLUMNS = ("ts", "lat", "lng", "temp", "battery", "rssi", "snr")
+UPLINK_COLUMNS = (
+    "device__device_eui", "device__name", "application_id", "decoded_payload",
+    "rssi", "snr", "f_port", "received_at",
+)
+
+
+def latest_point_queryset(device_id):
+    # index telemetry_device_ts_idx (device, -ts, -id)
+    return TelemetryPoint.objects.filter(device_id=device_id).order_by("-ts", "-id")
+
+
+def history_queryset(device_id, from_dt=None, to_dt=None):
+    # index telemetry_device_ts_idx (device, -ts, -id)
+    qs = TelemetryPoint.objects.filter(device_id=device_id)
+    if from_dt:
+        qs = qs.filter(ts__gte=from_dt)
+    if to_dt:
+        qs = qs.filter(ts__lte=to_dt)
+    return qs.order_by("-ts", "-id")
+
+
+def latest_all_queryset(euis=None, since=None, bbox=None):
+    """
+    Dernier point par device en une requête, repéré par DeviceLastSeen
+    (last_seen = ts du dernier point inséré, mis à jour dans la transaction de
+    l'ingest): (device, ts) est la clé unique des points, une sonde d'index par
+    device, dans la seule partition de son last_seen (élagage à l'exécution).
+    Un id seul ne dit pas la partition: chercher par id sondait chacune.
+    `since` borne aussi ts, ce qui écarte les partitions plus anciennes au plan.
+    """
+    if euis:
+        devices = Device.objects.filter(device_eui__in=euis)
+    else:
+        devices = Device.objects.filter(is_active=True)
+
+    seen = DeviceLastSeen.objects.filter(device_id=OuterRef("device_id"), last_seen=OuterRef("ts"))
+    qs = TelemetryPoint.objects.filter(Exists(seen), device__in=devices)
+    if since:
+        qs = qs.filter(ts__gte=since)
+    if bbox:
+        min_lng, min_lat, max_lng, max_lat = bbox
+        qs = qs.filter(lng__gte=min_lng, lng__lte=max_lng, lat__gte=min_lat, lat__lte=max_lat)
+    return qs.order_by()
+
+
+def latest_probe_queryset(devices):
+    """
+    Dernier point de chaque device sans passer par DeviceLastSeen (pour la
+    remplir, voir lastseen.rebuild_last_seen): sous-requête corrélée
+    "ORDER BY ts DESC LIMIT 1" par device, qui sonde toutes les partitions.
+    """
+    newest = TelemetryPoint.objects.filter(device_id=OuterRef("pk")).order_by("-ts", "-id").values("id")[:1]
+    return TelemetryPoint.objects.filter(
+        id__in=devices.annotate(latest_id=Subquery(newest)).values("latest_id")
+    ).order_by()
+
+
+def area_queryset(bbox, from_dt=None, to_dt=None, device_ids=None):
+    """
+    Points dans une bbox: cellules geohash couvrantes (index telemetry_geohash_idx,
+    "geohash LIKE 'cellule%'") puis filtre exact sur lat/lng.
+    La forme exacte (cercle, polygone) est testée par l'appelant.
+    """
+    cells = covering_cells(bbox)
+    min_lng, min_lat, max_lng, max_lat = bbox
+    qs = TelemetryPoint.objects.filter(
+        reduce(or_, (Q(geohash__startswith=cell) for cell in cells)),
+        lng__gte=min_lng, lng__lte=max_lng, lat__gte=min_lat, lat__lte=max_lat,
+    )
+    if from_dt:
+        qs = qs.filter(ts__gte=from_dt)
+    if to_dt:
+        qs = qs.filter(ts__lte=to_dt)
+    if device_ids is not None:
+        qs = qs.filter(device_id__in=device_ids)
+    return qs.order_by("-ts", "-id")
+
+
+def uplinks_queryset():
+    # index ttnuplink_received_idx (-received_at, -id)
+    return TTNUplink.objects.order_by("-received_at", "-id")
@@ -0,0 +1,206 @@
+"""
+Agrégats continus de TelemetryPoint (TelemetryRollup) en 1 min / 1 h / 1 jour.
+
+Le job `update_rollups` lit le delta des points insérés depuis le dernier
+passage (watermark sur created_at, pas sur ts) et le fusionne par upsert
+dans les buckets de leur ts. Un point arrivé en retard (ts client ancien
+via telemetry_ingest) a un created_at récent: il est donc pris au passage
+suivant et fusionné dans son bucket d'origine.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import RollupWatermark, TelemetryPoint, TelemetryRollup
+
+
+# granularité -> (kind Trunc, taille en secondes)
+GRANULARITIES = {
+    "1m": ("minute", 60),
+    "1h": ("hour", 3600),
+    "1d": ("day", 86400),
+}
+
+METRICS = ("temp", "battery", "rssi", "snr")
+
+WATERMARK_NAME = "telemetry_rollup"
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _upsert_sql():
+    table = TelemetryRollup._meta.db_table
+    columns = ["device_id", "granularity", "bucket", "count"]
+    updates = [f"count = {table}.count + EXCLUDED.count"]
+    for m in METRICS:
+        columns += [f"{m}_count", f"{m}_sum", f"{m}_min", f"{m}_max"]
+        updates += [
+            f"{m}_count = {table}.{m}_count + EXCLUDED.{m}_count",
+            f"{m}_sum = CASE WHEN {table}.{m}_sum IS NULL THEN EXCLUDED.{m}_sum "
+            f"WHEN EXCLUDED.{m}_sum IS NULL THEN {table}.{m}_sum "
+            f"ELSE {table}.{m}_sum + EXCLUDED.{m}_sum END",
+            f"{m}_min = CASE WHEN {table}.{m}_min IS NULL OR EXCLUDED.{m}_min < {table}.{m}_min "
+            f"THEN EXCLUDED.{m}_min ELSE {table}.{m}_min END",
+            f"{m}_max = CASE WHEN {table}.{m}_max IS NULL OR EXCLUDED.{m}_max > {table}.{m}_max "
+            f"THEN EXCLUDED.{m}_max ELSE {table}.{m}_max END",
+        ]
+    # SQL portable (PostgreSQL et SQLite >= 3.24)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT (device_id, granularity, bucket) DO UPDATE SET {', '.join(updates)}"
+    )
+
+
+def _aggregate_delta(delta, kind):
+    aggregates = {"n": Count("id")}
+    for m in METRICS:
+        aggregates[f"{m}_n"] = Count(m)
+        aggregates[f"{m}_sum"] = Sum(m)
+        aggregates[f"{m}_min"] = Min(m)
+        aggregates[f"{m}_max"] = Max(m)
+    return (
+        delta.order_by()
+        .annotate(bucket=Trunc("ts", kind, tzinfo=dt_timezone.utc))
+        .values("device_id", "bucket")
+        .annotate(**aggregates)
+    )
+
+
+def merge_delta(delta):
+    """
+    Fusionne un queryset de TelemetryPoint dans les 3 granularités.
+    Retour: nombre de lignes d'agrégat écrites.
+    """
+    sql = _upsert_sql()
+    written = 0
+    with connection.cursor() as cursor:
+        for granularity, (kind, _) in GRANULARITIES.items():
+            params = []
+            for row in _aggregate_delta(delta, kind):
+                values = [row["device_id"], granularity, row["bucket"], row["n"]]
+                for m in METRICS:
+                    values += [row[f"{m}_n"], row[f"{m}_sum"], row[f"{m}_min"], row[f"{m}_max"]]
+                params.append(values)
+            if params:
+                cursor.executemany(sql, params)
+                written += len(params)
+    return written
+
+
+def update_rollups(now=None):
+    """
+    Fait avancer le watermark par fenêtres de ROLLUP_MAX_WINDOW, une transaction
+    par fenêtre (delta fusionné + watermark avancé ensemble => exactement une fois).
+
+    ROLLUP_LAG: on ne lit pas les dernières secondes, pour laisser les transactions
+    d'ingest en cours (created_at déjà fixé, pas encore commitées) se terminer.
+    Retour: (nombre de fenêtres, lignes d'agrégat écrites)
+    """
+    now = now or timezone.now()
+    lag = timedelta(seconds=getattr(settings, "ROLLUP_LAG", 60))
+    window = timedelta(seconds=getattr(settings, "ROLLUP_MAX_WINDOW", 3600))
+    target = now - lag
+
+    windows = 0
+    written = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = RollupWatermark.objects.select_for_update().get_or_create(
+                name=WATERMARK_NAME,
+                defaults={"position": EPOCH},
+            )
+            start = watermark.position
+            if start >= target:
+                break
+
+            if start == EPOCH:
+                # premier passage: on saute directement au premier point existant
+                first = TelemetryPoint.objects.order_by().aggregate(first=Min("created_at"))["first"]
+                if first is None:
+                    watermark.position = target
+                    watermark.save(update_fields=["position"])
+                    break
+                start = first - timedelta(microseconds=1)
+
+            end = min(start + window, target)
+            written += merge_delta(TelemetryPoint.objects.filter(created_at__gt=start, created_at__lte=end))
+            watermark.position = end
+            watermark.save(update_fields=["position"])
+            windows += 1
+
+    return windows, written
+
+
+def prune_rollups(now=None):
+    """
+    Supprime les buckets plus vieux que ROLLUP_RETENTION_DAYS[granularité] (None = garder).
+    """
+    now = now or timezone.now()
+    deleted = 0
+    for granularity, days in getattr(settings, "ROLLUP_RETENTION_DAYS", {}).items():
+        if days:
+            deleted += TelemetryRollup.objects.filter(
+                granularity=granularity,
+                bucket__lt=now - timedelta(days=days),
+            ).delete()[0]
+    return deleted
+
+
+# --------------------------
+# Lecture
+# --------------------------
+def pick_granularity(step):
+    """
+    Granularité la plus grossière dont la taille divise le pas demandé.
+    """
+    best = "1m"
+    for granularity, (_, size) in GRANULARITIES.items():
+        if size <= step and step % size == 0:
+            best = granularity
+    return best
+
+
+def read_rollups(device_id, from_dt, to_dt, step):
+    """
+    Buckets de `step` secondes sur [from_dt, to_dt), lus dans la granularité
+    la plus grossière possible puis fusionnés.
+    Retour: (granularité, [ {ts, count, temp: {min,max,avg}, ...}, ... ])
+    """
+    granularity = pick_granularity(step)
+    rows = (
+        TelemetryRollup.objects
+        .filter(device_id=device_id, granularity=granularity, bucket__gte=from_dt, bucket__lt=to_dt)
+        .order_by("bucket")
+        .values()
+    )
+
+    merged = {}
+    for row in rows:
+        key = int(row["bucket"].timestamp()) // step * step
+        acc = merged.get(key)
+        if acc is None:
+            acc = merged[key] = {"count": 0, **{m: [0, None, None, None] for m in METRICS}}
+        acc["count"] += row["count"]
+        for m in METRICS:
+            n, total, lo, hi = acc[m]
+            if row[f"{m}_count"]:
+                n += row[f"{m}_count"]
+                total = row[f"{m}_sum"] if total is None else total + row[f"{m}_sum"]
+                lo = row[f"{m}_min"] if lo is None else min(lo, row[f"{m}_min"])
+                hi = row[f"{m}_max"] if hi is None else max(hi, row[f"{m}_max"])
+            acc[m] = [n, total, lo, hi]
+
+    buckets = []
+    for key in sorted(merged):
+        acc = merged[key]
+        bucket = {"ts": key, "count": acc["count"]}
+        for m in METRICS:
+            n, total, lo, hi = acc[m]
+            bucket[m] = {"min": lo, "max": hi, "avg": total / n if n else None}
+        buckets.append(bucket)
+
+    return granularity, buckets
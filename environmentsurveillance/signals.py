@@ -0,0 +1,71 @@
+import logging
+
+from django.core.signals import request_started, setting_changed
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .alerts import alert_engine
+from .decoders import reset_decoder_registry
+from .device_registry import device_registry
+from .geofences import geofence_monitor
+from .ingest import register_point_listener
+from .latest_cache import latest_points
+from .metrics import install_db_wrapper
+from .models import AlertRule, Device, Geofence
+from .push import publish_points
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_device_registry(sender, instance, **kwargs):
+    device_registry.invalidate(eui=instance.device_eui, pk=instance.pk)
+
+
+@receiver(post_delete, sender=Device)
+def forget_latest_point(sender, instance, **kwargs):
+    latest_points.delete(instance.device_eui)
+
+
+register_point_listener(latest_points.update_from_points)
+register_point_listener(publish_points)
+register_point_listener(alert_engine)
+
+
+@receiver(post_save, sender=Geofence)
+@receiver(post_delete, sender=Geofence)
+def reload_geofences(sender, **kwargs):
+    geofence_monitor.invalidate()
+
+
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+def reload_alert_rules(sender, **kwargs):
+    alert_engine.invalidate()
+
+
+@receiver(setting_changed)
+def reload_payload_decoders(sender, setting, **kwargs):
+    if setting == "TTN_PAYLOAD_DECODERS":
+        reset_decoder_registry()
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    install_db_wrapper(connection)
+
+
+def warm_device_registry(sender, **kwargs):
+    # Une seule fois, à la première requête du worker (pas d'accès DB dans ready())
+    request_started.disconnect(warm_device_registry)
+    try:
+        device_registry.warm()
+    except DatabaseError:
+        logger.exception("Device registry warm-up failed")
+
+
+request_started.connect(warm_device_registry)
@@ -1,3 +1,1922 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import importlib
+import io
+import json
+import math
+import random
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Max
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from . import async_views, views
+from .alerts import CompiledRule, active_alert_keys, alert_engine
+from .benchmarks import BenchContext, benchmarks, run_benchmark
+from .decoders import DecoderRegistry, compile_layout, get_decoder_registry
+from .dedup import dedup_stats, recent_points, recent_uplinks
+from .fleet import fleet_uplinks, generate_fleet, make_fleet_euis, vary_uplink
+from .device_registry import device_registry
+from .downsample import SENSOR_FIELDS, lttb, select_indices, simplify_track
+from .exports import decode_cursor, encode_cursor
+from .geo import Circle, Polygon, covering_cells, geohash_bbox, geohash_encode
+from .geofences import GeofenceIndex, geofence_monitor, register_geofence_listener
+from .history_formats import decode_polyline, decode_track, encode_polyline, unpack_history
+from .ingest import (
+    BatchWriter,
+    asave_points,
+    asave_uplinks,
+    parse_telemetry,
+    parse_ttn_uplink,
+    save_points,
+    save_uplinks,
+)
+from .ingest_batch import MAX_ITEM_SIZE, IngestBodyError, iter_body_chunks, iter_json_array
+from .lastseen import StaleTracker
+from .latest_cache import latest_points
+from .loadtest import run_replay
+from .metrics import reset_metrics
+from .models import (
+    AlertEvent,
+    AlertRule,
+    Device,
+    DeviceLastSeen,
+    Geofence,
+    RollupWatermark,
+    TTNUplink,
+    TelemetryPoint,
+    UplinkDedupKey,
+)
+from .mqtt_consumer import TelemetryConsumer
+from .partitions import (
+    add_months,
+    apply_retention,
+    ensure_partitions,
+    expired_partitions,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+from .push import push_hub
+from .rollups import pick_granularity, update_rollups
+from .normalize import PointColumns, extract_decoded, normalize_telemetry, to_float
+from .uplink_storage import compress_payload, decompress_payload, extract_uplink_fields
+
+
+# --------------------------
+# Faux broker MQTT en mémoire
+# --------------------------
+class FakeMessage:
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class FakeBroker:
+    """
+    Broker en mémoire: publish() distribue aux clients abonnés,
+    down=True refuse les connexions, drop_connections() coupe les clients.
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.down = False
+        self.lock = threading.Lock()
+
+    def client(self, client_id):
+        client = FakeClient(self, client_id)
+        self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode()
+        with self.lock:
+            for client in self.clients:
+                if client.connected and topic in client.subscriptions:
+                    client.inbox.append(FakeMessage(topic, payload))
+
+    def drop_connections(self):
+        with self.lock:
+            for client in self.clients:
+                client.dropped = True
+
+
+class FakeClient:
+    """
+    Sous-ensemble de paho.mqtt.client.Client utilisé par TelemetryConsumer.
+    """
+    on_connect = on_disconnect = on_message = None
+
+    def __init__(self, broker, client_id):
+        self.broker = broker
+        self.client_id = client_id
+        self.connected = False
+        self.dropped = False
+        self.subscriptions = set()
+        self.inbox = deque()
+        self._connack = False
+        self.connect_attempts = 0
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def connect(self, host, port, keepalive):
+        self.connect_attempts += 1
+        if self.broker.down:
+            raise ConnectionRefusedError("broker down")
+        self.connected = True
+        self.dropped = False
+        self.subscriptions = set()
+        self._connack = True
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.add(topic)
+
+    def loop(self, timeout=1.0):
+        if self._connack:
+            self._connack = False
+            self.on_connect(self, None, {}, 0, None)
+        if self.dropped:
+            self.connected = False
+            self.on_disconnect(self, None, 7)
+            return 7  # MQTT_ERR_CONN_LOST
+        if not self.inbox:
+            time.sleep(0.005)
+        while self.inbox:
+            self.on_message(self, None, self.inbox.popleft())
+        return 0
+
+    def disconnect(self):
+        self.connected = False
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class MqttConsumerTests(TransactionTestCase):
+    # le writer écrit depuis son propre thread (autre connexion): pas de TestCase
+
+    topic = "drone/telemetry"
+
+    def setUp(self):
+        # registre process-wide: les ids des tests précédents ont été vidés
+        device_registry.clear()
+        recent_points.clear()
+        self.broker = FakeBroker()
+        self.consumer = TelemetryConsumer(
+            client_factory=self.broker.client,
+            host="fake",
+            port=1883,
+            topic=self.topic,
+            qos=0,
+            batch_size=50,
+            flush_interval=0.05,
+            backoff_min=0.01,
+            backoff_max=0.05,
+        )
+        self.thread = threading.Thread(target=self.consumer.run, daemon=True)
+
+    def tearDown(self):
+        self.consumer.stop()
+        if self.thread.ident is not None:
+            self.thread.join(10)
+
+    def start(self):
+        self.thread.start()
+        self.assertTrue(wait_for(lambda: self.consumer.connected))
+
+    def test_messages_are_written_in_batches(self):
+        self.start()
+        for i in range(120):
+            self.broker.publish(self.topic, {
+                "device_eui": f"MQTT{i % 3:012d}",
+                "ts": 1_700_000_000 + i,
+                "lat": 14.7,
+                "lng": -17.4,
+                "temp": 20 + i / 10,
+            })
+        self.broker.publish(self.topic, b"not json")
+        self.broker.publish(self.topic, {"device_eui": "MQTT000000000000"})  # lat/lng manquants
+
+        self.assertTrue(wait_for(lambda: self.consumer.writer.written == 120))
+        self.assertEqual(TelemetryPoint.objects.count(), 120)
+        self.assertEqual(Device.objects.filter(device_eui__startswith="MQTT").count(), 3)
+
+        stats = self.consumer.stats()
+        self.assertEqual(stats["received"], 122)
+        self.assertEqual(stats["invalid"], 2)
+        self.assertEqual(stats["written"], 120)
+        self.assertGreater(stats["lag_seconds"], 0)
+        self.assertIsNotNone(stats["queue_lag_seconds"])
+
+    def test_reconnects_with_backoff_when_broker_is_down(self):
+        self.broker.down = True
+        self.thread.start()
+        self.assertTrue(wait_for(lambda: self.consumer.reconnects >= 3))
+        self.assertFalse(self.consumer.connected)
+
+        self.broker.down = False
+        self.assertTrue(wait_for(lambda: self.consumer.connected))
+        self.broker.publish(self.topic, {"device_eui": "MQTT000000000001", "lat": 1, "lng": 2})
+        self.assertTrue(wait_for(lambda: self.consumer.writer.written == 1))
+
+    def test_resubscribes_after_connection_loss(self):
+        self.start()
+        self.broker.drop_connections()
+        self.assertTrue(wait_for(lambda: self.consumer.connects == 2))
+
+        self.broker.publish(self.topic, {"device_eui": "MQTT000000000002", "lat": 1, "lng": 2})
+        self.assertTrue(wait_for(lambda: self.consumer.writer.written == 1))
+        self.assertEqual(self.consumer.stats()["reconnects"], 1)
+
+    def test_stop_flushes_queued_points(self):
+        self.start()
+        for i in range(10):
+            self.broker.publish(self.topic, {"device_eui": "MQTT000000000003", "ts": 1_700_000_000 + i, "lat": 1, "lng": 2})
+        self.assertTrue(wait_for(lambda: self.consumer.received == 10))
+        self.consumer.stop()
+        self.thread.join(10)
+        self.assertEqual(TelemetryPoint.objects.count(), 10)
+
+    def test_full_queue_drops_without_blocking(self):
+        consumer = TelemetryConsumer(client_factory=self.broker.client, topic=self.topic, maxsize=2)
+        # writer non démarré: la file se remplit
+        started = time.monotonic()
+        for i in range(5):
+            payload = json.dumps({"device_eui": "MQTT000000000004", "ts": 1_700_000_000 + i, "lat": 1, "lng": 2})
+            consumer.on_message(None, None, FakeMessage(self.topic, payload.encode()))
+        self.assertLess(time.monotonic() - started, 0.5)
+        stats = consumer.stats()
+        self.assertEqual((stats["received"], stats["queued"], stats["dropped"]), (5, 2, 3))
+        self.assertEqual(consumer.writer.rejected, 3)
+
+    def test_rejects_qos_above_zero(self):
+        # paho acquitte avant on_message: un message écarté serait perdu
+        for qos in (1, 2):
+            with self.assertRaises(ValueError):
+                TelemetryConsumer(client_factory=self.broker.client, topic=self.topic, qos=qos)
+
+
+# --------------------------
+# Écriture par lots (BatchWriter)
+# --------------------------
+class BatchWriterTests(TestCase):
+
+    def writer(self, handler, **kwargs):
+        writer = BatchWriter(handler, name="test-writer", **kwargs)
+        self.addCleanup(writer.stop)
+        return writer
+
+    def test_flush_by_size_and_interval(self):
+        batches = []
+        writer = self.writer(lambda batch: batches.append(list(batch)), batch_size=3, flush_interval=0.05)
+        for i in range(7):
+            self.assertTrue(writer.offer(i))
+        writer.start()
+        # 2 lots pleins tout de suite, le reste au bout de flush_interval
+        self.assertTrue(wait_for(lambda: writer.written == 7))
+        self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_backpressure(self):
+        writer = self.writer(lambda batch: None, maxsize=2)
+        self.assertTrue(writer.offer(1))
+        self.assertTrue(writer.offer(2))
+        self.assertFalse(writer.offer(3))
+        started = time.monotonic()
+        self.assertFalse(writer.offer(4, timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(writer.stats()["rejected"], 2)
+        self.assertEqual(writer.stats()["queued"], 2)
+
+    def test_failed_item_is_dropped_alone(self):
+        written = []
+
+        def handler(batch):
+            if "bad" in batch:
+                raise ValueError("bad item")
+            written.extend(batch)
+
+        writer = self.writer(handler, batch_size=10)
+        for item in ("a", "bad", "b"):
+            writer.offer(item)
+        with self.assertLogs("environmentsurveillance.ingest", "ERROR"):
+            writer.start()
+            writer.stop()
+        self.assertEqual(written, ["a", "b"])
+        self.assertEqual((writer.written, writer.failed), (2, 1))
+
+    def test_stop_drains_queue(self):
+        written = []
+        writer = self.writer(written.extend, batch_size=2, flush_interval=10)
+        writer.start()
+        for i in range(5):
+            writer.offer(i)
+        writer.stop()
+        self.assertEqual(written, [0, 1, 2, 3, 4])
+        self.assertFalse(writer.offer(5))
+
+    @override_settings(TTN_INGEST_MODE="buffered")
+    def test_buffered_uplink_queue_full(self):
+        payload = json.dumps(next(fleet_uplinks(["BUFF000000000001"], 1)))
+        # writer non démarré: la file (1 place) n'est jamais vidée
+        buffer = BatchWriter(save_uplinks, name="test-uplink-writer", maxsize=1)
+        with mock.patch("environmentsurveillance.views.get_uplink_buffer", return_value=buffer):
+            response = self.client.post("/api/v1/uplink", payload, content_type="application/json")
+            self.assertEqual(response.status_code, 202)
+            response = self.client.post("/api/v1/uplink", payload, content_type="application/json")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(TTNUplink.objects.count(), 0)
+
+
+# --------------------------
+# Registre des devices (cache EUI -> id)
+# --------------------------
+class DeviceRegistryTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+
+    def test_cached_lookup(self):
+        device = Device.objects.create(device_eui="REG0000000000001", name="a")
+        with self.assertNumQueries(1):
+            self.assertEqual(device_registry.get("REG0000000000001").id, device.pk)
+            self.assertEqual(device_registry.get("REG0000000000001").id, device.pk)
+        with self.assertNumQueries(1):
+            self.assertIsNone(device_registry.get("REG00000000000FF"))
+
+    def test_resolve_many_creates_missing(self):
+        Device.objects.create(device_eui="REG0000000000001", name="a")
+        with self.assertNumQueries(4):  # lecture, relecture sous verrou, INSERT, lecture des créés
+            resolved = device_registry.resolve_many({"REG0000000000001": "x", "REG0000000000002": "b"})
+        self.assertEqual(resolved["REG0000000000002"].name, "b")
+        self.assertEqual(Device.objects.filter(device_eui__startswith="REG").count(), 2)
+
+    def test_invalidated_on_save_and_delete(self):
+        device = Device.objects.create(device_eui="REG0000000000001", name="a")
+        self.assertTrue(device_registry.get("REG0000000000001").is_active)
+
+        device.is_active = False
+        device.save()
+        self.assertFalse(device_registry.get("REG0000000000001").is_active)
+
+        # changement d'EUI: l'ancienne clé disparaît aussi
+        device.device_eui = "REG0000000000009"
+        device.save()
+        self.assertIsNone(device_registry.get("REG0000000000001"))
+        self.assertEqual(device_registry.get("REG0000000000009").id, device.pk)
+
+        device.delete()
+        self.assertIsNone(device_registry.get("REG0000000000009"))
+
+
+class DeviceDeletedElsewhereTests(TransactionTestCase):
+    # FK différée: l'erreur sort au commit, il faut de vraies transactions
+
+    eui = "REG00000000000DD"
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+
+    def delete_elsewhere(self):
+        # autre worker: pas de signal post_delete dans ce process, l'id reste en cache
+        device_id = device_registry.resolve(self.eui, self.eui).id
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {Device._meta.db_table} WHERE id = %s", [device_id])
+        self.assertEqual(device_registry.get(self.eui).id, device_id)
+        return device_id
+
+    def point(self, ts=1_700_000_000):
+        return parse_telemetry({"device_eui": self.eui, "ts": ts, "lat": 1, "lng": 2})[0]
+
+    def test_save_points_retries_once(self):
+        old_id = self.delete_elsewhere()
+        written = save_points([self.point()])
+        device = Device.objects.get(device_eui=self.eui)
+        self.assertNotEqual(device.pk, old_id)
+        self.assertEqual([p.device_id for _, p in written], [device.pk])
+        self.assertEqual(TelemetryPoint.objects.get().device_id, device.pk)
+        self.assertEqual(device_registry.get(self.eui).id, device.pk)
+
+    def test_save_uplinks_retries_once(self):
+        self.delete_elsewhere()
+        record, _ = parse_ttn_uplink({
+            "end_device_ids": {"device_id": "drone-dd", "dev_eui": self.eui},
+            "uplink_message": {"f_cnt": 1, "decoded_payload": {"lat": 1, "lng": 2}},
+        })
+        save_uplinks([record])
+        device = Device.objects.get(device_eui=self.eui)
+        self.assertEqual(TTNUplink.objects.get().device_id, device.pk)
+        self.assertEqual(UplinkDedupKey.objects.get().device_id, device.pk)
+
+    async def test_asave_points_retries_once(self):
+        await sync_to_async(self.delete_elsewhere)()
+        await asave_points([self.point()])
+        point = await TelemetryPoint.objects.select_related("device").aget()
+        self.assertEqual(point.device.device_eui, self.eui)
+
+
+# --------------------------
+# Dernier point (cache + ETag)
+# --------------------------
+class TelemetryLatestTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        latest_points.delete("LATEST000000001")
+        self.url = "/api/v1/telemetry/latest/LATEST000000001/"
+
+    def save(self, ts, temp):
+        save_points([{"device_eui": "LATEST000000001", "point": {
+            "ts": datetime.fromtimestamp(ts, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": temp, "battery": None, "rssi": None, "snr": None,
+        }}])
+
+    def test_etag_and_not_modified(self):
+        self.save(1_700_000_000, 20)
+        response = self.client.get(self.url)
+        self.assertEqual(response.json()["temp"], 20.0)
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"x", {etag}').status_code, 304)
+
+    def test_cache_refreshed_on_ingest(self):
+        self.save(1_700_000_000, 20)
+        etag = self.client.get(self.url)["ETag"]
+        self.save(1_700_000_060, 21)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["temp"], 21.0)
+        # un point plus ancien arrivé en retard ne remplace pas le dernier
+        self.save(1_700_000_030, 99)
+        self.assertEqual(self.client.get(self.url).json()["temp"], 21.0)
+
+    def test_cold_cache_reads_database(self):
+        self.save(1_700_000_000, 20)
+        latest_points.delete("LATEST000000001")
+        self.assertEqual(self.client.get(self.url).json()["temp"], 20.0)
+        self.assertIsNotNone(latest_points.get("LATEST000000001"))
+        self.assertEqual(self.client.get("/api/v1/telemetry/latest/LATEST0000000FF/").status_code, 404)
+
+    def test_locmem_entries_expire(self):
+        self.save(1_700_000_000, 20)
+        etag = self.client.get(self.url)["ETag"]
+        # point écrit par un autre process: pas de listener ici
+        TelemetryPoint.objects.create(
+            device_id=device_registry.get("LATEST000000001").id,
+            ts=datetime.fromtimestamp(1_700_000_060, tz=dt_timezone.utc), lat=14.7, lng=-17.4, temp=22,
+        )
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        ttl = latest_points.backend.ttl
+        with mock.patch("environmentsurveillance.latest_cache.time.monotonic", return_value=time.monotonic() + ttl + 1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["temp"], 22.0)
+
+
+class TelemetryLatestAllTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        records = []
+        for d, (lat, lng) in enumerate(((14.70, -17.40), (14.80, -17.30), (15.50, -16.00))):
+            for i in range(3):
+                records.append({"device_eui": f"BULK00000000000{d}", "point": {
+                    "ts": datetime.fromtimestamp(1_700_000_000 + 100 * d + i, tz=dt_timezone.utc),
+                    "lat": lat, "lng": lng, "temp": float(i), "battery": None, "rssi": None, "snr": None,
+                }})
+        save_points(records)
+        Device.objects.create(device_eui="BULK0000000000FF", name="sans point")
+        self.url = "/api/v1/telemetry/latest/"
+
+    def points(self, **params):
+        data = self.client.get(self.url, params).json()
+        self.assertEqual(data["count"], len(data["points"]))
+        return {p["device_eui"]: (p["ts"], p["temp"]) for p in data["points"]}
+
+    def test_latest_point_per_device(self):
+        with self.assertNumQueries(1):
+            points = self.points()
+        self.assertEqual(points, {
+            "BULK000000000000": (1_700_000_002, 2.0),
+            "BULK000000000001": (1_700_000_102, 2.0),
+            "BULK000000000002": (1_700_000_202, 2.0),
+        })
+
+    def test_filters(self):
+        self.assertEqual(set(self.points(devices="BULK000000000001,BULK0000000000FF")), {"BULK000000000001"})
+        self.assertEqual(set(self.points(bbox="-17.5,14.6,-17.2,14.9")), {"BULK000000000000", "BULK000000000001"})
+        self.assertEqual(set(self.points(since=1_700_000_100)), {"BULK000000000001", "BULK000000000002"})
+
+        Device.objects.filter(device_eui="BULK000000000002").update(is_active=False)
+        self.assertNotIn("BULK000000000002", self.points())
+        # EUI explicites: devices inactifs compris
+        self.assertIn("BULK000000000002", self.points(devices="BULK000000000002"))
+
+    def test_points_written_outside_ingest(self):
+        # le dernier point est repéré par DeviceLastSeen: un point écrit sans l'ingest
+        # (import SQL, ORM) n'y est qu'après stale_devices --rebuild
+        device = Device.objects.get(device_eui="BULK0000000000FF")
+        TelemetryPoint.objects.create(
+            device=device, ts=datetime.fromtimestamp(1_700_000_500, tz=dt_timezone.utc), lat=14.7, lng=-17.4,
+        )
+        self.assertNotIn("BULK0000000000FF", self.points())
+        DeviceLastSeen.objects.all().delete()
+        call_command("stale_devices", "--rebuild", stdout=io.StringIO())
+        self.assertEqual(DeviceLastSeen.objects.count(), 4)
+        self.assertEqual(self.points()["BULK0000000000FF"], (1_700_000_500, None))
+        self.assertEqual(self.points()["BULK000000000001"], (1_700_000_102, 2.0))
+
+    def test_data_migration_fills_last_seen(self):
+        # base existante au déploiement de 0014: table vide, points déjà là
+        migration = importlib.import_module("environmentsurveillance.migrations.0016_fill_device_last_seen")
+        DeviceLastSeen.objects.filter(device__device_eui="BULK000000000001").delete()
+        migration.fill_last_seen(django_apps, None)
+        self.assertEqual(DeviceLastSeen.objects.count(), 3)
+        self.assertEqual(self.points()["BULK000000000001"], (1_700_000_102, 2.0))
+
+
+# --------------------------
+# Plans des requêtes de l'API
+# --------------------------
+class ExplainQueriesTests(TestCase):
+
+    def test_no_device(self):
+        with self.assertRaisesMessage(CommandError, "Aucun device"):
+            call_command("explain_queries", stdout=io.StringIO())
+
+    def test_queries_use_their_indexes(self):
+        recent_points.clear()
+        # points de la dernière heure (dans la plage des requêtes), peu d'entre eux dans la zone
+        # de telemetry_area: assez de lignes pour que le planner préfère les index sélectifs
+        rng = random.Random(5)
+        now = time.time()
+        save_points([{"device_eui": f"EXPLAIN0000000{i % 20:02d}", "point": {
+            "ts": datetime.fromtimestamp(now - 3600 + i, tz=dt_timezone.utc), "lat": rng.uniform(-60, 60),
+            "lng": rng.uniform(-180, 180), "temp": None, "battery": None, "rssi": None, "snr": None,
+        }} for i in range(3000)])
+        out = io.StringIO()
+        call_command("explain_queries", "--device", "EXPLAIN000000001", "--analyze-tables", stdout=out)
+        output = out.getvalue()
+        for name in ("telemetry_latest", "telemetry_history", "telemetry_latest_all", "telemetry_area", "list_ttn_uplinks"):
+            self.assertIn(f"OK {name}\n", output)
+        self.assertNotIn("FAIL", output)
+
+
+# --------------------------
+# Pagination par curseur et exports
+# --------------------------
+class CursorExportTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+        save_points([{"device_eui": "PAGE00000000001", "point": {
+            "ts": datetime.fromtimestamp(1_700_000_000 + i, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": float(i), "battery": None, "rssi": None, "snr": None,
+        }} for i in range(25)])
+        self.url = "/api/v1/telemetry/history/PAGE00000000001/"
+
+    def test_cursor_round_trip(self):
+        dt = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        cursor = encode_cursor(dt, 42)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (dt, 42))
+        for bad in ("", "!!!", "bm90LWEtY3Vyc29y"):
+            self.assertIsNone(decode_cursor(bad))
+
+    def test_history_pages(self):
+        pages = []
+        params = {"limit": 10}
+        while True:
+            data = self.client.get(self.url, params).json()
+            pages.append([p["temp"] for p in data["history"]])
+            if data["nextCursor"] is None:
+                break
+            params["cursor"] = data["nextCursor"]
+        # chaque page ancien -> récent, les pages de la plus récente à la plus ancienne
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual([t for page in reversed(pages) for t in page], [float(i) for i in range(25)])
+
+    def test_uplink_pages_with_equal_timestamps(self):
+        received_at = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        records = []
+        for payload in fleet_uplinks(make_fleet_euis(7, prefix="PG"), 1, start=received_at):
+            payload["received_at"] = payload["uplink_message"]["received_at"] = "2024-05-01T00:00:00Z"
+            records.append(parse_ttn_uplink(payload)[0])
+        save_uplinks(records)
+
+        seen = []
+        params = {"limit": 3}
+        while True:
+            data = self.client.get("/api/list_ttn_uplinks", params).json()
+            seen += [u["device_eui"] for u in data["ttn_uplinks"]]
+            if data["nextCursor"] is None:
+                break
+            params["cursor"] = data["nextCursor"]
+        self.assertEqual(sorted(seen), make_fleet_euis(7, prefix="PG"))
+
+    def test_ndjson_and_csv_export(self):
+        response = self.client.get(self.url, {"format": "ndjson", "fromTs": 1_700_000_020})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="history_PAGE00000000001.ndjson"', response["Content-Disposition"])
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([p["ts"] for p in lines], list(range(1_700_000_020, 1_700_000_025)))
+        self.assertEqual(lines[0]["temp"], 20.0)
+
+        response = self.client.get(self.url, {"format": "csv"})
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ["ts", "lat", "lng", "temp", "battery", "rssi", "snr"])
+        self.assertEqual(rows[1], ["1700000000", "14.7", "-17.4", "0.0", "", "", ""])
+        self.assertEqual(len(rows), 26)
+
+
+# --------------------------
+# Partitions mensuelles
+# --------------------------
+class PartitionTests(TestCase):
+    table = "environmentsurveillance_telemetrypoint"
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+
+    def save(self, dt):
+        save_points([{"device_eui": "PART00000000001", "point": {
+            "ts": dt, "lat": 14.7, "lng": -17.4, "temp": None, "battery": None, "rssi": None, "snr": None,
+        }}])
+
+    def count(self, partition):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{partition}"')
+            return cursor.fetchone()[0]
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            return [name for name, _, _ in list_partitions(cursor, self.table)]
+
+    def test_month_helpers(self):
+        start = month_start(datetime(2024, 12, 31, 23, 59, tzinfo=dt_timezone.utc))
+        self.assertEqual(start, datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(start, 1), datetime(2025, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(start, 14), datetime(2026, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name(self.table, start), f"{self.table}_p202412")
+
+    def test_ensure_partitions_moves_default_rows(self):
+        # point "dans le futur": d'abord dans la partition DEFAULT
+        self.save(datetime(2090, 2, 15, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.count(f"{self.table}_default"), 1)
+
+        created = ensure_partitions(months_ahead=2, now=datetime(2090, 1, 10, tzinfo=dt_timezone.utc))
+        for month in ("209001", "209002", "209003"):
+            self.assertIn(f"{self.table}_p{month}", created)
+            self.assertIn(f"environmentsurveillance_ttnuplink_p{month}", created)
+        self.assertEqual(self.count(f"{self.table}_default"), 0)
+        self.assertEqual(self.count(f"{self.table}_p209002"), 1)
+        self.assertEqual(TelemetryPoint.objects.count(), 1)
+
+        self.assertEqual(ensure_partitions(months_ahead=2, now=datetime(2090, 1, 10, tzinfo=dt_timezone.utc)), [])
+
+    @override_settings(PARTITION_RETENTION_DAYS={"telemetrypoint": 30, "ttnuplink": 0})
+    def test_retention_drops_whole_partitions(self):
+        ensure_partitions(months_ahead=1, now=datetime(1990, 1, 1, tzinfo=dt_timezone.utc))
+        self.save(datetime(1990, 1, 15, tzinfo=dt_timezone.utc))
+        self.save(datetime(1990, 2, 15, tzinfo=dt_timezone.utc))
+        self.save(datetime(1989, 6, 1, tzinfo=dt_timezone.utc))  # hors partitions: DEFAULT
+
+        # comme si les inserts étaient commités: pas de contrôle de FK différé en attente sur les partitions
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        now = datetime(1990, 3, 10, tzinfo=dt_timezone.utc)  # limite: 1990-02-08
+        expired = expired_partitions(now)
+        self.assertEqual([name for name, _, _ in expired["telemetrypoint"]], [f"{self.table}_p199001"])
+        self.assertNotIn("ttnuplink", expired)
+
+        self.assertEqual(apply_retention(now=now), [f"{self.table}_p199001"])
+        self.assertNotIn(f"{self.table}_p199001", self.partitions())
+        self.assertIn(f"{self.table}_p199002", self.partitions())
+        self.assertEqual(
+            [ts.month for ts in TelemetryPoint.objects.values_list("ts", flat=True)], [2],
+        )
+
+
+# --------------------------
+# Agrégats continus
+# --------------------------
+@override_settings(ROLLUP_LAG=60, ROLLUP_MAX_WINDOW=3600)
+class RollupTests(TestCase):
+    hour = 1_699_999_200  # début d'heure
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        self.url = "/api/v1/telemetry/rollup/ROLLUP000000001/"
+
+    def save(self, offsets_temps):
+        save_points([{"device_eui": "ROLLUP000000001", "point": {
+            "ts": datetime.fromtimestamp(self.hour + offset, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": temp, "battery": None, "rssi": None, "snr": None,
+        }} for offset, temp in offsets_temps])
+
+    def update(self):
+        # décalé de ROLLUP_LAG: tous les points déjà insérés sont lus, pas ceux insérés après
+        return update_rollups(now=timezone.now() + timedelta(seconds=60))
+
+    def rollup(self, step):
+        return self.client.get(self.url, {"fromTs": self.hour, "toTs": self.hour + 7200, "step": step}).json()
+
+    def test_watermark_and_late_point(self):
+        self.save([(0, 20.0), (30, 22.0), (90, 24.0), (3600, 30.0)])
+        windows, written = self.update()
+        self.assertEqual(windows, 1)
+        self.assertEqual(written, 3 + 2 + 1)  # 3 minutes, 2 heures, 1 jour
+        watermark = RollupWatermark.objects.get(name="telemetry_rollup").position
+        self.assertGreaterEqual(watermark, TelemetryPoint.objects.aggregate(Max("created_at"))["created_at__max"])
+        # rien de nouveau: pas de double comptage
+        self.assertEqual(self.update()[1], 0)
+
+        data = self.rollup(3600)
+        self.assertEqual(data["granularity"], "1h")
+        first, second = data["buckets"]
+        self.assertEqual((first["ts"], first["count"]), (self.hour, 3))
+        self.assertEqual(first["temp"], {"min": 20.0, "max": 24.0, "avg": 22.0})
+        self.assertIsNone(first["battery"]["avg"])
+        self.assertEqual(second["temp"]["avg"], 30.0)
+
+        # point en retard (ts ancien, created_at récent): fusionné dans son bucket d'origine
+        self.save([(60, 10.0)])
+        self.update()
+        first = self.rollup(3600)["buckets"][0]
+        self.assertEqual(first["count"], 4)
+        self.assertEqual(first["temp"], {"min": 10.0, "max": 24.0, "avg": 19.0})
+        minutes = self.rollup(60)
+        self.assertEqual(minutes["granularity"], "1m")
+        self.assertEqual([b["count"] for b in minutes["buckets"]], [2, 2, 1])
+
+    def test_pick_granularity(self):
+        self.assertEqual(pick_granularity(60), "1m")
+        self.assertEqual(pick_granularity(900), "1m")
+        self.assertEqual(pick_granularity(7200), "1h")
+        self.assertEqual(pick_granularity(5400), "1m")
+        self.assertEqual(pick_granularity(86400 * 7), "1d")
+
+
+# --------------------------
+# Vues async (ASGI) == vues sync
+# --------------------------
+class AsyncViewParityTests(TransactionTestCase):
+    # TransactionTestCase: downsample_history tourne dans un thread à part (thread_sensitive=False)
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+        latest_points.delete("PARITY000000001")
+        save_points([{"device_eui": "PARITY000000001", "point": {
+            "ts": datetime.fromtimestamp(1_700_000_000 + 10 * i, tz=dt_timezone.utc), "lat": 14.7 + i / 1000,
+            "lng": -17.4, "temp": None if i == 3 else 20 + i / 10, "battery": 3900.0, "rssi": -80.0, "snr": 7.5,
+        }} for i in range(30)])
+        self.sync_factory = RequestFactory()
+        self.async_factory = AsyncRequestFactory()
+
+    async def both(self, sync_view, async_view, method, path, *args, data=None, **extra):
+        if method == "get":
+            sync_request = self.sync_factory.get(path, data, **extra)
+            async_request = self.async_factory.get(path, data, **extra)
+        else:
+            sync_request = self.sync_factory.post(path, data, **extra)
+            async_request = self.async_factory.post(path, data, **extra)
+        sync_response = await sync_to_async(sync_view)(sync_request, *args)
+        async_response = await async_view(async_request, *args)
+        return sync_response, async_response
+
+    async def content(self, response):
+        if not response.streaming:
+            return response.content
+        if response.is_async:
+            return b"".join([chunk async for chunk in response.streaming_content])
+        return await sync_to_async(lambda: b"".join(response.streaming_content))()
+
+    async def assert_same(self, sync_response, async_response):
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        for header in ("Content-Type", "ETag", "Vary", "Content-Disposition"):
+            self.assertEqual(sync_response.get(header), async_response.get(header), header)
+        self.assertEqual(await self.content(sync_response), await self.content(async_response))
+
+    async def test_history(self):
+        path = "/api/v1/telemetry/history/PARITY000000001/"
+        first = json.loads((await sync_to_async(self.client.get)(path, {"limit": 10})).content)
+        for params in (
+            {},
+            {"limit": 10},
+            {"limit": 10, "cursor": first["nextCursor"]},
+            {"fromTs": 1_700_000_100, "toTs": 1_700_000_200},
+            {"maxPoints": 8},
+            {"resolution": 60},
+            {"format": "columns"},
+            {"format": "binary", "limit": 7},
+            {"format": "polyline", "precision": 6},
+            {"format": "ndjson"},
+            {"format": "csv", "fromTs": 1_700_000_150},
+        ):
+            with self.subTest(**params):
+                await self.assert_same(*await self.both(
+                    views.telemetry_history, async_views.telemetry_history_async, "get", path,
+                    "PARITY000000001", data=params,
+                ))
+        await self.assert_same(*await self.both(
+            views.telemetry_history, async_views.telemetry_history_async, "get", path, "PARITY00000000FF",
+        ))
+
+    async def test_latest(self):
+        path = "/api/v1/telemetry/latest/PARITY000000001/"
+        sync_response, async_response = await self.both(
+            views.telemetry_latest, async_views.telemetry_latest_async, "get", path, "PARITY000000001",
+        )
+        await self.assert_same(sync_response, async_response)
+        self.assertEqual(sync_response.status_code, 200)
+        not_modified = await self.both(
+            views.telemetry_latest, async_views.telemetry_latest_async, "get", path, "PARITY000000001",
+            headers={"If-None-Match": sync_response["ETag"]},
+        )
+        await self.assert_same(*not_modified)
+        self.assertEqual(not_modified[1].status_code, 304)
+        await self.assert_same(*await self.both(
+            views.telemetry_latest, async_views.telemetry_latest_async, "get", path, "PARITY00000000FF",
+        ))
+
+    async def test_ingest(self):
+        path = "/api/v1/telemetry/ingest/"
+
+        def body(eui, n):
+            points = [{"device_eui": eui, "ts": 1_700_000_000 + i, "lat": 14.7, "lng": -17.4} for i in range(n)]
+            points[1:2] = [{"device_eui": eui}] if n > 1 else []
+            return json.dumps(points if n > 1 else points[0])
+
+        for n in (1, 5):
+            sync_request = self.sync_factory.post(path, body("PARITYSYNC00001", n), content_type="application/json")
+            async_request = self.async_factory.post(path, body("PARITYASYNC0001", n), content_type="application/json")
+            await self.assert_same(
+                await sync_to_async(views.telemetry_ingest)(sync_request),
+                await async_views.telemetry_ingest_async(async_request),
+            )
+        await self.assert_same(*await self.both(
+            views.telemetry_ingest, async_views.telemetry_ingest_async, "post", path,
+            data="{oops", content_type="application/json",
+        ))
+        self.assertEqual(
+            await TelemetryPoint.objects.filter(device__device_eui="PARITYSYNC00001").acount(),
+            await TelemetryPoint.objects.filter(device__device_eui="PARITYASYNC0001").acount(),
+        )
+
+    async def test_uplink(self):
+        sync_payload, async_payload = fleet_uplinks(make_fleet_euis(2, prefix="PAR"), 1)
+        for payload in (sync_payload, async_payload, {"end_device_ids": {}}):
+            payload = json.dumps(payload)
+            await self.assert_same(
+                await sync_to_async(views.ttn_uplink)(
+                    self.sync_factory.post("/api/v1/uplink", payload, content_type="application/json"),
+                ),
+                await async_views.ttn_uplink_async(
+                    self.async_factory.post("/api/v1/uplink", payload, content_type="application/json"),
+                ),
+            )
+        self.assertEqual(await TTNUplink.objects.acount(), 2)
+
+
+# --------------------------
+# telemetry_ingest en mode lot
+# --------------------------
+class TelemetryBatchIngestTests(TestCase):
+
+    url = "/api/v1/telemetry/ingest/"
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+
+    def points(self, n, devices=3):
+        return [
+            {"device_eui": f"BATCH{i % devices:011d}", "ts": 1_700_000_000 + i, "lat": 14.7, "lng": -17.4, "temp": 20}
+            for i in range(n)
+        ]
+
+    def test_json_array_is_parsed_incrementally(self):
+        body = json.dumps([{"a": 1}, {"b": [1, 2]}, 12345, "x,]"]).encode()
+        # blocs de 3 octets: éléments et nombres coupés entre deux blocs
+        chunks = [body[i:i + 3] for i in range(0, len(body), 3)]
+        items = [item for _, item, _ in iter_json_array(iter(chunks))]
+        self.assertEqual(items, [{"a": 1}, {"b": [1, 2]}, 12345, "x,]"])
+
+        with self.assertRaises(IngestBodyError):
+            list(iter_json_array(iter([b'[{"a": 1}, {"b": '])))
+
+    def test_gzip_body_is_decompressed_by_chunks(self):
+        raw = b"x" * 1_000_000
+        chunks = list(iter_body_chunks(io.BytesIO(gzip.compress(raw)), "gzip", chunk_size=1024))
+        self.assertEqual(b"".join(chunks), raw)
+        self.assertLessEqual(max(len(c) for c in chunks), 1024 * 16)
+
+    def test_array_body(self):
+        points = self.points(1200)
+        points[10] = {"device_eui": "BATCH00000000000"}  # lat/lng manquants
+        response = self.client.post(self.url, json.dumps(points), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["accepted"], data["rejected"]), (1199, 1))
+        self.assertEqual(data["errors"], [{"line": 11, "error": "Missing lat/lng"}])
+        self.assertEqual(TelemetryPoint.objects.count(), 1199)
+        self.assertEqual(Device.objects.filter(device_eui__startswith="BATCH").count(), 3)
+
+    def test_gzipped_ndjson_body(self):
+        lines = [json.dumps(p) for p in self.points(50)] + ["", "not json"]
+        body = gzip.compress("\n".join(lines).encode())
+        response = self.client.post(
+            self.url, body, content_type="application/x-ndjson", headers={"Content-Encoding": "gzip"},
+        )
+        data = response.json()
+        self.assertEqual((data["accepted"], data["rejected"]), (50, 1))
+        self.assertEqual(data["errors"], [{"line": 52, "error": "Invalid JSON"}])
+
+    def test_single_object_is_unchanged(self):
+        response = self.client.post(self.url, json.dumps(self.points(1)[0]), content_type="application/json")
+        self.assertEqual(response.json(), {"status": "ok"})
+        response = self.client.post(self.url, "{oops", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(INGEST_BODY_MAX_SIZE=1024 * 1024)
+    def test_oversized_compressed_body(self):
+        # ~10 Mo de NDJSON valide qui tiennent en quelques Ko une fois compressés
+        line = json.dumps(self.points(1)[0]).encode() + b"\n"
+        body = gzip.compress(line * (10 * 1024 * 1024 // len(line)))
+        self.assertLess(len(body), 100 * 1024)
+        response = self.client.post(
+            self.url, body, content_type="application/x-ndjson", headers={"Content-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertLess(response.json()["accepted"], 10 * 1024 * 1024 // len(line))
+
+    def test_oversized_item(self):
+        huge = json.dumps({**self.points(1)[0], "pad": "x" * (MAX_ITEM_SIZE + 1)})
+        response = self.client.post(
+            self.url, gzip.compress(huge.encode()), content_type="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 413)
+        response = self.client.post(self.url, huge + "\n", content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()["accepted"], 0)
+
+    def test_unsupported_encoding(self):
+        response = self.client.post(
+            self.url, b"[]", content_type="application/json", headers={"Content-Encoding": "compress"},
+        )
+        self.assertEqual(response.status_code, 415)
+
+
+# --------------------------
+# Déduplication
+# --------------------------
+class NormalizeTests(TestCase):
+
+    def test_to_float(self):
+        self.assertEqual(to_float("21.5 C"), 21.5)
+        self.assertEqual(to_float("1e3"), 1000.0)
+        self.assertEqual(to_float(7), 7.0)
+        self.assertIsNone(to_float("nan"))
+        self.assertIsNone(to_float("n/a"))
+        self.assertIsNone(to_float({}))
+
+    def test_decoded_aliases(self):
+        self.assertEqual(extract_decoded({"gps": {"latitude": "14.7", "lon": -17.4}, "battery_level": 0}), (14.7, -17.4, None, 0.0))
+        self.assertEqual(extract_decoded({"lat": 0, "lng": 0, "gps": {"lat": 1}}), (0.0, 0.0, None, None))
+
+    def test_batch_to_columns(self):
+        payloads = [
+            {"device_eui": " A ", "ts": 1_700_000_000_123, "lat": 1, "lng": "2", "battery_level": 50},
+            {"device_eui": "", "lat": 1, "lng": 2},
+            "oops",
+            {"device_eui": "B", "ts": 1_700_000_001, "lat": 3},
+        ]
+        columns, rejected = normalize_telemetry(payloads, lines=[10, 11, 12, 13])
+        self.assertEqual(rejected, [(11, "Missing device_eui"), (12, "Invalid payload"), (13, "Missing lat/lng")])
+        self.assertEqual(columns.device_eui, ["A"])
+        self.assertEqual((columns.lat, columns.lng, columns.battery, columns.temp), ([1.0], [2.0], [50.0], [None]))
+        self.assertEqual(columns.ts[0].timestamp(), 1_700_000_000.123)
+
+        records = columns.records()
+        self.assertEqual(PointColumns.from_records(records).keys(), columns.keys())
+
+
+class IngestDedupTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+
+    def uplink(self, f_cnt, temp=21):
+        return {
+            "end_device_ids": {"device_id": "drone-dedup", "dev_eui": "DEDUP00000000001"},
+            "received_at": "2026-10-18T10:00:00.123456789Z",
+            "uplink_message": {
+                "f_cnt": f_cnt,
+                "decoded_payload": {"lat": 14.7, "lng": -17.4, "temp": temp},
+                "received_at": f"2026-10-18T10:00:{f_cnt:02d}.123456789Z",
+            },
+        }
+
+    def post_uplink(self, payload):
+        return self.client.post("/api/v1/uplink", json.dumps(payload), content_type="application/json")
+
+    @override_settings(TTN_RAW_PAYLOAD_STORAGE="zlib")
+    def test_raw_payload_is_compressed(self):
+        payload = self.uplink(9)
+        payload["uplink_message"].update({
+            "frm_payload": "AQIDBA==",
+            "consumed_airtime": "0.041216s",
+            "settings": {"data_rate": {"lora": {"spreading_factor": 7}}},
+            "rx_metadata": [{"gateway_ids": {"gateway_id": "gw-1"}, "rssi": -70}],
+        })
+        self.post_uplink(payload)
+        uplink = TTNUplink.objects.get()
+        self.assertIsNone(uplink.raw_payload)
+        self.assertEqual(uplink.raw(), payload)
+        self.assertEqual(
+            (uplink.f_cnt, uplink.gateway_id, uplink.spreading_factor, uplink.airtime, uplink.frm_payload_size),
+            (9, "gw-1", 7, 0.041216, 4),
+        )
+        self.assertEqual(self.client.get(f"/api/v1/uplinks/{uplink.id}/raw/").json(), payload)
+
+    def test_payload_codecs(self):
+        payload = self.uplink(3)
+        self.assertEqual(decompress_payload(compress_payload(payload, "zlib")), payload)
+        self.assertEqual(extract_uplink_fields({})["gateway_id"], None)
+
+    def test_ttn_retry_is_ignored(self):
+        before = dedup_stats()["uplink"]
+        for _ in range(3):
+            self.assertEqual(self.post_uplink(self.uplink(1)).status_code, 200)
+        self.post_uplink(self.uplink(2))
+
+        self.assertEqual(TTNUplink.objects.count(), 2)
+        self.assertEqual(TelemetryPoint.objects.count(), 2)
+        self.assertEqual(sorted(TTNUplink.objects.values_list("f_cnt", flat=True)), [1, 2])
+
+        stats = dedup_stats()["uplink"]
+        self.assertEqual(stats["memory_hits"] - before["memory_hits"], 2)
+
+        # autre process (mémoire vide): la clé en base suffit
+        recent_uplinks.clear()
+        self.post_uplink(self.uplink(1))
+        self.assertEqual(TTNUplink.objects.count(), 2)
+        self.assertEqual(dedup_stats()["uplink"]["db_hits"] - stats["db_hits"], 1)
+
+    def test_expired_key_is_reused(self):
+        self.post_uplink(self.uplink(5))
+        UplinkDedupKey.objects.update(seen_at="2000-01-01T00:00:00Z")
+        recent_uplinks.clear()
+        # compteur de trames remis à zéro (rejoin): nouvelle trame avec un f_cnt déjà vu
+        payload = self.uplink(5, temp=30)
+        payload["uplink_message"]["received_at"] = "2026-10-18T11:00:05Z"
+        self.post_uplink(payload)
+        self.assertEqual(TTNUplink.objects.count(), 2)
+
+    def test_replayed_points_are_ignored(self):
+        points = [
+            {"device_eui": "DEDUP00000000002", "ts": 1_700_000_000_000 + i * 250, "lat": 1, "lng": 2}
+            for i in range(8)
+        ]
+        url = "/api/v1/telemetry/ingest/"
+        self.client.post(url, json.dumps(points), content_type="application/json")
+        # même seconde, millisecondes différentes: 8 points distincts
+        self.assertEqual(TelemetryPoint.objects.count(), 8)
+
+        self.client.post(url, json.dumps(points + points[:2]), content_type="application/json")
+        recent_points.clear()
+        self.client.post(url, json.dumps(points), content_type="application/json")
+        self.assertEqual(TelemetryPoint.objects.count(), 8)
+
+    def point_records(self, n):
+        return [
+            parse_telemetry({"device_eui": "DEDUP00000000003", "ts": 1_700_000_000 + i, "lat": 1, "lng": 2})[0]
+            for i in range(n)
+        ]
+
+    def test_only_inserted_points_are_notified(self):
+        notified = []
+        records = self.point_records(3)
+        with mock.patch("environmentsurveillance.ingest._point_listeners", [notified.extend]):
+            written = save_points(records[:2])
+            self.assertEqual(len(notified), 2)
+            self.assertEqual(sorted(p.id for _, p in written), sorted(TelemetryPoint.objects.values_list("id", flat=True)))
+
+            # autre process (mémoire vide): seul le point nouveau passe aux listeners
+            recent_points.clear()
+            before = dedup_stats()["point"]["db_hits"]
+            written = save_points(records)
+            self.assertEqual([p.ts for _, p in written], [records[2]["point"]["ts"]])
+            self.assertEqual(len(notified), 3)
+            self.assertEqual(dedup_stats()["point"]["db_hits"] - before, 2)
+
+            # uplinks: f_cnt différents, même heure de réception -> un seul point
+            notified.clear()
+            first, second = self.uplink(7), self.uplink(8)
+            second["uplink_message"]["received_at"] = first["uplink_message"]["received_at"]
+            save_uplinks([parse_ttn_uplink(first)[0], parse_ttn_uplink(second)[0]])
+            self.assertEqual(TTNUplink.objects.count(), 2)
+            self.assertEqual(len(notified), 1)
+            self.assertIsNotNone(notified[0][1].id)
+
+    async def test_only_inserted_points_are_notified_async(self):
+        notified = []
+        records = self.point_records(2)
+        with mock.patch("environmentsurveillance.ingest._point_listeners", [notified.extend]):
+            await sync_to_async(save_points)(records[:1])
+            recent_points.clear()
+            written = await asave_points(records)
+        self.assertEqual([p.ts for _, p in written], [records[1]["point"]["ts"]])
+        self.assertEqual(len(notified), 2)
+        seen = await DeviceLastSeen.objects.aget(device__device_eui="DEDUP00000000003")
+        self.assertEqual(seen.last_seen, records[1]["point"]["ts"])
+
+
+class AsyncUplinkAtomicTests(TransactionTestCase):
+    # transactions réelles: on vérifie ce qui est validé après un échec
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+
+    async def test_failed_write_keeps_nothing(self):
+        record, _ = parse_ttn_uplink({
+            "end_device_ids": {"device_id": "drone-atomic", "dev_eui": "ATOMIC0000000001"},
+            "uplink_message": {"f_cnt": 4, "decoded_payload": {"lat": 1, "lng": 2}},
+        })
+        with mock.patch("environmentsurveillance.ingest._insert_points", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                await asave_uplinks([record])
+        self.assertEqual(await TTNUplink.objects.acount(), 0)
+        self.assertEqual(await UplinkDedupKey.objects.acount(), 0)
+
+        # retry TTN: écrit une seule fois
+        await asave_uplinks([record])
+        recent_uplinks.clear()
+        await asave_uplinks([record])
+        self.assertEqual(await TTNUplink.objects.acount(), 1)
+        self.assertEqual(await TelemetryPoint.objects.acount(), 1)
+
+
+# --------------------------
+# Décodage du frm_payload
+# --------------------------
+LAYOUT = {"fields": [("lat", "i", 1e-6), ("lng", "i", 1e-6), ("temp", "h", 0.01), ("flags", "x"), ("battery", "B")]}
+
+
+@override_settings(TTN_PAYLOAD_DECODERS={"layouts": {"v1": LAYOUT}, "f_ports": {2: "v1"}})
+class PayloadDecoderTests(TestCase):
+
+    def uplink(self, frm_payload, f_port=2, decoded_payload=None):
+        return {
+            "end_device_ids": {"device_id": "lora-1", "dev_eui": "DECOD00000000001"},
+            "uplink_message": {"f_port": f_port, "f_cnt": 1, "frm_payload": frm_payload, "decoded_payload": decoded_payload},
+        }
+
+    def test_compiled_layout(self):
+        decode = compile_layout([("lat", "i", 1e-6), ("lng", "i", 1e-6), ("pad", "2x"), ("battery", "B")], ">")
+        self.assertEqual(decode.size, 11)
+        data = struct.pack(">ii2xB", 14_700_001, -17_400_000, 87)
+        self.assertEqual(decode(data), {"lat": 14.700001, "lng": -17.4, "battery": 87})
+        with self.assertRaises(ValueError):
+            decode(data[:5])
+        with self.assertRaises(ValueError):
+            compile_layout([("name", "4s")])
+
+    def test_non_finite_floats_are_null(self):
+        decode = compile_layout([("temp", "e"), ("lat", "f", 0.5), ("lng", "d")])
+        self.assertEqual(decode(struct.pack("<efd", math.nan, math.inf, -math.inf)), {"temp": None, "lat": None, "lng": None})
+        self.assertEqual(decode(struct.pack("<efd", 1.5, 3.0, -17.4)), {"temp": 1.5, "lat": 1.5, "lng": -17.4})
+
+    def test_failing_decoder_is_counted(self):
+        def broken(data, f_port):
+            return {"battery": data[10]}  # IndexError
+
+        registry = DecoderRegistry({"default": broken})
+        with self.assertLogs("environmentsurveillance.decoders", "WARNING"):
+            self.assertIsNone(registry.decode("DECOD00000000001", 2, base64.b64encode(b"\x01").decode()))
+        self.assertEqual((registry.decoded, registry.failed), (0, 1))
+
+    def test_frm_payload_is_decoded(self):
+        frame = base64.b64encode(struct.pack("<iihxB", 14_700_001, -17_400_000, 2150, 87)).decode()
+        record, error = parse_ttn_uplink(self.uplink(frame))
+        self.assertIsNone(error)
+        self.assertEqual(record["decoded_payload"], {"lat": 14.700001, "lng": -17.4, "temp": 21.5, "battery": 87})
+        self.assertEqual((record["point"]["lat"], record["point"]["battery"]), (14.700001, 87.0))
+
+        # autre port: pas de décodeur, pas de point
+        record, _ = parse_ttn_uplink(self.uplink(frame, f_port=3))
+        self.assertIsNone(record["point"])
+
+    def test_ttn_decoded_payload_wins_in_fallback_mode(self):
+        frame = base64.b64encode(struct.pack("<iihxB", 1, 2, 3, 4)).decode()
+        record, _ = parse_ttn_uplink(self.uplink(frame, decoded_payload={"lat": 14.7, "lng": -17.4}))
+        self.assertEqual(record["decoded_payload"], {"lat": 14.7, "lng": -17.4})
+        with override_settings(TTN_PAYLOAD_DECODE="prefer"):
+            record, _ = parse_ttn_uplink(self.uplink(frame, decoded_payload={"lat": 14.7, "lng": -17.4}))
+        self.assertEqual(record["decoded_payload"]["battery"], 4)
+
+    def test_invalid_frame_is_counted(self):
+        failed = get_decoder_registry().failed
+        record, error = parse_ttn_uplink(self.uplink(base64.b64encode(b"\x01\x02").decode()))
+        self.assertIsNone(error)
+        self.assertIsNone(record["decoded_payload"])
+        self.assertEqual(get_decoder_registry().failed, failed + 1)
+
+
+# --------------------------
+# Push SSE
+# --------------------------
+class TelemetryPushTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+
+    def record(self, eui, ts, temp):
+        return {"device_eui": eui, "point": {
+            "ts": datetime.fromtimestamp(ts, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": temp, "battery": None, "rssi": None, "snr": None,
+        }}
+
+    async def test_slow_subscriber_gets_latest_state(self):
+        sub = push_hub.subscribe(["PUSH00000000001"])
+        try:
+            await sync_to_async(save_points)([self.record("PUSH00000000001", 1_700_000_000 + i, i) for i in range(3)])
+            await sync_to_async(save_points)([self.record("PUSH00000000002", 1_700_000_000, 99)])
+            await asyncio.wait_for(sub.event.wait(), 1)
+            self.assertEqual([data["temp"] for data in push_hub.take(sub)], [2.0])
+        finally:
+            push_hub.unsubscribe(sub)
+        self.assertFalse(push_hub.has_subscribers)
+
+    async def test_event_stream(self):
+        response = await self.async_client.get("/api/v1/telemetry/stream/", {"devices": "PUSH00000000001"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 3000\n\n")
+
+        await sync_to_async(save_points)([self.record("PUSH00000000001", 1_700_000_000, 21)])
+        event = (await asyncio.wait_for(anext(stream), 1)).decode()
+        self.assertTrue(event.startswith("event: point\ndata: "))
+        self.assertEqual(json.loads(event.split("data: ", 1)[1])["temp"], 21.0)
+        # déconnexion: le handler ASGI annule la tâche qui attend le flux
+        task = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertFalse(push_hub.has_subscribers)
+
+    def test_event_stream_requires_asgi(self):
+        response = self.client.get("/api/v1/telemetry/stream/")
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(push_hub.has_subscribers)
+
+    async def test_unread_stream_does_not_subscribe(self):
+        response = await self.async_client.get("/api/v1/telemetry/stream/", {"devices": "PUSH00000000001"})
+        # client parti avant le premier octet: le handler ferme la réponse sans l'itérer
+        self.assertFalse(push_hub.has_subscribers)
+        response.close()
+        self.assertFalse(push_hub.has_subscribers)
+
+    async def test_closed_stream_unsubscribes(self):
+        stream = async_views._event_stream(["PUSH00000000001"], heartbeat=15)
+        self.assertEqual(await anext(stream), "retry: 3000\n\n")
+        self.assertTrue(push_hub.has_subscribers)
+        await stream.aclose()
+        self.assertFalse(push_hub.has_subscribers)
+
+
+# --------------------------
+# Requêtes spatiales / géorepères
+# --------------------------
+SQUARE = [[-17.45, 14.65], [-17.35, 14.65], [-17.35, 14.75], [-17.45, 14.75]]
+
+
+class GeoTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        geofence_monitor.invalidate()
+        geofence_monitor._state.clear()
+
+    def save(self, eui, ts, lat, lng):
+        save_points([{"device_eui": eui, "point": {
+            "ts": datetime.fromtimestamp(ts, tz=dt_timezone.utc), "lat": lat, "lng": lng,
+            "temp": None, "battery": None, "rssi": None, "snr": None,
+        }}])
+
+    def test_geohash(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        min_lng, min_lat, max_lng, max_lat = geohash_bbox(geohash_encode(14.7, -17.4))
+        self.assertTrue(min_lng <= -17.4 <= max_lng and min_lat <= 14.7 <= max_lat)
+
+        bbox = (-17.5, 14.6, -17.3, 14.8)
+        cells = covering_cells(bbox)
+        self.assertLessEqual(len(cells), 32)
+        for lat, lng in ((14.6, -17.5), (14.8, -17.3), (14.7, -17.4)):
+            self.assertTrue(any(geohash_encode(lat, lng).startswith(c) for c in cells))
+
+    def test_index_lookup(self):
+        index = GeofenceIndex([
+            (1, "square", Polygon(SQUARE)),
+            (2, "circle", Circle(14.7, -17.4, 1000)),
+            (3, "far", Circle(48.85, 2.35, 1000)),
+        ])
+        self.assertEqual(index.lookup(14.7, -17.4), {1, 2})
+        self.assertEqual(index.lookup(14.74, -17.36), {1})
+        self.assertEqual(index.lookup(0, 0), set())
+
+    def test_area_query(self):
+        self.save("AREA00000000001", 1_700_000_000, 14.700, -17.400)
+        self.save("AREA00000000001", 1_700_000_010, 14.710, -17.400)  # ~1.1 km au nord
+        self.save("AREA00000000002", 1_700_000_020, 15.500, -17.400)
+        self.assertEqual(TelemetryPoint.objects.filter(geohash__isnull=True).count(), 0)
+
+        response = self.client.get("/api/v1/telemetry/area/", {"lat": 14.7, "lng": -17.4, "radius": 500})
+        self.assertEqual([p["ts"] for p in response.json()["points"]], [1_700_000_000])
+
+        response = self.client.get("/api/v1/telemetry/area/", {"bbox": "-17.5,14.6,-17.3,14.8"})
+        self.assertEqual(response.json()["count"], 2)
+
+        polygon = ",".join(str(v) for point in SQUARE for v in point)
+        response = self.client.get("/api/v1/telemetry/area/", {"polygon": polygon, "devices": "AREA00000000002"})
+        self.assertEqual(response.json()["count"], 0)
+
+        self.assertEqual(self.client.get("/api/v1/telemetry/area/", {"bbox": "1,2,3"}).status_code, 400)
+
+    def test_area_out_of_range(self):
+        self.save("AREA00000000001", 1_700_000_000, 14.700, -17.400)
+        started = time.monotonic()
+        response = self.client.get("/api/v1/telemetry/area/", {"bbox": "-1e5,-1e5,1e5,1e5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["count"], 1)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(len(covering_cells((-1e5, -1e5, 1e5, 1e5))), 32)
+
+        for params in ({"bbox": "-inf,0,1,1"}, {"bbox": "nan,0,1,1"},
+                       {"lat": 14.7, "lng": -17.4, "radius": "inf"}, {"lat": 14.7, "lng": -17.4, "radius": 1e9},
+                       {"polygon": "0,0,1,0,inf,1"}):
+            self.assertEqual(self.client.get("/api/v1/telemetry/area/", params).status_code, 400, params)
+        with self.assertRaises(ValueError):
+            covering_cells((-180, -90, 180, 90), max_cells=4)
+
+    def test_monitor_idle_without_listener(self):
+        Geofence.objects.create(name="port", polygon=SQUARE)
+        evaluated = geofence_monitor.evaluated
+        with mock.patch("environmentsurveillance.geofences.load_index") as load:
+            self.save("FENCE0000000002", 1_700_000_000, 14.7, -17.4)
+        load.assert_not_called()
+        self.assertEqual(geofence_monitor.evaluated, evaluated)
+
+    def test_geofence_transitions(self):
+        transitions = []
+        register_geofence_listener(transitions.extend)
+        self.addCleanup(geofence_monitor._listeners.remove, transitions.extend)
+
+        response = self.client.post(
+            "/api/v1/geofences/", json.dumps({"name": "port", "polygon": SQUARE}), content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        fence_id = response.json()["id"]
+
+        self.save("FENCE0000000001", 1_700_000_000, 14.0, -17.4)
+        self.save("FENCE0000000001", 1_700_000_010, 14.7, -17.4)
+        self.save("FENCE0000000001", 1_700_000_020, 14.71, -17.4)
+        self.assertEqual([(eui, set(entered), set(exited)) for eui, _, entered, exited in transitions], [
+            ("FENCE0000000001", {fence_id}, set()),
+        ])
+
+        response = self.client.get(f"/api/v1/geofences/{fence_id}/devices/")
+        self.assertEqual([d["device_eui"] for d in response.json()["devices"]], ["FENCE0000000001"])
+
+        self.save("FENCE0000000001", 1_700_000_030, 14.0, -17.4)
+        self.assertEqual(set(transitions[-1][3]), {fence_id})
+
+        bad = self.client.post("/api/v1/geofences/", json.dumps({"name": "x", "radius": 10}), content_type="application/json")
+        self.assertEqual(bad.status_code, 400)
+
+
+# --------------------------
+# Alertes
+# --------------------------
+class AlertRuleTests(TestCase):
+
+    def run_rule(self, values, **fields):
+        rule = CompiledRule(AlertRule(pk=1, name="r", metric="battery", **fields))
+        return [rule.evaluate("E", ts, v)[0] for ts, v in enumerate(values)]
+
+    def test_debounce_and_hysteresis(self):
+        changes = self.run_rule(
+            [30, 15, 30, 15, 15, 18, 24, 26, 26],
+            operator="lt", threshold=20, clear_threshold=25, debounce=2,
+        )
+        # 15 isolé ignoré; 15, 15 -> déclenchée; 18, 24 sous le seuil de retour; 26, 26 -> résolue
+        self.assertEqual(changes, [None, None, None, None, "firing", None, None, None, "resolved"])
+
+    def test_window_max_and_ewma(self):
+        changes = self.run_rule([10, 50, 10, 10, 10], operator="gt", threshold=40, stat="max", window=2)
+        self.assertEqual(changes, [None, "firing", None, None, "resolved"])
+        changes = self.run_rule([10, 100, 10], operator="gt", threshold=40, stat="ewma", ewma_alpha=0.3)
+        self.assertEqual(changes, [None, None, None])
+
+
+class AlertEngineTests(TransactionTestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        alert_engine.reset()
+
+    def tearDown(self):
+        alert_engine.flush()
+        alert_engine.reset()
+
+    def save(self, ts, battery):
+        save_points([{"device_eui": "ALERT0000000001", "point": {
+            "ts": datetime.fromtimestamp(ts, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": None, "battery": battery, "rssi": None, "snr": None,
+        }}])
+
+    def test_alert_lifecycle(self):
+        response = self.client.post("/api/v1/alerts/rules/", json.dumps({
+            "name": "batterie faible", "metric": "battery", "operator": "lt",
+            "threshold": 20, "clear_threshold": 25, "severity": "critical",
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+        self.save(1_700_000_000, 50)
+        self.save(1_700_000_010, 10)
+        alert_engine.flush()
+        active = self.client.get("/api/v1/alerts/active/").json()
+        self.assertEqual([a["device_eui"] for a in active["alerts"]], ["ALERT0000000001"])
+
+        # redémarrage du process: l'alerte active est reprise, pas de second "firing"
+        alert_engine.reset()
+        self.save(1_700_000_020, 12)
+        self.save(1_700_000_030, 30)
+        alert_engine.flush()
+
+        events = self.client.get("/api/v1/alerts/events/").json()["events"]
+        self.assertEqual([(e["state"], e["value"]) for e in events], [("resolved", 30.0), ("firing", 10.0)])
+        self.assertEqual(self.client.get("/api/v1/alerts/active/").json()["count"], 0)
+
+    def test_invalid_rule(self):
+        response = self.client.post("/api/v1/alerts/rules/", json.dumps({
+            "name": "x", "metric": "humidity", "operator": "lt", "threshold": 1,
+        }), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("metric", response.json()["fields"])
+
+    def test_rules_load_failure(self):
+        with mock.patch.object(AlertRule.objects, "filter", side_effect=RuntimeError("db down")):
+            with self.assertLogs("environmentsurveillance.alerts", "ERROR"):
+                self.assertEqual(alert_engine.rules()["by_id"], {})
+                self.save(1_700_000_000, 10)  # l'ingest passe sans règles
+        AlertRule.objects.create(name="r", metric="battery", operator="lt", threshold=20)
+        self.assertEqual(len(alert_engine.rules()["by_id"]), 1)
+
+    def test_active_alert_keys(self):
+        rule = AlertRule.objects.create(name="r", metric="battery", operator="lt", threshold=20)
+        self.save(1_700_000_000, 50)
+        a = Device.objects.get(device_eui="ALERT0000000001")
+        b = Device.objects.create(device_eui="ALERT0000000002")
+        for device, ts, state in ((a, 1, "firing"), (a, 2, "resolved"), (b, 1, "resolved"), (b, 2, "firing")):
+            AlertEvent.objects.create(
+                rule=rule, device=device, state=state, value=1, threshold=20, ts=datetime.fromtimestamp(ts, tz=dt_timezone.utc),
+            )
+        self.assertEqual(active_alert_keys(), [(rule.pk, "ALERT0000000002")])
+        self.assertEqual(active_alert_keys([rule.pk + 1]), [])
+
+
+class DeviceLastSeenTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+
+    def save(self, eui, ts, rssi):
+        save_points([{"device_eui": eui, "point": {
+            "ts": datetime.fromtimestamp(ts, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": None, "battery": None, "rssi": rssi, "snr": None,
+        }}])
+
+    def test_upsert_at_ingest(self):
+        self.save("SEEN00000000001", 1_700_000_010, -80)
+        self.save("SEEN00000000001", 1_700_000_000, -90)  # point en retard: last_seen ne recule pas
+        self.save("SEEN00000000001", 1_700_000_020, None)
+        seen = DeviceLastSeen.objects.get(device__device_eui="SEEN00000000001")
+        self.assertEqual(seen.last_seen.timestamp(), 1_700_000_020)
+        self.assertEqual(seen.last_rssi, -80)
+
+    def test_updated_at_is_server_time(self):
+        before = timezone.now()
+        # ts client dans le futur: n'avance pas le watermark de --watch
+        self.save("SEEN00000000001", time.time() + 86400 * 365, -80)
+        self.save("SEEN00000000002", time.time() - 60, -70)
+        changed = DeviceLastSeen.objects.filter(updated_at__gte=before, updated_at__lte=timezone.now())
+        self.assertEqual(
+            sorted(changed.values_list("device__device_eui", flat=True)), ["SEEN00000000001", "SEEN00000000002"],
+        )
+
+    async def test_async_ingest(self):
+        await asave_points([{"device_eui": "SEEN00000000004", "point": {
+            "ts": datetime.fromtimestamp(1_700_000_000, tz=dt_timezone.utc), "lat": 14.7, "lng": -17.4,
+            "temp": None, "battery": None, "rssi": -75.0, "snr": None,
+        }}])
+        seen = await DeviceLastSeen.objects.aget(device__device_eui="SEEN00000000004")
+        self.assertEqual((seen.last_seen.timestamp(), seen.last_rssi), (1_700_000_000, -75.0))
+
+    def test_stale_endpoint(self):
+        now = time.time()
+        self.save("SEEN00000000001", now - 3600, -80)
+        self.save("SEEN00000000002", now - 10, -70)
+        Device.objects.create(device_eui="SEEN00000000003", name="jamais vu")
+
+        data = self.client.get("/api/v1/devices/stale/", {"after": 600}).json()
+        self.assertEqual([d["device_eui"] for d in data["devices"]], ["SEEN00000000001"])
+        self.assertGreaterEqual(data["devices"][0]["silent_for"], 3600)
+
+        data = self.client.get("/api/v1/devices/stale/", {"after": 600, "include_never": 1}).json()
+        self.assertEqual([d["device_eui"] for d in data["devices"]], ["SEEN00000000001", "SEEN00000000003"])
+
+    def test_tracker(self):
+        tracker = StaleTracker(after=60)
+        tracker.update("A", 1000)
+        tracker.update("B", 1030)
+        tracker.update("A", 1020)  # l'ancienne échéance de A (1060) devient périmée
+        self.assertEqual(tracker.expired(1070), [])
+        self.assertEqual(tracker.expired(1080), [("A", 1020)])
+        self.assertEqual(tracker.expired(1200), [("B", 1030)])
+        self.assertEqual(tracker.expired(1300), [])
+        self.assertTrue(tracker.update("A", 1250))  # de retour
+        self.assertEqual(tracker.stale, {"B"})
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        reset_metrics()
+
+    def test_view_metrics(self):
+        body = json.dumps({"device_eui": "METRIC000000001", "ts": 1_700_000_000, "lat": 14.7, "lng": -17.4})
+        self.client.post("/api/v1/telemetry/ingest/", body, content_type="application/json")
+        self.client.get("/api/v1/telemetry/history/METRIC000000001/")
+        self.client.get("/api/nowhere/")
+
+        response = self.client.get("/metrics")
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        text = response.content.decode()
+        self.assertIn('es_http_requests_total{view="telemetry_ingest",method="POST",status="200"} 1', text)
+        self.assertIn('es_http_requests_total{view="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('es_http_request_duration_seconds_count{view="telemetry_history"} 1', text)
+        self.assertIn(f'es_http_request_size_bytes_sum{{view="telemetry_ingest"}} {len(body)}', text)
+        queries = [line for line in text.splitlines() if line.startswith('es_http_db_queries_sum{view="telemetry_ingest"}')]
+        self.assertGreater(float(queries[0].split()[-1]), 0)
+
+
+class FleetBenchmarkTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        recent_uplinks.clear()
+
+    def test_fleet_is_deterministic(self):
+        start = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        euis = make_fleet_euis(3)
+        first = list(fleet_uplinks(euis, 4, start=start, seed=7))
+        self.assertEqual(first, list(fleet_uplinks(euis, 4, start=start, seed=7)))
+        self.assertNotEqual(first, list(fleet_uplinks(euis, 4, start=start, seed=8)))
+        self.assertEqual(len(first), 12)
+        # ordre chronologique de réception
+        received = [p["received_at"] for p in first]
+        self.assertEqual(received[::3], sorted(received[::3]))
+
+    def test_uplink_variants_parse(self):
+        rng = random.Random(1)
+        shapes = set()
+        for payload in fleet_uplinks(make_fleet_euis(5), 20, seed=1):
+            expected = payload["uplink_message"]["decoded_payload"]
+            payload = vary_uplink(payload, rng)
+            record, error = parse_ttn_uplink(payload)
+            self.assertIsNone(error)
+            decoded = payload["uplink_message"].get("decoded_payload")
+            shapes.add(tuple(sorted(decoded)) if decoded else "raw")
+            if decoded is None:
+                self.assertIsNone(record["point"])
+            else:
+                self.assertEqual((record["point"]["lat"], record["point"]["lng"], record["point"]["temp"]),
+                                 (expected["latitude"], expected["longitude"], expected["temp"]))
+            self.assertEqual(record["rssi"], payload["uplink_message"]["rx_metadata"][0]["rssi"])
+        self.assertEqual(len(shapes), 4)
+
+    def test_benchmark_suite(self):
+        self.assertEqual(generate_fleet(2, 5, seed=0), 10)
+        self.assertEqual(TTNUplink.objects.count(), 10)
+        self.assertEqual(TelemetryPoint.objects.count(), 10)
+
+        ctx = BenchContext(make_fleet_euis(2))
+        for name, build_request in benchmarks(history_limits=(10,)).items():
+            result = run_benchmark(build_request, ctx, iterations=3, warmup=1)
+            self.assertEqual(result["errors"], 0, name)
+            self.assertEqual(result["requests"], 3)
+        self.assertEqual(TTNUplink.objects.count(), 14)
+
+    def test_current_db_skips_writes(self):
+        generate_fleet(2, 5, seed=0)
+        baseline = {"results": [
+            {"name": "telemetry_latest", "rps": 100.0, "p50_ms": None, "p99_ms": 2.0, "queries_mean": 1.0},
+        ]}
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as f:
+            json.dump(baseline, f)
+            f.flush()
+            out = io.StringIO()
+            # --iterations 0: percentiles None, écarts partiels -> affichés "-"
+            call_command(
+                "bench_views", current_db=True, devices=2, iterations=0, warmup=0, limits="10",
+                compare=f.name, stdout=out,
+            )
+        text = out.getvalue()
+        self.assertIn("ttn_uplink, telemetry_ingest ignorés", text)
+        self.assertNotIn("\nttn_uplink ", text)
+        self.assertRegex(text, r"telemetry_latest +0\.0 req/s  p50 +- ms  p99 +- ms  SQL +-")
+        self.assertRegex(text, r"telemetry_latest +rps +-100\.0 %  p50 +- %  p99 +- %")
+        self.assertEqual(TTNUplink.objects.count(), 10)
+
+        call_command(
+            "bench_views", current_db=True, include_writes=True, devices=2, iterations=2, warmup=0,
+            limits="10", benchmark=["ttn_uplink"], stdout=io.StringIO(),
+        )
+        self.assertEqual(TTNUplink.objects.count(), 12)
+
+
+class ReplayServer:
+    """
+    Serveur HTTP/1.1 keep-alive minimal pour run_replay: enregistre les corps
+    reçus, répond 503 à la première tentative des corps listés dans `fail_once`.
+    """
+
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.bodies = []
+        self.times = []
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                body = await reader.readexactly(length)
+                self.bodies.append(body)
+                self.times.append(time.perf_counter())
+                status = b"200 OK"
+                if body in self.fail_once:
+                    self.fail_once.discard(body)
+                    status = b"503 Service Unavailable"
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def replay(self, bodies, **kwargs):
+        server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await run_replay(f"http://127.0.0.1:{port}/api", bodies, **kwargs)
+
+
+class ReplayTests(SimpleTestCase):
+
+    def test_pacing(self):
+        server = ReplayServer()
+        bodies = [json.dumps({"n": i}).encode() for i in range(10)]
+        summary = asyncio.run(server.replay(iter(bodies), concurrency=4, rate=50, seed=0))
+        self.assertEqual(summary["sent"], 10)
+        self.assertEqual(summary["ok"], 10)
+        self.assertTrue(summary["exhausted"])
+        self.assertEqual(sorted(server.bodies), sorted(bodies))
+        # 10 webhooks à 50/s: ~0.18 s entre le premier et le dernier envoi
+        self.assertGreaterEqual(server.times[-1] - server.times[0], 0.15)
+        self.assertLess(summary["rps"], 60)
+
+    def test_duplicates_and_retries(self):
+        bodies = [json.dumps({"n": i}).encode() for i in range(5)]
+        server = ReplayServer(fail_once=bodies[:2])
+        summary = asyncio.run(server.replay(iter(bodies), concurrency=1, duplicate_rate=1.0, retries=2, seed=0))
+        self.assertEqual(summary["duplicates"], 5)
+        self.assertEqual(summary["sent"], 10)
+        # un 503 par corps de fail_once, puis succès à la seconde tentative
+        self.assertEqual(summary["retried"], 2)
+        self.assertEqual(len(server.bodies), 12)
+        self.assertEqual(summary["statuses"], {"200": 10})
+        self.assertEqual(summary["errors"], 0)
+
+    def test_retries_exhausted(self):
+        body = b'{"n": 0}'
+        server = ReplayServer(fail_once=[body])
+        summary = asyncio.run(server.replay(iter([body]), concurrency=1, retries=0))
+        self.assertEqual(summary["retried"], 0)
+        self.assertEqual(summary["statuses"], {"503": 1})
+        self.assertEqual(summary["errors"], 1)
+
+    def test_duration_cuts_stream(self):
+        server = ReplayServer()
+        bodies = (json.dumps({"n": i}).encode() for i in range(1000))
+        summary = asyncio.run(server.replay(bodies, concurrency=2, rate=100, duration=0.2))
+        self.assertFalse(summary["exhausted"])
+        self.assertLess(summary["sent"], 40)
+        self.assertGreaterEqual(summary["feed_duration"], 0.19)
+
+
+class HistoryFormatTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        save_points([{"device_eui": "FORMAT000000001", "point": {
+            "ts": datetime.fromtimestamp(1_700_000_000 + i, tz=dt_timezone.utc), "lat": 14.7 + i / 1000,
+            "lng": -17.4, "temp": None if i == 1 else 25.5, "battery": 3900.0, "rssi": -80.0, "snr": 7.5,
+        }} for i in range(3)])
+        self.url = "/api/v1/telemetry/history/FORMAT000000001/"
+
+    def test_columns(self):
+        expected = self.client.get(self.url).json()["history"]
+        response = self.client.get(self.url, HTTP_ACCEPT="application/vnd.es.columns+json")
+        self.assertEqual(response["Content-Type"], "application/vnd.es.columns+json")
+        self.assertIn("Accept", response["Vary"])
+        columns = response.json()["columns"]
+        self.assertEqual(columns["ts"], [p["ts"] for p in expected])
+        self.assertEqual(columns["temp"], [25.5, None, 25.5])
+
+    def test_binary(self):
+        expected = self.client.get(self.url, {"format": "columns"}).json()
+        response = self.client.get(self.url, {"format": "binary", "limit": 2})
+        header, columns = unpack_history(response.content)
+        self.assertEqual(header["count"], 2)
+        self.assertIsNotNone(header["nextCursor"])
+        self.assertEqual(columns["ts"], expected["columns"]["ts"][1:])
+        self.assertEqual(columns["lat"], expected["columns"]["lat"][1:])
+        self.assertTrue(math.isnan(columns["temp"][0]))
+        # colonnes 64 bits alignées sur 8 octets
+        self.assertEqual((4 + len(response.content) - 2 * (8 * 3 + 4 * 4)) % 8, 4)
+
+    def test_polyline(self):
+        # exemple de la documentation Google
+        encoded = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+        track = [[38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]]
+        self.assertEqual(encode_polyline(track, 5), encoded)
+        self.assertEqual(decode_polyline(encoded, 5, 2), track)
+
+        rng = random.Random(3)
+        lats = [round(14.7 + rng.uniform(-1, 1), 7) for _ in range(200)]
+        ts = sorted(rng.randrange(1_700_000_000, 1_700_100_000) for _ in range(200))
+        for precision in (1, 5, 7):
+            decoded = decode_polyline(encode_polyline([lats], precision), precision)[0]
+            self.assertTrue(all(abs(a - b) <= 0.5 / 10 ** precision + 1e-12 for a, b in zip(lats, decoded)))
+        self.assertEqual(decode_polyline(encode_polyline([ts], 0), 0)[0], ts)
+
+    def test_polyline_response(self):
+        expected = self.client.get(self.url, {"format": "columns"}).json()["columns"]
+        response = self.client.get(self.url, {"format": "polyline", "precision": 6})
+        self.assertEqual(response["Content-Type"], "application/vnd.es.polyline+json")
+        data = response.json()
+        self.assertEqual(data["precision"]["latlng"], 6)
+        self.assertEqual(data["nulls"], {"temp": [1]})
+        decoded = decode_track(data)
+        self.assertEqual(decoded.keys(), expected.keys())
+        for field, values in expected.items():
+            for value, result in zip(values, decoded[field]):
+                if value is None:
+                    self.assertIsNone(result)
+                else:
+                    self.assertAlmostEqual(value, result, places=6)
+
+
+# --------------------------
+# Sous-échantillonnage
+# --------------------------
+class DownsampleTests(TestCase):
+
+    def setUp(self):
+        device_registry.clear()
+        recent_points.clear()
+        self.url = "/api/v1/telemetry/history/DOWNS0000000001/"
+
+    def save_track(self, n, start=1_700_000_000):
+        save_points([{"device_eui": "DOWNS0000000001", "point": {
+            "ts": datetime.fromtimestamp(start + i, tz=dt_timezone.utc), "lat": 14.7 + math.sin(i / 50) / 100,
+            "lng": -17.4 + i / 100000, "temp": 25 + math.sin(i / 20), "battery": None, "rssi": -80.0, "snr": None,
+        }} for i in range(n)])
+
+    def test_resolution_without_max_points_is_capped(self):
+        self.save_track(6000)
+        data = self.client.get(self.url, {"resolution": 1}).json()
+        self.assertTrue(data["downsampled"])
+        self.assertEqual(data["sourceCount"], 6000)
+        self.assertLessEqual(data["count"], 5000)
+        self.assertEqual(data["history"][0]["ts"], 1_700_000_000)
+        self.assertEqual(data["history"][-1]["ts"], 1_700_005_999)
+
+    def test_track_and_series_limits(self):
+        t = np.arange(1000, dtype=float)
+        v = np.sin(t / 30)
+        v[500] = 10  # pic isolé: gardé par LTTB
+        idx = lttb(t, v, 50)
+        self.assertEqual(len(idx), 50)
+        self.assertEqual((idx[0], idx[-1]), (0, 999))
+        self.assertTrue(np.all(np.diff(idx) > 0))
+        self.assertIn(500, idx)
+        self.assertEqual(lttb(t, v, 2).tolist(), [0, 999])
+        self.assertEqual(len(lttb(t, v, 5000)), 1000)
+
+        # trace en L: le coin est le point le plus important après les extrémités
+        lat = np.concatenate([np.linspace(14.0, 14.1, 100), np.full(100, 14.1)])
+        lng = np.concatenate([np.full(100, -17.4), np.linspace(-17.4, -17.3, 100)])
+        self.assertEqual(simplify_track(lat, lng, 3).tolist(), [0, 99, 199])
+
+        columns = {"ts": t, "lat": 14 + v / 100, "lng": -17.4 + t / 1e5}
+        columns.update({f: np.full(1000, np.nan) for f in SENSOR_FIELDS})
+        columns["temp"] = v
+        self.assertLessEqual(len(select_indices(columns, 100)), 100)
+
+    def test_max_points(self):
+        self.save_track(3000)
+        data = self.client.get(self.url, {"maxPoints": 200}).json()
+        self.assertTrue(data["downsampled"])
+        self.assertEqual(data["sourceCount"], 3000)
+        self.assertLessEqual(data["count"], 200)
+        self.assertGreater(data["count"], 100)
+        ts = [p["ts"] for p in data["history"]]
+        self.assertEqual(ts, sorted(ts))
+        self.assertEqual(ts[0], 1_700_000_000)
+        # maxPoints borné à 2 au minimum
+        self.assertLessEqual(self.client.get(self.url, {"maxPoints": 1}).json()["count"], 2)
+
+    def test_resolution_buckets(self):
+        self.save_track(600, start=1_699_999_980)  # buckets alignés sur l'epoch
+        data = self.client.get(self.url, {"resolution": 60}).json()
+        self.assertEqual(data["resolution"], 60)
+        self.assertEqual(data["count"], 10)
+        # moyenne du premier bucket de 60 s
+        self.assertAlmostEqual(data["history"][0]["temp"], float(np.mean(25 + np.sin(np.arange(60) / 20))), 4)
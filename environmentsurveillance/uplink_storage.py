@@ -0,0 +1,106 @@
+"""
+Stockage des webhooks TTN bruts et extraction des champs radio.
+
+TTN_RAW_PAYLOAD_STORAGE:
+  "json" : raw_payload en jsonb (historique)
+  "zlib" : raw_payload_compressed = JSON compressé zlib, raw_payload = NULL
+  "lz4"  : idem en lz4 (paquet `lz4`), plus rapide, un peu moins compact
+
+Le 1er octet du blob indique le codec: un blob se relit quel que soit le
+réglage courant (lignes écrites avant un changement de mode, backfill).
+"""
+import base64
+import json
+import re
+import zlib
+
+from django.conf import settings
+
+
+CODEC_TAGS = {"zlib": b"z", "lz4": b"4"}
+
+ZLIB_LEVEL = 6
+
+
+def storage_mode():
+    return getattr(settings, "TTN_RAW_PAYLOAD_STORAGE", "json")
+
+
+def _lz4():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise RuntimeError("TTN_RAW_PAYLOAD_STORAGE = 'lz4' requires the lz4 package")
+    return lz4.frame
+
+
+def compress_payload(payload, codec):
+    data = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if codec == "zlib":
+        return CODEC_TAGS["zlib"] + zlib.compress(data, ZLIB_LEVEL)
+    if codec == "lz4":
+        return CODEC_TAGS["lz4"] + _lz4().compress(data)
+    raise ValueError(f"Unknown payload codec: {codec}")
+
+
+def decompress_payload(blob):
+    blob = bytes(blob)  # memoryview (psycopg) -> bytes
+    tag, data = blob[:1], blob[1:]
+    if tag == CODEC_TAGS["zlib"]:
+        data = zlib.decompress(data)
+    elif tag == CODEC_TAGS["lz4"]:
+        data = _lz4().decompress(data)
+    else:
+        raise ValueError(f"Unknown payload codec tag: {tag!r}")
+    return json.loads(data)
+
+
+def storage_fields(payload, mode=None):
+    """
+    -> {"raw_payload": ..., "raw_payload_compressed": ...} selon le mode
+    """
+    mode = mode or storage_mode()
+    if mode == "json":
+        return {"raw_payload": payload, "raw_payload_compressed": None}
+    return {"raw_payload": None, "raw_payload_compressed": compress_payload(payload, mode)}
+
+
+# --------------------------
+# Champs extraits
+# --------------------------
+_DURATION_RE = re.compile(r"^\s*([0-9.]+)\s*s\s*$")
+
+
+def _airtime(value):
+    # "0.056576s" (durée protobuf JSON) -> secondes
+    if not isinstance(value, str):
+        return None
+    m = _DURATION_RE.match(value)
+    return float(m.group(1)) if m else None
+
+
+def _frm_payload_size(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return len(base64.b64decode(value, validate=True))
+    except ValueError:
+        return None
+
+
+def extract_uplink_fields(payload):
+    """
+    Colonnes typées de TTNUplink à partir du webhook TTN v3.
+    """
+    uplink = payload.get("uplink_message", {}) or {}
+    rx_metadata = uplink.get("rx_metadata", []) or []
+    gateway_ids = (rx_metadata[0].get("gateway_ids", {}) or {}) if rx_metadata else {}
+    lora = ((uplink.get("settings", {}) or {}).get("data_rate", {}) or {}).get("lora", {}) or {}
+
+    spreading_factor = lora.get("spreading_factor")
+    return {
+        "gateway_id": (gateway_ids.get("gateway_id") or "")[:64] or None,
+        "spreading_factor": spreading_factor if isinstance(spreading_factor, int) else None,
+        "airtime": _airtime(uplink.get("consumed_airtime")),
+        "frm_payload_size": _frm_payload_size(uplink.get("frm_payload")),
+    }
@@ -6,30 +6,61 @@ from .views import (
     # IoT / TTN
     ttn_uplink,
     join,
+    ingest_stats,
 
     # Devices
     device_list,
+    device_stale,
     ajouter_device,
     modifier_device,
     delete_device,
 
     # Uplinks
     list_ttn_uplinks,
+    uplink_raw,
     supprimer_uplink,
 
     # Telemetry API (Angular)
     telemetry_latest,
+    telemetry_latest_all,
     telemetry_history,
     telemetry_ingest,
+    telemetry_rollup,
+    telemetry_area,
+
+    # Géorepères
+    geofence_list,
+    geofence_detail,
+    geofence_devices,
+
+    # Alertes
+    alert_rule_list,
+    alert_rule_detail,
+    alert_events,
+    alerts_active,
 )
 
+# flux SSE: toujours async, 501 hors ASGI
+from .async_views import telemetry_stream
+
+if getattr(settings, "TELEMETRY_VIEWS", "sync") == "async":
+    # vues natives async (ASGI): mêmes URL, mêmes réponses
+    from .async_views import (
+        telemetry_history_async as telemetry_history,
+        telemetry_ingest_async as telemetry_ingest,
+        telemetry_latest_async as telemetry_latest,
+        ttn_uplink_async as ttn_uplink,
+    )
+
 urlpatterns = [
     # --- IoT ---
     path('v1/uplink', ttn_uplink, name='iot_uplink'),
     path('v1/join', join, name='iot_join'),
+    path('v1/ingest/stats/', ingest_stats, name='ingest_stats'),
 
     # --- Devices ---
     path('device', device_list, name='device_list'),
+    path('v1/devices/stale/', device_stale, name='device_stale'),
     path('ajouter_device', ajouter_device, name='ajouter_device'),
     path('modifier_device/<str:device_eui>/', modifier_device, name='modifier_device'),
     path('delete_device/<str:device_eui>/', delete_device, name='delete_device'),
@@ -37,11 +68,27 @@ urlpatterns = [
     # --- Uplinks ---
     path('list_ttn_uplinks', list_ttn_uplinks, name='list_ttn_uplinks'),
     path('surprimer_uplink/<int:uplink_id>/', supprimer_uplink, name='supprimer_uplink'),
+    path('v1/uplinks/<int:uplink_id>/raw/', uplink_raw, name='uplink_raw'),
 
     # --- Telemetry API ---
-    path('v1/telemetry/latest/<str:device_eui>/', telemetry_latest),
-    path('v1/telemetry/history/<str:device_eui>/', telemetry_history),
-    path('v1/telemetry/ingest/', telemetry_ingest),
+    path('v1/telemetry/latest/', telemetry_latest_all, name='telemetry_latest_all'),
+    path('v1/telemetry/latest/<str:device_eui>/', telemetry_latest, name='telemetry_latest'),
+    path('v1/telemetry/history/<str:device_eui>/', telemetry_history, name='telemetry_history'),
+    path('v1/telemetry/ingest/', telemetry_ingest, name='telemetry_ingest'),
+    path('v1/telemetry/stream/', telemetry_stream, name='telemetry_stream'),
+    path('v1/telemetry/rollup/<str:device_eui>/', telemetry_rollup, name='telemetry_rollup'),
+    path('v1/telemetry/area/', telemetry_area, name='telemetry_area'),
+
+    # --- Géorepères ---
+    path('v1/geofences/', geofence_list, name='geofence_list'),
+    path('v1/geofences/<int:geofence_id>/', geofence_detail, name='geofence_detail'),
+    path('v1/geofences/<int:geofence_id>/devices/', geofence_devices, name='geofence_devices'),
+
+    # --- Alertes ---
+    path('v1/alerts/rules/', alert_rule_list, name='alert_rule_list'),
+    path('v1/alerts/rules/<int:rule_id>/', alert_rule_detail, name='alert_rule_detail'),
+    path('v1/alerts/events/', alert_events, name='alert_events'),
+    path('v1/alerts/active/', alerts_active, name='alerts_active'),
 ]
 
 if settings.DEBUG:
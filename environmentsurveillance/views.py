@@ -1,43 +1,52 @@
 import json
 import random
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
-
-from .models import Device, TTNUplink, TelemetryPoint
-
-
-
-# --------------------------
-# Helpers
-# --------------------------
-import re
-
-def _to_float(v):
-    
-    if v is None:
-        return None
-
-    # Déjà numérique
-    if isinstance(v, (int, float)):
-        return float(v)
-
-    # String: extraire le 1er nombre valide
-    if isinstance(v, str):
-        m = re.search(r'[-+]?\d+(\.\d+)?', v)
-        if not m:
-            return None
-        try:
-            return float(m.group(0))
-        except ValueError:
-            return None
-
-    # Autres types
-    try:
-        return float(v)
-    except (TypeError, ValueError):
-        return None
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from .alerts import active_alert_keys, alert_engine
+from .decoders import get_decoder_registry
+from .dedup import dedup_stats
+from .geo import parse_shape
+from .geofences import geofence_monitor
+from .device_registry import device_registry
+from .downsample import MAX_POINTS, downsample_history
+from .exports import (
+    EXPORT_CONTENT_TYPES,
+    decode_cursor,
+    encode_cursor,
+    keyset_before,
+    streaming_export,
+)
+from .ingest import (
+    get_uplink_buffer,
+    ingest_is_buffered,
+    parse_telemetry,
+    parse_ttn_uplink,
+    save_points,
+    save_uplinks,
+)
+from .history_formats import history_columns, history_response, negotiate_history_format
+from .ingest_batch import IngestBodyError, ingest_telemetry_batch, read_telemetry_body
+from .lastseen import stale_devices
+from .metrics import render_metrics
+from .latest_cache import latest_points
+from .models import AlertEvent, AlertRule, Device, Geofence, TTNUplink
+from .push import push_stats
+from .queries import (
+    HISTORY_COLUMNS,
+    UPLINK_COLUMNS,
+    area_queryset,
+    history_queryset,
+    latest_all_queryset,
+    latest_point_queryset,
+    uplinks_queryset,
+)
+from .rollups import read_rollups
 
 
 
@@ -48,37 +57,6 @@ def generate_device_eui():
             return eui
 
 
-def _extract_gps(decoded_payload: dict):
-    """
-    Accepte plusieurs formats:
-      - {"lat": ..., "lng": ...}
-      - {"latitude": ..., "longitude": ...}
-      - {"gps": {"lat":..., "lng":...}}
-    """
-    if not isinstance(decoded_payload, dict):
-        return None, None
-
-    # direct
-    lat = decoded_payload.get("lat")
-    lng = decoded_payload.get("lng")
-
-    # alternative keys
-    if lat is None:
-        lat = decoded_payload.get("latitude")
-    if lng is None:
-        lng = decoded_payload.get("longitude")
-
-    # nested gps
-    gps = decoded_payload.get("gps")
-    if (lat is None or lng is None) and isinstance(gps, dict):
-        if lat is None:
-            lat = gps.get("lat") or gps.get("latitude")
-        if lng is None:
-            lng = gps.get("lng") or gps.get("lon") or gps.get("longitude")
-
-    return _to_float(lat), _to_float(lng)
-
-
 # --------------------------
 # TTN uplink
 # --------------------------
@@ -90,63 +68,20 @@ def ttn_uplink(request):
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
-    # ---- Extract identifiers ----
-    end_device_ids = payload.get("end_device_ids", {}) or {}
-    device_eui = end_device_ids.get("dev_eui")
-    device_name = end_device_ids.get("device_id") or "unknown-device"
-    application_id = (end_device_ids.get("application_ids", {}) or {}).get("application_id")
-
-    if not device_eui:
-        return JsonResponse({"error": "Missing dev_eui in payload"}, status=400)
+    record, error = parse_ttn_uplink(payload)
+    if error:
+        return JsonResponse({"error": error}, status=400)
 
-    device, _ = Device.objects.get_or_create(
-        device_eui=device_eui,
-        defaults={"name": device_name}
-    )
-    # si le device existe déjà et qu’il n’a pas de nom correct, tu peux le mettre à jour
-    if device.name != device_name and device_name != "unknown-device":
-        device.name = device_name
-        device.save(update_fields=["name"])
-
-    uplink = payload.get("uplink_message", {}) or {}
-
-    decoded_payload = uplink.get("decoded_payload")
-    f_port = uplink.get("f_port")
-
-    # ---- Extract radio metadata (best gateway) ----
-    rssi = None
-    snr = None
-    rx_metadata = uplink.get("rx_metadata", []) or []
-    if rx_metadata:
-        rssi = rx_metadata[0].get("rssi")
-        snr = rx_metadata[0].get("snr")
-
-    # ---- Save uplink to DB ----
-    TTNUplink.objects.create(
-        device=device,
-        application_id=application_id or "",
-        raw_payload=payload,
-        decoded_payload=decoded_payload,
-        rssi=_to_float(rssi),
-        snr=_to_float(snr),
-        f_port=f_port,
-    )
+    # ---- Mode "buffered": file d'attente + écriture par lots ----
+    if ingest_is_buffered():
+        if not get_uplink_buffer().offer(record):
+            response = JsonResponse({"error": "Ingest queue full"}, status=503)
+            response["Retry-After"] = "1"
+            return response
+        return JsonResponse({"status": "queued"}, status=202)
 
-    # ---- Save telemetry point if GPS exists ----
-    if isinstance(decoded_payload, dict):
-        lat, lng = _extract_gps(decoded_payload)
-
-        if lat is not None and lng is not None:
-            TelemetryPoint.objects.create(
-                device=device,
-                lat=lat,
-                lng=lng,
-                temp=_to_float(decoded_payload.get("temp")),
-                battery=_to_float(decoded_payload.get("battery") or decoded_payload.get("battery_level")),
-                rssi=_to_float(rssi),
-                snr=_to_float(snr),
-                ts=timezone.now()
-            )
+    # ---- Mode "sync": écriture immédiate ----
+    save_uplinks([record])
 
     return JsonResponse({"status": "ok"})
 
@@ -155,6 +90,33 @@ def join(request):
     return JsonResponse({"status": "join received"})
 
 
+@require_GET
+def ingest_stats(request):
+    """
+    GET /api/v1/ingest/stats/
+    Compteurs du process: déduplication (taux de doublons), registre des devices,
+    décodeurs de frm_payload, push temps réel, géorepères, alertes, file d'ingest.
+    """
+    return JsonResponse({
+        "dedup": dedup_stats(),
+        "device_registry": device_registry.stats(),
+        "decoders": get_decoder_registry().stats(),
+        "push": push_stats(),
+        "geofences": geofence_monitor.stats(),
+        "alerts": alert_engine.stats(),
+        "uplink_buffer": get_uplink_buffer().stats() if ingest_is_buffered() else None,
+    })
+
+
+@require_GET
+def metrics(request):
+    """
+    GET /metrics
+    Latence, requêtes SQL, temps DB et tailles par vue (voir metrics.py), format Prometheus.
+    """
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # --------------------------
 # Devices
 # --------------------------
@@ -165,6 +127,19 @@ def device_list(request):
     return JsonResponse({"devices": data})
 
 
+@require_GET
+def device_stale(request):
+    """
+    GET /api/v1/devices/stale/?after=900&include_never=1
+    Devices actifs sans point depuis plus de `after` secondes (DEVICE_STALE_AFTER par défaut),
+    lus dans DeviceLastSeen (index sur last_seen), les plus anciens d'abord.
+    """
+    after = _parse_positive(request.GET.get("after"), int)
+    include_never = request.GET.get("include_never") in ("1", "true")
+    devices = stale_devices(after=after, include_never_seen=include_never)
+    return JsonResponse({"count": len(devices), "devices": devices})
+
+
 @csrf_exempt
 def ajouter_device(request):
     if request.method != "POST":
@@ -247,24 +222,73 @@ def delete_device(request, device_eui):
 # --------------------------
 # Uplinks list
 # --------------------------
+UPLINK_EXPORT_FIELDS = (
+    "device_eui", "device_name", "application_id", "decoded_payload",
+    "rssi", "snr", "f_port", "received_at",
+)
+
+
 @require_GET
 def list_ttn_uplinks(request):
-    uplinks = TTNUplink.objects.select_related('device').all().order_by("-received_at")[:500]
+    """
+    GET /api/list_ttn_uplinks?limit=500&cursor=...
+      -> { "ttn_uplinks": [...], "nextCursor": "..." | null }   (récent -> ancien)
+    GET /api/list_ttn_uplinks?format=ndjson|csv
+      -> export en streaming de tous les uplinks
+    """
+    qs = uplinks_queryset().values_list("id", *UPLINK_COLUMNS)
+
+    fmt = request.GET.get("format")
+    if fmt in EXPORT_CONTENT_TYPES:
+        return streaming_export(
+            qs, UPLINK_EXPORT_FIELDS, fmt, "ttn_uplinks",
+            transform=lambda row: row[1:-1] + (row[-1].isoformat(),),
+        )
+
+    limit = _parse_positive(request.GET.get("limit"), int) or 500
+    limit = min(limit, 500)
+
+    cursor = decode_cursor(request.GET.get("cursor"))
+    if cursor:
+        qs = keyset_before(qs, "received_at", cursor)
+
+    rows = list(qs[:limit])
 
     data = []
-    for uplink in uplinks:
+    for pk, device_eui, device_name, application_id, decoded_payload, rssi, snr, f_port, received_at in rows:
         data.append({
-            "device_eui": uplink.device.device_eui if uplink.device else None,
-            "device_name": uplink.device.name if uplink.device else None,
-            "application_id": uplink.application_id,
-            "decoded_payload": uplink.decoded_payload,
-            "rssi": uplink.rssi,
-            "snr": uplink.snr,
-            "f_port": uplink.f_port,
-            "received_at": uplink.received_at.isoformat() if uplink.received_at else None,
+            "device_eui": device_eui,
+            "device_name": device_name,
+            "application_id": application_id,
+            "decoded_payload": decoded_payload,
+            "rssi": rssi,
+            "snr": snr,
+            "f_port": f_port,
+            "received_at": received_at.isoformat() if received_at else None,
         })
 
-    return JsonResponse({"ttn_uplinks": data})
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][-1], rows[-1][0])
+
+    return JsonResponse({"ttn_uplinks": data, "nextCursor": next_cursor})
+
+
+@require_GET
+def uplink_raw(request, uplink_id):
+    """
+    GET /api/v1/uplinks/<id>/raw/
+    Webhook TTN complet (décompressé à la demande, voir uplink_storage.py).
+    """
+    uplink = (
+        TTNUplink.objects
+        .filter(id=uplink_id)
+        .only("id", "raw_payload", "raw_payload_compressed")
+        .first()
+    )
+    if uplink is None:
+        return JsonResponse({"error": "Uplink not found"}, status=404)
+    return JsonResponse(uplink.raw(), safe=False)
 
 
 @require_GET
@@ -282,24 +306,108 @@ def supprimer_uplink(request, uplink_id):
 # --------------------------
 @require_GET
 def telemetry_latest(request, device_eui):
+    """
+    GET /api/v1/telemetry/latest/<device_eui>/
+    Servi depuis le cache du dernier point (mis à jour par l'ingest).
+    Supporte If-None-Match -> 304 sans toucher la base.
+    """
+    entry = latest_points.get(device_eui)
+
+    if entry is None:
+        device = device_registry.get(device_eui)
+        if device is None:
+            return JsonResponse({"error": "No data"}, status=404)
+        p = latest_point_queryset(device.id).first()
+        if p is None:
+            return JsonResponse({"error": "No data"}, status=404)
+        entry = latest_points.store(device_eui, p)
+
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if entry["etag"] in etags or "*" in etags:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(entry["data"])
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _parse_epoch(value):
+    """
+    epoch en secondes (ou ms) -> datetime, None si absent/invalide
+    """
+    if not value:
+        return None
     try:
-        device = Device.objects.get(device_eui=device_eui)
-        p = TelemetryPoint.objects.filter(device=device).latest("ts")
+        ts_int = int(float(value))
+    except (TypeError, ValueError):
+        return None
+    if ts_int > 1_000_000_000_000:
+        ts_int //= 1000
+    return timezone.datetime.fromtimestamp(ts_int, tz=timezone.get_current_timezone())
 
-        return JsonResponse({
-            "device_eui": device.device_eui,
-            "ts": int(p.ts.timestamp()),
-            "lat": p.lat,
-            "lng": p.lng,
-            "temp": p.temp,
-            "battery": p.battery,
-            "rssi": p.rssi,
-            "snr": p.snr,
-        })
-    except (Device.DoesNotExist, TelemetryPoint.DoesNotExist):
-        return JsonResponse({"error": "No data"}, status=404)
+
+def _parse_bbox(value):
+    """
+    "minLng,minLat,maxLng,maxLat" -> tuple de 4 floats, None si absent/invalide
+    """
+    if not value:
+        return None
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(x) for x in value.split(","))
+    except ValueError:
+        return None
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def _parse_positive(value, cast):
+    """
+    paramètre numérique > 0 ou None
+    """
+    if not value:
+        return None
+    try:
+        value = cast(value)
+    except ValueError:
+        return None
+    return value if value > 0 else None
 
 
+@require_GET
+def telemetry_latest_all(request):
+    """
+    GET /api/v1/telemetry/latest/?devices=EUI1,EUI2&bbox=minLng,minLat,maxLng,maxLat&since=...
+    Dernier point de chaque device actif (ou des EUI donnés), en une seule requête SQL
+    (voir queries.latest_all_queryset).
+    Retour:
+      { "count": n, "points": [ {device_eui,name,ts,lat,lng,temp,battery,rssi,snr}, ... ] }
+    """
+    euis = [e.strip() for e in ",".join(request.GET.getlist("devices")).split(",") if e.strip()]
+    bbox = _parse_bbox(request.GET.get("bbox"))
+    since = _parse_epoch(request.GET.get("since"))
+
+    qs = latest_all_queryset(euis=euis, since=since, bbox=bbox)
+
+    rows = qs.values_list(
+        "device__device_eui", "device__name", "ts", "lat", "lng", "temp", "battery", "rssi", "snr"
+    )
+
+    points = [
+        {
+            "device_eui": eui,
+            "name": name,
+            "ts": int(ts.timestamp()),
+            "lat": lat,
+            "lng": lng,
+            "temp": temp,
+            "battery": battery,
+            "rssi": rssi,
+            "snr": snr,
+        }
+        for eui, name, ts, lat, lng, temp, battery, rssi, snr in rows
+    ]
+
+    return JsonResponse({"count": len(points), "points": points})
 
 
 @csrf_exempt
@@ -309,6 +417,19 @@ def telemetry_history(request, device_eui):
     GET /api/v1/telemetry/history/<device_eui>/?limit=300&fromTs=...&toTs=...
     Retour:
       { "device_eui": "...", "count": n, "history": [ {ts,lat,lng,temp,battery,rssi,snr}, ... ] }
+
+    Sous-échantillonnage sur toute la plage fromTs..toTs (au lieu des `limit` derniers points):
+      ?maxPoints=500    -> au plus 500 points (Douglas–Peucker sur la trace, LTTB sur les capteurs)
+      ?resolution=60    -> moyennes par buckets de 60 s (combinable avec maxPoints, 5000 points max)
+    Retour: idem + "downsampled": true, "sourceCount", "resolution"
+
+    Pagination: "nextCursor" renvoyé avec chaque page; ?cursor=... donne les `limit` points
+    précédents (plus anciens).
+    Export: ?format=ndjson|csv -> toute la plage fromTs..toTs en streaming (ancien -> récent)
+    Formats compacts (voir history_formats.py): ?format=columns|binary|polyline, ou en-tête Accept
+      application/vnd.es.columns+json  -> {"columns": {"ts": [...], "lat": [...], ...}}
+      application/vnd.es.history       -> colonnes binaires little-endian
+      application/vnd.es.polyline+json -> trace polyline (?precision=5) + deltas codés
     """
     limit = request.GET.get("limit", "300")
     try:
@@ -321,101 +442,477 @@ def telemetry_history(request, device_eui):
     from_ts = request.GET.get("fromTs")
     to_ts = request.GET.get("toTs")
 
-    try:
-        device = Device.objects.get(device_eui=device_eui)
-    except Device.DoesNotExist:
+    device = device_registry.get(device_eui)
+    if device is None:
         return JsonResponse({"error": "Device not found"}, status=404)
 
-    qs = TelemetryPoint.objects.filter(device=device)
-
     # ts en DB = DateTimeField (timezone.now())
     # fromTs/toTs = epoch seconds -> convertir en datetime
-    if from_ts:
-        try:
-            from_dt = timezone.datetime.fromtimestamp(int(from_ts), tz=timezone.get_current_timezone())
-            qs = qs.filter(ts__gte=from_dt)
-        except ValueError:
-            pass
-
-    if to_ts:
-        try:
-            to_dt = timezone.datetime.fromtimestamp(int(to_ts), tz=timezone.get_current_timezone())
-            qs = qs.filter(ts__lte=to_dt)
-        except ValueError:
-            pass
-
-    qs = qs.order_by("-ts")[:limit]
-    points = list(qs)
-    points.reverse()  # ancien -> récent (polyline)
+    from_dt = _parse_epoch(from_ts)
+    to_dt = _parse_epoch(to_ts)
+
+    max_points = _parse_positive(request.GET.get("maxPoints"), int)
+    resolution = _parse_positive(request.GET.get("resolution"), float)
+    if max_points or resolution:
+        if max_points:
+            max_points = max(2, min(max_points, MAX_POINTS))
+        history, meta = downsample_history(device.id, from_dt, to_dt, max_points=max_points, resolution=resolution)
+        return JsonResponse({
+            "device_eui": device_eui,
+            "count": len(history),
+            "downsampled": True,
+            **meta,
+            "history": history,
+        })
 
-    return JsonResponse({
-        "device_eui": device.device_eui,
-        "count": len(points),
+    fmt = request.GET.get("format")
+    if fmt in EXPORT_CONTENT_TYPES:
+        qs = history_queryset(device.id, from_dt, to_dt).order_by("ts", "id").values_list(*HISTORY_COLUMNS)
+        return streaming_export(
+            qs, HISTORY_COLUMNS, fmt, f"history_{device_eui}",
+            transform=lambda row: (int(row[0].timestamp()),) + row[1:],
+        )
+
+    qs = history_queryset(device.id, from_dt, to_dt).values_list("id", *HISTORY_COLUMNS)
+
+    cursor = decode_cursor(request.GET.get("cursor"))
+    if cursor:
+        qs = keyset_before(qs, "ts", cursor)
+
+    rows = list(qs[:limit])
+
+    # plus ancien point de la page -> page suivante
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    rows.reverse()  # ancien -> récent (polyline)
+
+    history_format = negotiate_history_format(request)
+    if history_format:
+        columns = history_columns(rows, ("id",) + HISTORY_COLUMNS)
+        del columns["id"]
+        return history_response(history_format, columns, {
+            "device_eui": device_eui, "count": len(rows), "nextCursor": next_cursor,
+        }, precision=request.GET.get("precision"))
+
+    response = JsonResponse({
+        "device_eui": device_eui,
+        "count": len(rows),
+        "nextCursor": next_cursor,
         "history": [
             {
-                "ts": int(p.ts.timestamp()),
-                "lat": p.lat,
-                "lng": p.lng,
-                "temp": p.temp,
-                "battery": p.battery,
-                "rssi": p.rssi,
-                "snr": p.snr,
+                "ts": int(ts.timestamp()),
+                "lat": lat,
+                "lng": lng,
+                "temp": temp,
+                "battery": battery,
+                "rssi": rssi,
+                "snr": snr,
             }
-            for p in points
+            for pk, ts, lat, lng, temp, battery, rssi, snr in rows
         ]
     })
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+
+# pas "ronds" proposés quand ?step n'est pas donné (secondes)
+ROLLUP_STEPS = (60, 300, 900, 3600, 4 * 3600, 86400, 7 * 86400)
+
+
+@require_GET
+def telemetry_rollup(request, device_eui):
+    """
+    GET /api/v1/telemetry/rollup/<device_eui>/?fromTs=...&toTs=...&step=3600
+    Min / max / moyenne de temp, battery, rssi, snr par pas de `step` secondes,
+    lus dans les agrégats (TelemetryRollup) et non dans les points bruts.
+    Par défaut: dernières 24 h, ~500 buckets max.
+    Retour:
+      { "device_eui": "...", "granularity": "1h", "step": 3600,
+        "buckets": [ {ts, count, temp: {min,max,avg}, battery: {...}, rssi: {...}, snr: {...}}, ... ] }
+    """
+    device = device_registry.get(device_eui)
+    if device is None:
+        return JsonResponse({"error": "Device not found"}, status=404)
 
+    to_dt = _parse_epoch(request.GET.get("toTs")) or timezone.now()
+    from_dt = _parse_epoch(request.GET.get("fromTs")) or to_dt - timezone.timedelta(days=1)
+    if from_dt >= to_dt:
+        return JsonResponse({"error": "fromTs must be before toTs"}, status=400)
+
+    span = (to_dt - from_dt).total_seconds()
+    step = _parse_positive(request.GET.get("step"), int)
+    if step is None:
+        step = next((s for s in ROLLUP_STEPS if span / s <= 500), ROLLUP_STEPS[-1])
+    # au plus 5000 buckets par réponse
+    step = max(step, 60, int(span // 5000))
+
+    granularity, buckets = read_rollups(device.id, from_dt, to_dt, step)
+
+    return JsonResponse({
+        "device_eui": device_eui,
+        "granularity": granularity,
+        "step": step,
+        "buckets": buckets,
+    })
+
+
+@require_GET
+def telemetry_area(request):
+    """
+    GET /api/v1/telemetry/area/?bbox=minLng,minLat,maxLng,maxLat
+        ou ?lat=..&lng=..&radius=500 (mètres)
+        ou ?polygon=lng1,lat1,lng2,lat2,...
+      &fromTs=...&toTs=...&devices=EUI1,EUI2&limit=1000
+    Points de l'historique dans la zone, du plus récent au plus ancien
+    (index geohash, voir queries.area_queryset).
+    """
+    try:
+        shape = parse_shape(request.GET)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    if shape is None:
+        return JsonResponse({"error": "Missing bbox, radius or polygon"}, status=400)
+
+    limit = _parse_positive(request.GET.get("limit"), int) or 1000
+    limit = min(limit, 5000)
+
+    device_ids = None
+    euis = [e.strip() for e in request.GET.get("devices", "").split(",") if e.strip()]
+    if euis:
+        device_ids = [d.id for d in map(device_registry.get, euis) if d is not None]
+
+    try:
+        qs = area_queryset(
+            shape.bbox,
+            _parse_epoch(request.GET.get("fromTs")),
+            _parse_epoch(request.GET.get("toTs")),
+            device_ids,
+        ).values_list("device__device_eui", *HISTORY_COLUMNS)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    # la bbox est exacte pour une bbox; cercle / polygone: filtre par lots jusqu'à `limit`
+    points = []
+    for start in range(0, 50 * limit, limit):
+        rows = list(qs[start:start + limit])
+        for eui, ts, lat, lng, temp, battery, rssi, snr in rows:
+            if shape.contains(lat, lng):
+                points.append({
+                    "device_eui": eui,
+                    "ts": int(ts.timestamp()),
+                    "lat": lat,
+                    "lng": lng,
+                    "temp": temp,
+                    "battery": battery,
+                    "rssi": rssi,
+                    "snr": snr,
+                })
+                if len(points) == limit:
+                    break
+        if len(points) == limit or len(rows) < limit:
+            break
+
+    return JsonResponse({"count": len(points), "points": points})
 
 
 @csrf_exempt
 @require_POST
 def telemetry_ingest(request):
+    """
+    POST /api/v1/telemetry/ingest/
+      - un objet JSON -> {"status": "ok"}
+      - un tableau JSON, ou du NDJSON (Content-Type: application/x-ndjson),
+        éventuellement compressé (Content-Encoding: gzip | deflate | br)
+        -> {"status": "ok", "accepted": n, "rejected": m, "errors": [{"line": i, "error": "..."}, ...]}
+    """
+    try:
+        is_batch, items = read_telemetry_body(request, request.content_type, request.headers.get("Content-Encoding"))
+    except IngestBodyError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+
+    if is_batch:
+        return _batch_ingest_response(*ingest_telemetry_batch(items))
+
+    _, data, error = next(items)
+    if error is None:
+        record, error = parse_telemetry(data)
+    if error:
+        return JsonResponse({"error": error}, status=400)
+
+    save_points([record])
+
+    return JsonResponse({"status": "ok"})
+
+
+def _batch_ingest_response(report, body_error):
+    if body_error is not None:
+        # les paquets déjà écrits restent en base: le rapport est renvoyé avec l'erreur
+        return JsonResponse({"error": str(body_error), **report}, status=body_error.status)
+    return JsonResponse({"status": "ok", **report})
+
+
+# --------------------------
+# Géorepères
+# --------------------------
+def _geofence_data(fence):
+    return {
+        "id": fence.pk,
+        "name": fence.name,
+        "polygon": fence.polygon,
+        "center_lat": fence.center_lat,
+        "center_lng": fence.center_lng,
+        "radius": fence.radius,
+        "is_active": fence.is_active,
+        "created_at": fence.created_at.isoformat(),
+    }
+
+
+@csrf_exempt
+def geofence_list(request):
+    """
+    GET  /api/v1/geofences/ -> {"geofences": [...]}
+    POST /api/v1/geofences/ {"name": ..., "polygon": [[lng, lat], ...]}
+                         ou {"name": ..., "center_lat": .., "center_lng": .., "radius": m}
+    """
+    if request.method == "GET":
+        return JsonResponse({"geofences": [_geofence_data(f) for f in Geofence.objects.order_by("id")]})
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
     try:
         data = json.loads(request.body.decode("utf-8"))
     except json.JSONDecodeError:
         return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict) or not data.get("name"):
+        return JsonResponse({"error": "Missing name"}, status=400)
 
-    device_eui = str(data.get("device_eui") or "").strip()
-    if not device_eui:
-        return JsonResponse({"error": "Missing device_eui"}, status=400)
+    fence = Geofence(
+        name=data["name"],
+        polygon=data.get("polygon"),
+        center_lat=data.get("center_lat"),
+        center_lng=data.get("center_lng"),
+        radius=data.get("radius"),
+        is_active=bool(data.get("is_active", True)),
+    )
+    try:
+        fence.shape()
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid geometry (polygon or center_lat/center_lng/radius)"}, status=400)
 
-    lat = _to_float(data.get("lat"))
-    lng = _to_float(data.get("lng"))
-    if lat is None or lng is None:
-        return JsonResponse({"error": "Missing lat/lng"}, status=400)
+    fence.save()
+    return JsonResponse({"status": "created", **_geofence_data(fence)}, status=201)
 
-    # ts en secondes (si ms -> conversion)
-    ts_raw = data.get("ts")
-    if ts_raw is None:
-        ts_dt = timezone.now()
-    else:
-        try:
-            ts_int = int(ts_raw)
-            if ts_int > 1_000_000_000_000:
-                ts_int //= 1000
-            ts_dt = timezone.datetime.fromtimestamp(ts_int, tz=timezone.get_current_timezone())
-        except Exception:
-            ts_dt = timezone.now()
-
-    temp = _to_float(data.get("temp"))
-    battery = _to_float(data.get("battery") or data.get("battery_level"))
-    rssi = _to_float(data.get("rssi"))
-    snr = _to_float(data.get("snr"))
-
-    device, _ = Device.objects.get_or_create(
-        device_eui=device_eui,
-        defaults={"name": device_eui}
-    )
 
-    TelemetryPoint.objects.create(
-        device=device,
-        ts=ts_dt,
-        lat=lat,
-        lng=lng,
-        temp=temp,
-        battery=battery,
-        rssi=rssi,
-        snr=snr,
+@csrf_exempt
+def geofence_detail(request, geofence_id):
+    """
+    GET / DELETE /api/v1/geofences/<id>/
+    """
+    try:
+        fence = Geofence.objects.get(pk=geofence_id)
+    except Geofence.DoesNotExist:
+        return JsonResponse({"error": "Geofence not found"}, status=404)
+
+    if request.method == "GET":
+        return JsonResponse(_geofence_data(fence))
+    if request.method != "DELETE":
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
+    fence.delete()
+    return JsonResponse({"status": "deleted"})
+
+
+@require_GET
+def geofence_devices(request, geofence_id):
+    """
+    GET /api/v1/geofences/<id>/devices/?since=...
+    Devices actifs dont le dernier point est dans la zone.
+    """
+    try:
+        fence = Geofence.objects.get(pk=geofence_id)
+    except Geofence.DoesNotExist:
+        return JsonResponse({"error": "Geofence not found"}, status=404)
+    shape = fence.shape()
+
+    rows = latest_all_queryset(since=_parse_epoch(request.GET.get("since")), bbox=shape.bbox).values_list(
+        "device__device_eui", "device__name", "ts", "lat", "lng"
     )
+    devices = [
+        {"device_eui": eui, "name": name, "ts": int(ts.timestamp()), "lat": lat, "lng": lng}
+        for eui, name, ts, lat, lng in rows
+        if shape.contains(lat, lng)
+    ]
+    return JsonResponse({"geofence": fence.pk, "count": len(devices), "devices": devices})
 
-    return JsonResponse({"status": "ok"})
+
+# --------------------------
+# Alertes
+# --------------------------
+ALERT_RULE_FIELDS = (
+    "name", "metric", "stat", "operator", "threshold", "clear_threshold",
+    "debounce", "window", "ewma_alpha", "severity", "is_active",
+)
+
+
+def _alert_rule_data(rule):
+    return {
+        "id": rule.pk,
+        "device_eui": rule.device.device_eui if rule.device else None,
+        **{name: getattr(rule, name) for name in ALERT_RULE_FIELDS},
+        "created_at": rule.created_at.isoformat(),
+    }
+
+
+def _apply_alert_rule(rule, data):
+    """
+    Copie les champs du JSON dans la règle et la valide.
+    Retour: None, ou une JsonResponse d'erreur
+    """
+    for name in ALERT_RULE_FIELDS:
+        if name in data:
+            setattr(rule, name, data[name])
+    if "device_eui" in data:
+        if data["device_eui"]:
+            device = device_registry.get(data["device_eui"])
+            if device is None:
+                return JsonResponse({"error": "Device not found"}, status=404)
+            rule.device_id = device.id
+        else:
+            rule.device_id = None
+    try:
+        rule.full_clean()
+    except ValidationError as exc:
+        return JsonResponse({"error": "Invalid rule", "fields": exc.message_dict}, status=400)
+    return None
+
+
+@csrf_exempt
+def alert_rule_list(request):
+    """
+    GET  /api/v1/alerts/rules/
+    POST /api/v1/alerts/rules/ {"name": "batterie faible", "metric": "battery", "stat": "ewma",
+                                "operator": "lt", "threshold": 20, "clear_threshold": 25, "debounce": 3}
+    """
+    if request.method == "GET":
+        rules = AlertRule.objects.select_related("device").order_by("id")
+        return JsonResponse({"rules": [_alert_rule_data(r) for r in rules]})
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    rule = AlertRule()
+    error = _apply_alert_rule(rule, data)
+    if error:
+        return error
+    rule.save()
+    return JsonResponse({"status": "created", **_alert_rule_data(rule)}, status=201)
+
+
+@csrf_exempt
+def alert_rule_detail(request, rule_id):
+    """
+    GET / POST (modification partielle) / DELETE /api/v1/alerts/rules/<id>/
+    """
+    try:
+        rule = AlertRule.objects.select_related("device").get(pk=rule_id)
+    except AlertRule.DoesNotExist:
+        return JsonResponse({"error": "Rule not found"}, status=404)
+
+    if request.method == "GET":
+        return JsonResponse(_alert_rule_data(rule))
+    if request.method == "DELETE":
+        rule.delete()
+        return JsonResponse({"status": "deleted"})
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid HTTP method"}, status=405)
+
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Invalid payload"}, status=400)
+
+    error = _apply_alert_rule(rule, data)
+    if error:
+        return error
+    rule.save()
+    rule.refresh_from_db()
+    return JsonResponse({"status": "updated", **_alert_rule_data(rule)})
+
+
+@require_GET
+def alert_events(request):
+    """
+    GET /api/v1/alerts/events/?device=EUI&rule=<id>&state=firing&limit=200&cursor=...
+    Plus récents d'abord, pagination par "nextCursor".
+    """
+    limit = _parse_positive(request.GET.get("limit"), int) or 200
+    limit = min(limit, 1000)
+
+    qs = AlertEvent.objects.order_by("-ts", "-id")
+    if request.GET.get("device"):
+        device = device_registry.get(request.GET["device"])
+        if device is None:
+            return JsonResponse({"error": "Device not found"}, status=404)
+        qs = qs.filter(device_id=device.id)
+    rule_id = _parse_positive(request.GET.get("rule"), int)
+    if rule_id:
+        qs = qs.filter(rule_id=rule_id)
+    if request.GET.get("state"):
+        qs = qs.filter(state=request.GET["state"])
+
+    cursor = decode_cursor(request.GET.get("cursor"))
+    if cursor:
+        qs = keyset_before(qs, "ts", cursor)
+
+    rows = list(qs.values_list(
+        "id", "ts", "rule_id", "rule__name", "rule__severity", "device__device_eui", "state", "value", "threshold",
+    )[:limit])
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0])
+
+    return JsonResponse({
+        "count": len(rows),
+        "nextCursor": next_cursor,
+        "events": [
+            {
+                "id": pk,
+                "ts": int(ts.timestamp()),
+                "rule": rule,
+                "rule_name": rule_name,
+                "severity": severity,
+                "device_eui": eui,
+                "state": state,
+                "value": value,
+                "threshold": threshold,
+            }
+            for pk, ts, rule, rule_name, severity, eui, state, value, threshold in rows
+        ],
+    })
+
+
+@require_GET
+def alerts_active(request):
+    """
+    GET /api/v1/alerts/active/
+    Alertes actuellement déclenchées: (règle, device) dont le dernier événement est "firing".
+    """
+    rules = {r.pk: r for r in AlertRule.objects.all()}
+    active = [
+        {"rule": rule_id, "rule_name": rules[rule_id].name, "severity": rules[rule_id].severity, "device_eui": eui}
+        for rule_id, eui in active_alert_keys()
+        if rule_id in rules
+    ]
+    return JsonResponse({"count": len(active), "alerts": active})